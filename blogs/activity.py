@@ -0,0 +1,79 @@
+# Per-user activity: the "My activity" dashboard and its lists
+#
+# Every list is one keyset-paged query (blogs.pagination) that filters a
+# single table by the user and orders it by (created_at, id), served by an
+# index starting with the user column: post_author_feed_idx,
+# like_user_recent_idx, bookmark_user_recent_idx and comment_user_recent_idx.
+# Likes and bookmarks are paged over their own through-table rows, so posts
+# are listed in the order they were liked/bookmarked rather than written,
+# and the posts (with author and category) come back in the same query.
+#
+# Toggles still waiting in the write-behind buffer (blogs.writebehind) show
+# up here once they are flushed.
+
+from collections import namedtuple
+
+from django.conf import settings
+
+from .models import Bookmark, Comment, Like, Post
+
+Section = namedtuple('Section', 'kind title url_name icon empty')
+
+SECTIONS = {
+    'posts': Section('posts', 'My Posts', 'my_posts', 'bi-journal-text', "You have not written any posts yet."),
+    'likes': Section('likes', 'Liked Posts', 'my_likes', 'bi-heart', "You have not liked any posts yet."),
+    'bookmarks': Section(
+        'bookmarks', 'My Bookmarked Posts', 'my_bookmarks', 'bi-bookmark', "You have not bookmarked any posts yet.",
+    ),
+    'comments': Section('comments', 'My Comments', 'my_comments', 'bi-chat', "You have not commented on any posts yet."),
+}
+
+
+def recent_count():
+    # Entries per section on the dashboard
+    return getattr(settings, 'BLOG_ACTIVITY_RECENT', 5)
+
+
+def rows(kind, user):
+    # The unordered queryset behind one list; the paging orders it
+    if kind == 'posts':
+        return Post.objects.filter(author=user).select_related('author', 'category').defer('content')
+    if kind in ('likes', 'bookmarks'):
+        through = Like if kind == 'likes' else Bookmark
+        return (
+            through.objects.filter(user=user)
+            .select_related('post__author', 'post__category')
+            .defer('post__content')
+        )
+    return Comment.objects.filter(user=user).select_related('post').only('content', 'created_at', 'post__title')
+
+
+def entries(kind, page_rows):
+    # What the templates show: posts carrying activity_at (when the user
+    # wrote, liked or bookmarked them), or the comments themselves
+    if kind == 'comments':
+        return list(page_rows)
+    if kind == 'posts':
+        posts = list(page_rows)
+        for post in posts:
+            post.activity_at = post.created_at
+        return posts
+    posts = []
+    for row in page_rows:
+        row.post.activity_at = row.created_at
+        posts.append(row.post)
+    return posts
+
+
+def dashboard(user):
+    # Every section's total and latest entries: two indexed queries each
+    limit = recent_count()
+    summary = []
+    for section in SECTIONS.values():
+        queryset = rows(section.kind, user)
+        summary.append({
+            'section': section,
+            'count': queryset.count(),
+            'entries': entries(section.kind, queryset.order_by('-created_at', '-id')[:limit]),
+        })
+    return summary
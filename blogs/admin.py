@@ -12,7 +12,7 @@ class CommentAdmin(admin.ModelAdmin):
 
 # Customize how Posts appear in admin
 class PostAdmin(admin.ModelAdmin):
-    list_display = ('title', 'author', 'category', 'created_at')
+    list_display = ('title', 'author', 'category', 'created_at', 'like_count', 'bookmark_count', 'comment_count')
     list_filter = ('category', 'created_at', 'author')
     search_fields = ('title', 'content', 'author__username')
     date_hierarchy = 'created_at'
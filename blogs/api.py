@@ -0,0 +1,222 @@
+# Read-only JSON API (v1) for the mobile client and edge renderers
+#
+# Rows are fetched with .values() on the same indexed querysets the HTML
+# views use, so no model instances are built and only the columns a client
+# asked for are read: ?fields=id,title,summary skips the post body entirely.
+# Feeds are keyset paginated like the HTML feed (?after=<cursor>, "next" in
+# the response carries the cursor for the following page).
+#
+# Every response gets a weak ETag computed from the JSON body, answers
+# If-None-Match with a 304, and is compressed with brotli (when the optional
+# brotli package is installed) or gzip according to Accept-Encoding.
+
+import gzip
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from .categories import registry as category_registry
+from .models import Comment, Post, Tag
+from .pagination import comment_page_size, decode_cursor, keyset_page, thread_page
+from .routers import replica_reads
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+# Public field name -> values() lookup
+POST_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'summary': 'summary',
+    'content': 'content',
+    'author': 'author__username',
+    'category': 'category__slug',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'featured_image': 'featured_image',
+    'like_count': 'like_count',
+    'bookmark_count': 'bookmark_count',
+    'comment_count': 'comment_count',
+}
+# Computed from other data: one extra query per page for tags, none for url
+EXTRA_POST_FIELDS = ('tags', 'url')
+ALL_POST_FIELDS = (*POST_FIELDS, *EXTRA_POST_FIELDS)
+# Feeds leave the body out unless it's asked for
+FEED_FIELDS = tuple(name for name in ALL_POST_FIELDS if name != 'content')
+
+COMMENT_FIELDS = {
+    'id': 'id',
+    'user': 'user__username',
+    'content': 'content',
+    'created_at': 'created_at',
+}
+
+
+def min_compress_size():
+    return getattr(settings, 'BLOG_API_MIN_COMPRESS_SIZE', 512)
+
+
+def max_age():
+    return getattr(settings, 'BLOG_API_MAX_AGE', 0)
+
+
+class FieldError(ValueError):
+    pass
+
+
+def requested_fields(request, default, allowed):
+    raw = request.GET.get('fields', '').strip()
+    if not raw:
+        return list(default)
+    names = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise FieldError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(allowed)}")
+    return names
+
+
+def post_rows(queryset, fields):
+    # values() rows for `fields`, plus created_at/id which the cursor needs
+    lookups = {POST_FIELDS[name] for name in fields if name in POST_FIELDS} | {'id', 'created_at'}
+    return queryset.values(*lookups)
+
+
+def serialize_posts(rows, fields):
+    # Turn values() rows into API dicts with the public field names
+    rows = list(rows)
+    tags = {}
+    if 'tags' in fields and rows:
+        links = (
+            Post.tags.through.objects.filter(post_id__in=[row['id'] for row in rows])
+            .order_by('tag__name').values_list('post_id', 'tag__slug')
+        )
+        for post_id, slug in links:
+            tags.setdefault(post_id, []).append(slug)
+    # reverse() once and fill the id in; per row it was half the cost
+    url_pattern = reverse('post_detail', args=[0]).replace('/0/', '/%d/') if 'url' in fields else None
+    items = []
+    for row in rows:
+        item = {}
+        for name in fields:
+            if name == 'tags':
+                item[name] = tags.get(row['id'], [])
+            elif name == 'url':
+                item[name] = url_pattern % row['id']
+            elif name == 'featured_image':
+                image = row['featured_image']
+                item[name] = default_storage.url(image) if image else None
+            else:
+                item[name] = row[POST_FIELDS[name]]
+        items.append(item)
+    return items
+
+
+def serialize_comments(rows):
+    return [{name: row[lookup] for name, lookup in COMMENT_FIELDS.items()} for row in rows]
+
+
+def _encode(request, body):
+    accepted = request.headers.get('Accept-Encoding', '')
+    if len(body) < min_compress_size():
+        return body, None
+    if brotli is not None and 'br' in accepted:
+        return brotli.compress(body, quality=5), 'br'
+    if 'gzip' in accepted:
+        return gzip.compress(body, compresslevel=6), 'gzip'
+    return body, None
+
+
+def json_response(request, payload, status=200):
+    body = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    # Weak: the same JSON is served gzip, brotli or identity encoded
+    etag = 'W/"%s"' % hashlib.md5(body, usedforsecurity=False).hexdigest()
+    response = get_conditional_response(request, etag=etag) if status == 200 else None
+    if response is None:
+        content, encoding = _encode(request, body)
+        response = HttpResponse(content, status=status, content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept-Encoding'])
+    patch_cache_control(response, public=True, max_age=max_age(), must_revalidate=True)
+    return response
+
+
+def error_response(request, message, status):
+    return json_response(request, {'error': message}, status=status)
+
+
+def api_view(view):
+    # Shared handling for the endpoints below: reads from replicas, turns a
+    # bad ?fields= into a 400
+    @replica_reads
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except FieldError as exc:
+            return error_response(request, str(exc), 400)
+    return wrapper
+
+
+@api_view
+def posts(request):
+    fields = requested_fields(request, FEED_FIELDS, ALL_POST_FIELDS)
+    queryset = Post.objects.all()
+    if request.GET.get('category'):
+        queryset = queryset.filter(category__slug=request.GET['category'])
+    if request.GET.get('tag'):
+        queryset = queryset.filter(tags__slug=request.GET['tag'])
+    page = keyset_page(request, post_rows(queryset, fields))
+    return json_response(request, {
+        'results': serialize_posts(page.object_list, fields),
+        'next': page.next_url or None,
+        'previous': page.previous_url or None,
+    })
+
+
+@api_view
+def post(request, pk):
+    fields = requested_fields(request, ALL_POST_FIELDS, ALL_POST_FIELDS)
+    rows = list(post_rows(Post.objects.filter(pk=pk), fields))
+    if not rows:
+        return error_response(request, "Post not found", 404)
+    return json_response(request, serialize_posts(rows, fields)[0])
+
+
+@api_view
+def post_comments(request, pk):
+    if not Post.objects.filter(pk=pk).exists():
+        return error_response(request, "Post not found", 404)
+    rows, next_cursor = thread_page(
+        Comment.objects.filter(post_id=pk).values(*COMMENT_FIELDS.values()),
+        decode_cursor(request.GET.get('after', '')),
+        comment_page_size(),
+    )
+    return json_response(request, {
+        'results': serialize_comments(rows),
+        'next': f"?after={next_cursor}" if next_cursor else None,
+    })
+
+
+@api_view
+def categories(request):
+    return json_response(request, {
+        'results': [entry._asdict() for entry in category_registry.all()],
+    })
+
+
+@api_view
+def tags(request):
+    rows = Tag.objects.annotate(num_posts=Count('posts')).order_by('name').values('id', 'name', 'slug', 'num_posts')
+    return json_response(request, {'results': list(rows)})
@@ -0,0 +1,16 @@
+# Version 1 of the JSON API, mounted under /api/v1/ by blogs/urls.py. A
+# breaking change gets a new module and prefix; v1 keeps working.
+
+from django.urls import path
+
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', api.posts, name='posts'),
+    path('posts/<int:pk>/', api.post, name='post'),
+    path('posts/<int:pk>/comments/', api.post_comments, name='post_comments'),
+    path('categories/', api.categories, name='categories'),
+    path('tags/', api.tags, name='tags'),
+]
@@ -6,3 +6,7 @@ from django.apps import AppConfig
 class BlogsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blogs'
+
+    def ready(self):
+        # Hook up the signal handlers that keep the Post counters in sync
+        from . import signals  # noqa: F401
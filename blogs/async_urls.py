@@ -0,0 +1,21 @@
+# Same routes as blogs/urls.py, with the read-heavy pages served by the async
+# views. my_blog/urls.py includes this module instead when BLOG_ASYNC_VIEWS
+# is on (i.e. when running under uvicorn workers).
+
+from django.urls import path
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    'index': async_views.index,
+    'post_detail': async_views.post_detail,
+    'category_posts': async_views.category_posts,
+    'search_posts': async_views.search_posts,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name)
+    if getattr(pattern, 'name', None) in ASYNC_VIEWS else pattern  # includes have no name
+    for pattern in sync_urlpatterns
+]
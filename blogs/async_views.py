@@ -0,0 +1,113 @@
+# Async twins of the read-heavy views, routed in by blogs/async_urls.py when
+# the site runs under an ASGI server (BLOG_ASYNC_VIEWS, see the README).
+#
+# Database work goes through the async ORM (aget, async for) or sync_to_async,
+# so a slow query parks the coroutine instead of holding a worker, and the
+# independent lookups of a page are awaited together with asyncio.gather.
+# Django still runs each request's ORM calls on one connection, one after
+# the other, so gather mostly saves event-loop round trips rather than
+# running queries in parallel. Templates are rendered through sync_to_async
+# because the context processors (request.user, messages, categories) are
+# sync-only. Anything that writes is handed to the sync view.
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import Http404
+from django.shortcuts import aget_object_or_404, render
+
+from . import caching, related, views, writebehind
+from .categories import registry as category_registry
+from .conditional import category_validators, conditional_page, post_validators
+from .forms import CommentForm
+from .models import Post
+from .pagination import offset_page, paginate
+from .routers import replica_reads
+from .search import get_search_backend
+
+arender = sync_to_async(render)
+
+
+async def _related_posts(pk):
+    return [entry.related async for entry in related.related_entries(pk)]
+
+
+async def _primed_page(request, queryset, kind):
+    # Fetch one page of posts plus their cached card fragments
+    page = await sync_to_async(paginate)(request, queryset)
+    await sync_to_async(caching.prime_fragments)(kind, page.object_list)
+    return page
+
+
+@login_required
+@replica_reads
+async def index(request):
+    page, categories = await asyncio.gather(
+        _primed_page(request, Post.objects.feed(), 'card'),
+        sync_to_async(category_registry.all)(),
+    )
+    return await arender(request, 'blogs/index.html', {
+        'posts': page.object_list,
+        'page': page,
+        'categories': categories,
+    })
+
+
+@replica_reads
+@conditional_page(post_validators)
+async def post_detail(request, pk):
+    if request.method != 'GET':
+        return await sync_to_async(views.post_detail)(request, pk)
+    user = await request.auser()
+    post, (comments, comments_next), related_posts, categories = await asyncio.gather(
+        aget_object_or_404(Post.objects.select_related('author', 'category').with_viewer_flags(user), pk=pk),
+        sync_to_async(views.comment_batch)(pk, request.GET.get('comments_after')),
+        _related_posts(pk),
+        sync_to_async(category_registry.all)(),
+    )
+    if writebehind.enabled():
+        await sync_to_async(writebehind.buffer.overlay)(post, user)
+    return await arender(request, 'blogs/post_detail.html', {
+        'post': post,
+        'comments': comments,
+        'comments_next': comments_next,
+        'related_posts': related_posts,
+        'form': CommentForm(),
+        'categories': categories,
+    })
+
+
+@replica_reads
+@conditional_page(category_validators)
+async def category_posts(request, slug):
+    category = await sync_to_async(category_registry.get_by_slug)(slug)
+    if category is None:
+        raise Http404("No category matches the given query.")
+    page, categories = await asyncio.gather(
+        _primed_page(request, Post.objects.feed().filter(category_id=category.id), 'category_card'),
+        sync_to_async(category_registry.all)(),
+    )
+    return await arender(request, 'blogs/category_posts.html', {
+        'category': category,
+        'posts': page.object_list,
+        'page': page,
+        'categories': categories,
+    })
+
+
+def _search_page(request, query):
+    # Sync as a whole: picking the backend may itself query the database
+    # (the FTS5 table check) the first time a worker searches
+    return offset_page(request, get_search_backend().search(query) if query else [])
+
+
+@replica_reads
+async def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    page = await sync_to_async(_search_page)(request, query)
+    return await arender(request, 'blogs/search_results.html', {
+        'posts': page.object_list,
+        'page': page,
+        'query': query,
+    })
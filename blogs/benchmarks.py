@@ -0,0 +1,235 @@
+# Shared helpers for the benchmark management commands
+#
+# Benchmarks never touch the real database: they run inside a throwaway test
+# database created the same way `manage.py test` does it.
+
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.test.utils import setup_databases, teardown_databases
+
+from .models import Category, Comment, Post, Tag
+from .transfer import refresh_derived_data
+
+# Every seeded user can log in with this password
+SEED_PASSWORD = 'seed-pass-123'
+
+WORDS = (
+    "django python database index query cache feed post comment author "
+    "category tag search latency throughput memory server request response "
+    "template render async worker thread process queue batch stream vector "
+    "rank replica cursor page session cookie static media image thumbnail "
+    "deploy docker kubernetes linux network socket protocol http json api"
+).split()
+
+
+@contextmanager
+def temporary_database(verbosity=0):
+    old_config = setup_databases(verbosity=verbosity, interactive=False, aliases={'default'})
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity)
+
+
+# Filler vocabulary so the topic words above are reasonably selective
+FILLER = [f"{a}{b}{c}" for a in 'bcdfghklmnprstvz' for b in 'aeiou' for c in ('lo', 'ra', 'ne', 'ti', 'ku', 'sem')]
+
+
+def random_text(rng, words):
+    return ' '.join(
+        rng.choice(WORDS) if rng.random() < 0.1 else rng.choice(FILLER)
+        for _ in range(words)
+    )
+
+
+def create_posts(count, batch_size=1000, seed=0, words=60):
+    # Bulk-insert `count` synthetic posts (bypasses signals, so callers must
+    # rebuild any derived data such as the search index afterwards)
+    rng = random.Random(seed)
+    author, _ = User.objects.get_or_create(username='bench-author')
+    for start in range(0, count, batch_size):
+        Post.objects.bulk_create(
+            _with_summary(Post(
+                title=random_text(rng, 6).title(),
+                content=random_text(rng, words),
+                author=author,
+            ))
+            for _ in range(min(batch_size, count - start))
+        )
+
+
+def _with_summary(post):
+    # bulk_create skips save(), which is where the summary is normally built
+    post.summary = post.build_summary()
+    return post
+
+
+def _batched(model, rows, batch_size, ignore_conflicts=False):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch, ignore_conflicts=ignore_conflicts)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch, ignore_conflicts=ignore_conflicts)
+
+
+def seed_blog(posts, users=50, comments=0, likes=0, categories=12, tags=40,
+              batch_size=1000, seed=0, words=120):
+    # Bulk-generate a realistic-looking blog: users, categories and tags,
+    # then posts spread over them, tag links, comments and likes, all with
+    # batched INSERTs. Signals don't fire for bulk_create, so the counters,
+    # search index and caches are rebuilt once at the end.
+    rng = random.Random(seed)
+    prefix = f'seed{seed}'
+    password = make_password(SEED_PASSWORD)  # hashed once, not per user
+    existing_users = User.objects.filter(username__startswith=f'{prefix}-user').count()
+    _batched(User, (
+        User(username=f'{prefix}-user{i}', email=f'{prefix}-user{i}@example.com', password=password)
+        for i in range(existing_users, users)
+    ), batch_size)
+    user_ids = list(User.objects.filter(username__startswith=f'{prefix}-user').values_list('id', flat=True))
+
+    for i in range(categories):
+        Category.objects.get_or_create(name=f'{rng.choice(WORDS).title()} {i}')
+    category_ids = list(Category.objects.values_list('id', flat=True))
+    _batched(Tag, (
+        Tag(name=f'{word}-{i}', slug=f'{word}-{i}')
+        for i, word in enumerate(rng.choice(WORDS) for _ in range(tags))
+    ), batch_size, ignore_conflicts=True)
+    tag_ids = list(Tag.objects.values_list('id', flat=True))
+
+    first_new = (Post.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+    _batched(Post, (
+        _with_summary(Post(
+            title=random_text(rng, 6).title(),
+            content='\n\n'.join(random_text(rng, words // 3) for _ in range(3)),
+            author_id=rng.choice(user_ids),
+            category_id=rng.choice(category_ids) if category_ids else None,
+        ))
+        for _ in range(posts)
+    ), batch_size)
+    post_ids = list(Post.objects.filter(id__gte=first_new).values_list('id', flat=True))
+    if not post_ids:
+        return
+
+    PostTag = Post.tags.through
+    _batched(PostTag, (
+        PostTag(post_id=post_id, tag_id=tag_id)
+        for post_id in post_ids
+        for tag_id in rng.sample(tag_ids, min(len(tag_ids), rng.randint(0, 4)))
+    ), batch_size, ignore_conflicts=True)
+    # Popularity is skewed: most comments and likes land on a few posts
+    weights = [1 / (rank + 1) for rank in range(len(post_ids))]
+    _batched(Comment, (
+        Comment(post_id=post_id, user_id=rng.choice(user_ids), content=random_text(rng, rng.randint(5, 40)))
+        for post_id in rng.choices(post_ids, weights, k=comments)
+    ), batch_size)
+    Like = Post.likes.through
+    _batched(Like, (
+        Like(post_id=post_id, user_id=rng.choice(user_ids))
+        for post_id in rng.choices(post_ids, weights, k=likes)
+    ), batch_size, ignore_conflicts=True)
+
+    refresh_derived_data(batch_size)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def time_calls(func, repeat):
+    # Run func() `repeat` times and return the latencies in milliseconds
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summarize(samples):
+    return {
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'max_ms': round(max(samples), 3) if samples else 0.0,
+    }
+
+
+def concurrent_sqlite_writes(path, options, threads=8, writes_per_thread=50):
+    # Hammer a scratch SQLite file from several threads, each with its own
+    # connection built from `options` (a DATABASES OPTIONS dict, see
+    # my_blog/database.py). Every write is a small read-then-write
+    # transaction, like a like toggle or a comment with its counter bump.
+    from django.db import OperationalError
+    from django.db.backends.sqlite3.base import DatabaseWrapper
+
+    def connect():
+        wrapper = DatabaseWrapper({
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(path), 'OPTIONS': dict(options),
+            'ATOMIC_REQUESTS': False, 'AUTOCOMMIT': True, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+            'TIME_ZONE': None, 'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '', 'TEST': {},
+        }, alias=f'bench-{threading.get_ident()}')
+        wrapper.ensure_connection()
+        return wrapper
+
+    setup = connect()
+    with setup.cursor() as cursor:
+        cursor.execute('CREATE TABLE IF NOT EXISTS bench_counter (id INTEGER PRIMARY KEY, hits INTEGER NOT NULL)')
+        cursor.execute('CREATE TABLE IF NOT EXISTS bench_event (id INTEGER PRIMARY KEY, counter_id INTEGER NOT NULL)')
+        cursor.execute('INSERT OR IGNORE INTO bench_counter (id, hits) VALUES (1, 0)')
+    setup.close()
+
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def worker():
+        wrapper = connect()
+        done = errors = 0
+        # Same BEGIN that Django issues for atomic() on this connection
+        begin = f'BEGIN {wrapper.transaction_mode}' if wrapper.transaction_mode else 'BEGIN'
+        for _ in range(writes_per_thread):
+            with wrapper.cursor() as cursor:
+                try:
+                    cursor.execute(begin)
+                    cursor.execute('SELECT hits FROM bench_counter WHERE id = 1')
+                    cursor.fetchone()
+                    cursor.execute('INSERT INTO bench_event (counter_id) VALUES (1)')
+                    cursor.execute('UPDATE bench_counter SET hits = hits + 1 WHERE id = 1')
+                    cursor.execute('COMMIT')
+                    done += 1
+                except OperationalError:
+                    # "database is locked": the write is lost
+                    errors += 1
+                    if wrapper.connection.in_transaction:
+                        cursor.execute('ROLLBACK')
+        wrapper.close()
+        with lock:
+            outcomes['writes'] += done
+            outcomes['errors'] += errors
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'threads': threads,
+        'writes': outcomes['writes'],
+        'errors': outcomes['errors'],
+        'writes_per_sec': round(outcomes['writes'] / elapsed, 1) if elapsed else 0.0,
+    }
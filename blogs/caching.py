@@ -0,0 +1,145 @@
+# Fragment and data caching for the blog pages
+#
+# Rendered post cards and post bodies are cached under keys built from the
+# post id, its updated_at stamp, a per-post version token and a global
+# generation token. Signal handlers in blogs.signals bump the per-post token
+# when anything shown on a card changes (comments, likes, tags...) and the
+# global one when categories or tags change, so stale fragments are never
+# looked up again and simply expire.
+
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import routers
+
+GENERATION_KEY = 'blog:generation'
+
+
+def cache_timeout():
+    return getattr(settings, 'BLOG_CACHE_TIMEOUT', 600)
+
+
+class CacheStats:
+    # Per-process hit/miss counters, exposed by the cache_stats view
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def record(self, name, hit):
+        with self._lock:
+            self._counts[(name, 'hit' if hit else 'miss')] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        names = sorted({name for name, _ in counts})
+        result = {}
+        for name in names:
+            hits, misses = counts.get((name, 'hit'), 0), counts.get((name, 'miss'), 0)
+            total = hits + misses
+            result[name] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': round(hits / total, 4) if total else None,
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+def _new_token():
+    return time.time_ns()
+
+
+def _version_key(post_id):
+    return f'blog:post:{post_id}:version'
+
+
+def post_version_key(post_id):
+    return _version_key(post_id)
+
+
+def get_tokens(keys):
+    # Fetch version tokens in one round trip. A missing token (never set or
+    # evicted) gets a fresh value so anything cached or validated under an
+    # older token can never be mistaken for current
+    tokens = cache.get_many(keys)
+    missing = {key: _new_token() for key in keys if key not in tokens}
+    if missing:
+        cache.set_many(missing, None)
+        tokens.update(missing)
+    return tokens
+
+
+def _fragment_key(kind, post, version, generation):
+    stamp = post.updated_at.timestamp() if post.updated_at else 0
+    return f'blog:fragment:{kind}:{post.pk}:{stamp}:{version}:{generation}'
+
+
+def prime_fragments(kind, posts):
+    # Look up the cached `kind` fragment of every post in two round trips
+    # (tokens, then fragments) and remember the result on each post so the
+    # {% cachedfragment %} tag doesn't hit the cache once per card
+    posts = [post for post in posts if post.pk is not None]
+    if not posts:
+        return
+    tokens = get_tokens([GENERATION_KEY] + [_version_key(post.pk) for post in posts])
+
+    keys = {}
+    for post in posts:
+        key = _fragment_key(kind, post, tokens[_version_key(post.pk)], tokens[GENERATION_KEY])
+        keys[key] = post
+    found = cache.get_many(list(keys))
+    for key, post in keys.items():
+        primed = post.__dict__.setdefault('_cached_fragments', {})
+        primed[kind] = (key, found.get(key))
+
+
+def render_fragment(kind, post, render):
+    primed = post.__dict__.get('_cached_fragments', {})
+    if kind not in primed:
+        prime_fragments(kind, [post])
+        primed = post.__dict__.get('_cached_fragments', {})
+    if kind not in primed:
+        # Unsaved post, nothing sensible to cache it under
+        return render()
+    key, html = primed[kind]
+    stats.record(kind, html is not None)
+    if html is None:
+        html = render()
+        # Rendered from a replica, it may predate the tokens it is keyed on
+        cache.set(key, html, routers.cache_timeout(cache_timeout()))
+        primed[kind] = (key, html)
+    return html
+
+
+def run_now_and_on_commit(func):
+    # Invalidate right away and again once the surrounding transaction
+    # commits, so a reader that re-cached the pre-commit state in between
+    # doesn't leave a stale entry behind
+    func()
+    transaction.on_commit(func)
+
+
+def invalidate_posts(post_ids):
+    post_ids = list(post_ids)
+    if post_ids:
+        run_now_and_on_commit(lambda: cache.set_many({_version_key(pk): _new_token() for pk in post_ids}, None))
+
+
+def invalidate_post(post_id):
+    invalidate_posts([post_id])
+
+
+def invalidate_all_fragments():
+    run_now_and_on_commit(lambda: cache.set(GENERATION_KEY, _new_token(), None))
@@ -0,0 +1,118 @@
+# Process-local registry of categories
+#
+# Categories are read on nearly every page (sidebar, post form) but change
+# rarely, so each worker keeps a small in-memory copy. A version token in the
+# shared cache is bumped whenever a category (or a post's category
+# membership) changes; every worker compares it with the version of its copy
+# and reloads when they differ, which keeps gunicorn workers in sync without
+# any category queries on the steady-state request path.
+
+import threading
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from . import caching
+from .models import Category
+
+VERSION_KEY = 'blog:categories:version'
+
+
+class CategoryEntry(NamedTuple):
+    # Lightweight, immutable stand-in for a Category row; templates use it
+    # exactly like the model (category.id, .name, .slug, .num_posts)
+    id: int
+    name: str
+    slug: str
+    num_posts: int
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.name
+
+
+class CategoryRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = ()
+        self._by_id = {}
+        self._by_slug = {}
+
+    @property
+    def max_entries(self):
+        # Bounds the memory each worker spends on the registry; categories
+        # beyond the limit are looked up in the database instead
+        return getattr(settings, 'BLOG_CATEGORY_REGISTRY_MAX', 500)
+
+    def _shared_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, time.time_ns(), None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def _refresh(self):
+        version = self._shared_version()
+        if version == self._version:
+            caching.stats.record('categories', True)
+            return
+        caching.stats.record('categories', False)
+        with self._lock:
+            if version == self._version:
+                return
+            rows = (
+                Category.objects.annotate(num_posts=Count('post'))
+                .order_by('name')
+                .values_list('id', 'name', 'slug', 'num_posts')[:self.max_entries]
+            )
+            entries = tuple(CategoryEntry(*row) for row in rows)
+            self._by_id = {entry.id: entry for entry in entries}
+            self._by_slug = {entry.slug: entry for entry in entries}
+            self._entries = entries
+            self._version = version
+
+    def all(self):
+        self._refresh()
+        return self._entries
+
+    def _lookup_db(self, **lookup):
+        row = (
+            Category.objects.filter(**lookup)
+            .annotate(num_posts=Count('post'))
+            .values_list('id', 'name', 'slug', 'num_posts')
+            .first()
+        )
+        return CategoryEntry(*row) if row else None
+
+    def get(self, category_id):
+        self._refresh()
+        entry = self._by_id.get(category_id)
+        if entry is None and len(self._entries) >= self.max_entries:
+            entry = self._lookup_db(id=category_id)
+        return entry
+
+    def get_by_slug(self, slug):
+        self._refresh()
+        entry = self._by_slug.get(slug)
+        if entry is None and len(self._entries) >= self.max_entries:
+            entry = self._lookup_db(slug=slug)
+        return entry
+
+    def _bump(self):
+        with self._lock:
+            self._version = None
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+    def invalidate(self):
+        # Drop this worker's copy and tell the others to drop theirs
+        caching.run_now_and_on_commit(self._bump)
+
+
+registry = CategoryRegistry()
@@ -0,0 +1,154 @@
+# Conditional GET support for the public pages
+#
+# Each page gets an ETag and Last-Modified built from things that are cheap to
+# look up: the version tokens blogs.caching and blogs.categories already keep
+# in the shared cache (bumped by blogs.signals whenever a post, its comments,
+# likes, tags or categories change), at most one small query and the viewer.
+# When the client already holds that version the view is skipped entirely and
+# a 304 goes back without touching the templates.
+#
+# Anonymous responses are marked public so a CDN can keep them; logged-in
+# ones (they show the username, like state, delete buttons...) are private.
+# Both vary on Cookie so the two never get mixed up in a shared cache.
+# Logged-in pages carry forms with the viewer's CSRF token, so their ETag
+# covers the CSRF secret too: once it rotates (at login) the browser's copy
+# would post a stale token and get a 403, so it must not be revalidated.
+
+import hashlib
+import os
+from functools import lru_cache, wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib import messages
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import caching
+from .categories import VERSION_KEY as CATEGORY_VERSION_KEY, registry as category_registry
+from .models import Post
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+
+
+def max_age():
+    return getattr(settings, 'BLOG_HTTP_MAX_AGE', 0)
+
+
+@lru_cache(maxsize=None)
+def template_stamp():
+    # Newest template mtime, so a deploy that changes the markup also changes
+    # every ETag. Computed once per process.
+    newest = 0
+    for root, _, files in os.walk(TEMPLATE_DIR):
+        for name in files:
+            newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+    return int(newest)
+
+
+def _validators(request, tokens, modified=(), extra=()):
+    # Fold tokens, modification times and the viewer into (etag, last_modified)
+    modified = [stamp for stamp in modified if stamp is not None]
+    if request.user.is_authenticated:
+        # The unmasked secret: get_token() masks it differently on every call
+        viewer = f"{request.user.pk}:{request.META.get('CSRF_COOKIE')}"
+    else:
+        viewer = 'anon'
+    parts = [request.path, request.GET.urlencode(), viewer, template_stamp()]
+    parts += [tokens[key] for key in sorted(tokens)]
+    parts += [stamp.isoformat() for stamp in modified]
+    parts += extra
+    etag = hashlib.md5('|'.join(map(str, parts)).encode(), usedforsecurity=False).hexdigest()
+    # Tokens are time_ns() values, so they double as modification times
+    seconds = [token // 1_000_000_000 for token in tokens.values() if isinstance(token, int)]
+    seconds += [int(stamp.timestamp()) for stamp in modified]
+    seconds.append(template_stamp())
+    return etag, max(seconds)
+
+
+def post_validators(request, pk):
+    updated_at = Post.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    tokens = caching.get_tokens([caching.GENERATION_KEY, CATEGORY_VERSION_KEY, caching.post_version_key(pk)])
+    return _validators(request, tokens, [updated_at])
+
+
+def category_validators(request, slug):
+    category = category_registry.get_by_slug(slug)
+    if category is None:
+        return None
+    # Catches post edits that bypass signals (queryset.update()); the count
+    # covers posts leaving the category
+    stats = Post.objects.filter(category_id=category.id).aggregate(latest=Max('updated_at'), total=Count('id'))
+    tokens = caching.get_tokens([caching.GENERATION_KEY, CATEGORY_VERSION_KEY])
+    return _validators(request, tokens, [stats['latest']], [stats['total']])
+
+
+def home_validators(request):
+    if request.user.is_authenticated:
+        return None  # redirected to the feed
+    return _validators(request, caching.get_tokens([CATEGORY_VERSION_KEY]))
+
+
+def patch_page_headers(request, response):
+    patch_vary_headers(response, ['Cookie'])
+    # A page that used a CSRF token is about to get a per-visitor cookie
+    if request.user.is_authenticated or response.cookies or request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=max_age(), must_revalidate=True)
+
+
+def _precondition(request, validators, args, kwargs):
+    # Returns (etag, last_modified, 304/412 response or None), or None when
+    # the page can't be validated and the view should just run
+    if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+        # Pending flash messages make the page one-off
+        return None
+    result = validators(request, *args, **kwargs)
+    if result is None:
+        return None
+    etag, last_modified = result
+    etag = quote_etag(etag)
+    return etag, last_modified, get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def _finish(request, response, etag, last_modified):
+    if response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+        patch_page_headers(request, response)
+    return response
+
+
+def conditional_page(validators):
+    # Like django.views.decorators.http.condition, but computes ETag and
+    # Last-Modified in one call and adds the cache headers above. Works on
+    # both the sync views and their async twins in blogs.async_views.
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_inner(request, *args, **kwargs):
+                checked = await sync_to_async(_precondition)(request, validators, args, kwargs)
+                if checked is None:
+                    return await view(request, *args, **kwargs)
+                etag, last_modified, response = checked
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(request, response, etag, last_modified)
+            return async_inner
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            checked = _precondition(request, validators, args, kwargs)
+            if checked is None:
+                return view(request, *args, **kwargs)
+            etag, last_modified, response = checked
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _finish(request, response, etag, last_modified)
+        return inner
+    return decorator
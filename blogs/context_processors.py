@@ -0,0 +1,14 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import trending as trending_feed
+from .categories import registry
+
+
+def categories(request):
+    # Sidebar categories for every page; only loaded if a template uses them
+    return {'categories': SimpleLazyObject(registry.all)}
+
+
+def trending(request):
+    # Top posts for the sidebar widget, read from the cached trending list
+    return {'trending_posts': SimpleLazyObject(lambda: trending_feed.top_posts(5))}
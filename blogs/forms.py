@@ -2,6 +2,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import Post, Comment, Category
+from .categories import registry as category_registry
 
 class RegisterForm(UserCreationForm):
     email = forms.EmailField()
@@ -34,7 +35,8 @@ class PostForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        categories = list(Category.objects.all())
+        # Choices come from the in-memory category registry, not the database
+        categories = category_registry.all()
         category_choices = [(str(category.id), category.name) for category in categories]
         category_choices.append(('other', '+ Add New Category'))
         self.fields['category'].choices = category_choices
@@ -44,10 +46,6 @@ class PostForm(forms.ModelForm):
         # If editing, prepopulate tags as comma-separated
         if self.instance.pk:
             self.fields['tags'].initial = ', '.join([tag.name for tag in self.instance.tags.all()])
-    
-    class Meta:
-        model = Post
-        fields = ['title', 'content', 'excerpt', 'featured_image']
 
     def clean(self):
         cleaned_data = super().clean()
@@ -58,10 +56,12 @@ class PostForm(forms.ModelForm):
                 raise forms.ValidationError("Please enter a new category name when selecting 'Other'")
         elif category_choice:
             try:
-                category = Category.objects.get(id=int(category_choice))
-                cleaned_data['category_instance'] = category
-            except (Category.DoesNotExist, ValueError):
+                category = category_registry.get(int(category_choice))
+            except ValueError:
+                category = None
+            if category is None:
                 raise forms.ValidationError("Invalid category selected")
+            cleaned_data['category_id'] = category.id
         return cleaned_data
 
     def save(self, commit=True):
@@ -70,9 +70,9 @@ class PostForm(forms.ModelForm):
             category, created = Category.objects.get_or_create(
                 name=self.cleaned_data.get('new_category')
             )
+            instance.category = category
         else:
-            category = self.cleaned_data.get('category_instance')
-        instance.category = category
+            instance.category_id = self.cleaned_data.get('category_id')
         if commit:
             instance.save()
         # Do NOT handle tags here; let the view handle it after instance is saved and has an ID
@@ -80,7 +80,7 @@ class PostForm(forms.ModelForm):
 
     class Meta:
         model = Post
-        fields = ['title', 'content']  # Remove category from here since we handle it specially
+        fields = ['title', 'content', 'excerpt', 'featured_image']  # Category is handled in clean()/save()
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,156 @@
+# Responsive renditions of post featured images
+#
+# Uploading a cover image stores the original only. Resized WebP and JPEG
+# copies are then produced off the request thread by a small thread pool
+# (Pillow releases the GIL while resizing and encoding) and recorded on the
+# post, so the templates can emit srcset/width/height instead of shipping the
+# full-size original to every card in the feed.
+#
+# render_renditions() is a pure bytes-in/bytes-out function so the backfill
+# command can run it in worker processes as well.
+
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from . import caching
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+
+
+def rendition_widths():
+    return tuple(sorted(getattr(settings, 'BLOG_IMAGE_WIDTHS', (320, 640, 1280))))
+
+
+def render_renditions(data, widths):
+    """
+    Resize the image in `data` to every width in `widths` that is smaller
+    than the original (plus the original width itself) and return
+    (width, height, {width: {'height': h, 'webp': bytes, 'jpeg': bytes}}).
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        width, height = image.size
+        targets = [w for w in widths if w < width] + [width]
+
+        renditions = {}
+        for target in targets:
+            resized = image
+            if target != width:
+                resized = image.resize((target, max(1, round(height * target / width))), Image.LANCZOS)
+            entry = {'height': resized.height}
+            for fmt, (pil_format, options) in RENDITION_FORMATS.items():
+                frame = resized.convert('RGB') if pil_format == 'JPEG' else resized
+                buffer = io.BytesIO()
+                frame.save(buffer, pil_format, **options)
+                entry[fmt] = buffer.getvalue()
+            renditions[target] = entry
+    return width, height, renditions
+
+
+def rendition_name(source_name, width, fmt):
+    base, _ = posixpath.splitext(posixpath.basename(source_name))
+    ext = 'jpg' if fmt == 'jpeg' else fmt
+    return f"posts/renditions/{base}-{width}w.{ext}"
+
+
+def store_renditions(post_id, source_name, result):
+    # Save the encoded renditions and record them on the post, unless the
+    # post got a different image in the meantime
+    width, height, renditions = result
+    stored = {}
+    for target, entry in renditions.items():
+        files = {}
+        for fmt in RENDITION_FORMATS:
+            name = default_storage.save(rendition_name(source_name, target, fmt), ContentFile(entry[fmt]))
+            files[fmt] = name
+        stored[str(target)] = {'height': entry['height'], **files}
+
+    manifest = {'source': source_name, 'sizes': stored}
+    updated = Post.objects.filter(pk=post_id, featured_image=source_name).update(
+        image_width=width, image_height=height, image_renditions=manifest,
+    )
+    if not updated:
+        delete_rendition_files(manifest)
+        return False
+    caching.invalidate_post(post_id)
+    return True
+
+
+def delete_rendition_files(manifest):
+    for entry in (manifest or {}).get('sizes', {}).values():
+        for fmt in RENDITION_FORMATS:
+            if entry.get(fmt):
+                default_storage.delete(entry[fmt])
+
+
+def generate_renditions(post_id):
+    post = Post.objects.only('id', 'featured_image', 'image_renditions').filter(pk=post_id).first()
+    if post is None or not post.featured_image:
+        return False
+    source_name = post.featured_image.name
+    with default_storage.open(source_name, 'rb') as handle:
+        data = handle.read()
+    result = render_renditions(data, rendition_widths())
+    old_manifest = post.image_renditions
+    if store_renditions(post_id, source_name, result):
+        delete_rendition_files(old_manifest)
+        return True
+    return False
+
+
+def _run_in_background(post_id):
+    try:
+        generate_renditions(post_id)
+    except Exception:
+        logger.exception("Could not generate image renditions for post %s", post_id)
+    finally:
+        # Worker threads open their own connections; don't leak them
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'BLOG_IMAGE_WORKERS', 2),
+            thread_name_prefix='blog-images',
+        )
+    return _executor
+
+
+def needs_renditions(post):
+    source = (post.image_renditions or {}).get('source')
+    return bool(post.featured_image) and source != post.featured_image.name
+
+
+def clear_renditions(post):
+    # The cover image was removed: drop the stale renditions as well
+    delete_rendition_files(post.image_renditions)
+    Post.objects.filter(pk=post.pk).update(image_width=None, image_height=None, image_renditions={})
+
+
+def schedule_renditions(post):
+    # Queue rendition work once the transaction that saved the post commits
+    post_id = post.pk
+    if getattr(settings, 'BLOG_IMAGE_ASYNC', True):
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_background, post_id))
+    else:
+        transaction.on_commit(lambda: generate_renditions(post_id))
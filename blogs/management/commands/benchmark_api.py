@@ -0,0 +1,79 @@
+import gzip
+import json
+
+from django.core import serializers
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from blogs import api
+from blogs.benchmarks import seed_blog, summarize, temporary_database, time_calls
+from blogs.models import Post
+
+
+def _dumps(payload):
+    return json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+
+def strategies(count):
+    # name -> callable returning the encoded JSON for `count` posts
+    queryset = Post.objects.order_by('-created_at', '-id')
+
+    def instances():
+        # What a hand-written serializer over model instances would do
+        posts = list(Post.objects.feed()[:count])
+        return _dumps([{
+            'id': post.pk, 'title': post.title, 'summary': post.summary,
+            'author': post.author.username, 'category': post.category.slug if post.category else None,
+            'created_at': post.created_at, 'updated_at': post.updated_at,
+            'like_count': post.like_count, 'bookmark_count': post.bookmark_count,
+            'comment_count': post.comment_count, 'tags': [tag.slug for tag in post.tags.all()],
+        } for post in posts])
+
+    def values(fields):
+        return lambda: _dumps(api.serialize_posts(api.post_rows(queryset, fields)[:count], fields))
+
+    return {
+        'django serializers': lambda: serializers.serialize('json', queryset[:count]).encode(),
+        'model instances': instances,
+        'values, all fields': values(api.ALL_POST_FIELDS),
+        'values, feed fields': values(api.FEED_FIELDS),
+        'values, id/title/summary': values(['id', 'title', 'summary']),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Serialization cost of the JSON API per 1,000 posts: .values() rows "
+        "versus model instances and Django's serializers, with compressed sizes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000, help="Posts serialized per call")
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--json', action='store_true', help="Print the raw results as JSON")
+
+    def handle(self, *args, **options):
+        count = options['posts']
+        scale = 1000 / count
+        results = []
+        with temporary_database():
+            seed_blog(posts=count, users=50, comments=count, likes=count, seed=2)
+            for name, call in strategies(count).items():
+                body = call()
+                samples = [ms * scale for ms in time_calls(call, options['repeat'])]
+                row = {'strategy': name, 'kb': round(len(body) * scale / 1024, 1), **summarize(samples)}
+                row['gzip_kb'] = round(len(gzip.compress(body, compresslevel=6)) * scale / 1024, 1)
+                if api.brotli is not None:
+                    row['br_kb'] = round(len(api.brotli.compress(body, quality=5)) * scale / 1024, 1)
+                results.append(row)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"Per 1,000 posts (measured on {count}):")
+        self.stdout.write(f"{'strategy':<26}{'p50 ms':>10}{'p95 ms':>10}{'KB':>10}{'gzip KB':>10}{'br KB':>10}")
+        for row in results:
+            self.stdout.write(
+                f"{row['strategy']:<26}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+                f"{row['kb']:>10.1f}{row['gzip_kb']:>10.1f}{row.get('br_kb', float('nan')):>10.1f}"
+            )
@@ -0,0 +1,41 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from blogs.benchmarks import concurrent_sqlite_writes
+from my_blog.database import sqlite_options
+
+# Python's sqlite3 defaults: rollback journal, DEFERRED transactions, 5s busy timeout
+PLAIN_OPTIONS = {'timeout': 5}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent SQLite write throughput and 'database is locked' "
+        "errors between plain connections and the tuned profile from my_blog/database.py "
+        "(with SQLITE_WAL on)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+        parser.add_argument('--writes', type=int, default=200, help="Transactions per thread")
+        parser.add_argument('--json', action='store_true', help="Print the raw results as JSON")
+
+    def handle(self, *args, **options):
+        results = []
+        for profile, db_options in (('plain', PLAIN_OPTIONS), ('tuned', sqlite_options(wal=True))):
+            for threads in options['threads']:
+                with tempfile.TemporaryDirectory() as tmp:
+                    row = concurrent_sqlite_writes(Path(tmp) / 'bench.sqlite3', db_options, threads, options['writes'])
+                results.append({'profile': profile, **row})
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'profile':<8}{'threads':>8}{'writes':>8}{'errors':>8}{'writes/s':>12}")
+        for row in results:
+            self.stdout.write(
+                f"{row['profile']:<8}{row['threads']:>8}{row['writes']:>8}{row['errors']:>8}{row['writes_per_sec']:>12.1f}"
+            )
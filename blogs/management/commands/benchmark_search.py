@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from blogs.benchmarks import create_posts, summarize, temporary_database, time_calls
+from blogs.models import Post
+from blogs.search import SimpleSearchBackend, get_search_backend
+
+DEFAULT_QUERIES = ['django', 'cache query', 'render template', 'kubernetes docker', 'pyth']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare search latency of the configured full-text backend against the "
+        "old icontains search on a throwaway database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+        parser.add_argument('--queries', nargs='+', default=DEFAULT_QUERIES)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--json', action='store_true', help="Print the raw results as JSON")
+
+    def handle(self, *args, **options):
+        results = []
+        with temporary_database():
+            fulltext = get_search_backend()
+            baseline = SimpleSearchBackend()
+            for size in sorted(options['sizes']):
+                create_posts(size - Post.objects.count())
+                fulltext.rebuild()
+                for backend in (baseline, fulltext):
+                    samples = []
+                    for query in options['queries']:
+                        def run(query=query):
+                            # A results page: total count plus the first page
+                            hits = backend.search(query)
+                            hits.count()
+                            hits[:options['page_size']]
+                        samples += time_calls(run, options['repeat'])
+                    results.append({
+                        'posts': size,
+                        'backend': backend.__class__.__name__,
+                        **summarize(samples),
+                    })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'posts':>8}  {'backend':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for row in results:
+            self.stdout.write(
+                f"{row['posts']:>8}  {row['backend']:<24}"
+                f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}"
+            )
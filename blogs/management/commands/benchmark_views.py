@@ -0,0 +1,135 @@
+import json
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from blogs.benchmarks import seed_blog, summarize, temporary_database, time_calls
+from blogs.models import Category, Post
+
+# Most queries a single request of each scenario may run, whatever the
+# dataset size. Raising one of these should be a deliberate change.
+QUERY_BUDGETS = {
+    'index': 5,
+    'post_detail': 7,
+    'search_posts': 7,
+    'category_posts': 6,
+    'toggle_like': 12,  # the "like" half of the toggle; unliking runs fewer
+    'post_create': 22,  # includes the incremental related-posts update
+}
+
+# Keep the benchmark's cache entries away from the real cache backend
+BENCH_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench'}}
+
+
+def scenarios(client):
+    # name -> callable issuing one request, like a logged-in reader would
+    busiest = Post.objects.order_by('-comment_count', '-id').first()
+    category = Category.objects.order_by('id').first()
+    created = iter(range(10**9))
+    return {
+        'index': lambda: client.get(reverse('index')),
+        'post_detail': lambda: client.get(reverse('post_detail', args=[busiest.pk])),
+        'search_posts': lambda: client.get(reverse('search_posts'), {'q': 'django cache'}),
+        'category_posts': lambda: client.get(reverse('category_posts', args=[category.slug])),
+        'toggle_like': lambda: client.post(
+            reverse('toggle_like', args=[busiest.pk]), HTTP_ACCEPT='application/json'
+        ),
+        'post_create': lambda: client.post(reverse('post_create'), {
+            'title': f'Benchmark post {next(created)}',
+            'content': 'Benchmark body ' * 50,
+            'category': str(category.pk),
+            'tags': 'django, benchmark, performance',
+        }),
+    }
+
+
+def measure(name, call, repeat):
+    response = call()  # warm caches and check the scenario works
+    if response.status_code >= 400:
+        raise CommandError(f"{name} returned {response.status_code}")
+    with CaptureQueriesContext(connection) as queries:
+        call()
+    # Read it now: the next request clears the connection's query log
+    query_count = len(queries)
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'queries': query_count,
+        'peak_kb': round(peak / 1024, 1),
+        **summarize(time_calls(call, repeat)),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the hot views through the test client on seeded throwaway "
+        "databases: latency percentiles, query counts and peak memory per view. "
+        "Fails if a view runs more queries than its budget or than a baseline run"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000], help="Posts per dataset")
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--views', nargs='+', choices=sorted(QUERY_BUDGETS), default=sorted(QUERY_BUDGETS))
+        parser.add_argument('--output', help="Write the JSON results to this file")
+        parser.add_argument('--baseline', help="JSON from an earlier run; fail if any query count went up")
+        parser.add_argument('--json', action='store_true', help="Print the raw results as JSON")
+
+    def handle(self, *args, **options):
+        results = []
+        setup_test_environment(debug=False)  # no per-query logging skewing the numbers
+        try:
+            with override_settings(CACHES=BENCH_CACHES, BLOG_PAGE_CACHE_TIMEOUT=0), temporary_database():
+                seeded = 0
+                for size in sorted(options['sizes']):
+                    seed_blog(posts=size - seeded, users=200, comments=size * 5, likes=size * 5, seed=1)
+                    seeded = size
+                    client = Client()
+                    client.login(username='seed1-user0', password='seed-pass-123')
+                    calls = scenarios(client)
+                    for name in options['views']:
+                        results.append({'posts': size, 'view': name, **measure(name, calls[name], options['repeat'])})
+        finally:
+            teardown_test_environment()
+
+        payload = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(payload + '\n')
+        if options['json']:
+            self.stdout.write(payload)
+        else:
+            self.stdout.write(
+                f"{'posts':>8}  {'view':<16}{'queries':>8}{'peak KB':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            )
+            for row in results:
+                self.stdout.write(
+                    f"{row['posts']:>8}  {row['view']:<16}{row['queries']:>8}{row['peak_kb']:>10.1f}"
+                    f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}"
+                )
+
+        problems = check_regressions(results, options['baseline'])
+        if problems:
+            raise CommandError("Query count regressions:\n  " + "\n  ".join(problems))
+
+
+def check_regressions(results, baseline_path=None):
+    problems = []
+    baseline = {}
+    if baseline_path:
+        with open(baseline_path) as fh:
+            baseline = {(row['posts'], row['view']): row['queries'] for row in json.load(fh)}
+    for row in results:
+        budget = QUERY_BUDGETS[row['view']]
+        if row['queries'] > budget:
+            problems.append(f"{row['view']} at {row['posts']} posts: {row['queries']} queries, budget {budget}")
+        before = baseline.get((row['posts'], row['view']))
+        if before is not None and row['queries'] > before:
+            problems.append(f"{row['view']} at {row['posts']} posts: {row['queries']} queries, baseline {before}")
+    return problems
@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from blogs.transfer import export_lines, open_dump
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream users, categories, tags, posts, comments, likes and bookmarks "
+        "as NDJSON (use a .gz path to compress)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-', help="File to write, or - for stdout")
+        parser.add_argument(
+            '--chunk-size', type=int, default=None,
+            help="Rows fetched from the database per round trip (default BLOG_EXPORT_CHUNK_SIZE)",
+        )
+
+    def handle(self, *args, **options):
+        path = options['output']
+        lines = export_lines(chunk_size=options['chunk_size'])
+        if path == '-':
+            sys.stdout.writelines(lines)
+            return
+        written = 0
+        with open_dump(path, 'w') as output:
+            for line in lines:
+                output.write(line)
+                written += 1
+        self.stderr.write(self.style.SUCCESS(f"Exported {written - 1} records to {path}"))
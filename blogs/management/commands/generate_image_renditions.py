@@ -0,0 +1,74 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from blogs import images
+from blogs.models import Post
+
+
+class Command(BaseCommand):
+    help = "Generate responsive renditions for existing featured images, in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Number of worker processes")
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Regenerate renditions even for posts that already have them",
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(featured_image='').exclude(featured_image__isnull=True)
+        todo = [
+            (post.pk, post.featured_image.name, post.image_renditions)
+            for post in posts.only('id', 'featured_image', 'image_renditions').iterator()
+            if options['force'] or images.needs_renditions(post)
+        ]
+        if not todo:
+            self.stdout.write("All featured images already have renditions")
+            return
+
+        # Resizing and encoding run in worker processes; reading the source
+        # files and saving the results stays in this process. Close the
+        # database connections first so forked workers don't share them.
+        connections.close_all()
+        widths = images.rendition_widths()
+        max_in_flight = options['workers'] * 2
+        self.done = self.failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            pending = {}
+            for post_id, name, manifest in todo:
+                # Keep only a few source images in memory at a time
+                if len(pending) >= max_in_flight:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        self.store(future, pending.pop(future), len(todo))
+                try:
+                    with default_storage.open(name, 'rb') as handle:
+                        data = handle.read()
+                except OSError as exc:
+                    # e.g. the file is gone from storage; skip this post only
+                    self.failed += 1
+                    self.stderr.write(f"Post {post_id}: {exc}")
+                    continue
+                pending[pool.submit(images.render_renditions, data, widths)] = (post_id, name, manifest)
+            for future in as_completed(list(pending)):
+                self.store(future, pending.pop(future), len(todo))
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated renditions for {self.done} posts ({self.failed} failed)"
+        ))
+
+    def store(self, future, job, total):
+        post_id, name, manifest = job
+        try:
+            stored = images.store_renditions(post_id, name, future.result())
+        except Exception as exc:
+            self.failed += 1
+            self.stderr.write(f"Post {post_id}: {exc}")
+            return
+        if stored:
+            images.delete_rendition_files(manifest)
+            self.done += 1
+        self.stdout.write(f"\r{self.done + self.failed}/{total}", ending='')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blogs.transfer import TransferError, import_lines, open_dump
+
+
+class Command(BaseCommand):
+    help = (
+        "Load an export_blog NDJSON file with batched bulk inserts. Safe to "
+        "re-run after a failure: rows imported earlier are skipped"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="NDJSON file written by export_blog (.gz allowed)")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Records per transaction")
+
+    def progress(self, kind, created, skipped):
+        self.stdout.write(f"{kind}: {created} imported, {skipped} skipped")
+
+    def handle(self, *args, **options):
+        try:
+            with open_dump(options['input'], 'r') as lines:
+                created, skipped = import_lines(lines, options['batch_size'], self.progress)
+        except (OSError, TransferError) as exc:
+            raise CommandError(f"Import failed: {exc}. Fix the problem and run the same command again to resume.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {sum(created.values())} records"
+            + (f", skipped {sum(skipped.values())} with missing references" if skipped else "")
+        ))
@@ -0,0 +1,79 @@
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blogs.benchmarks import summarize
+
+DEFAULT_PATHS = ['/', '/search/?q=python']
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer a running server with concurrent GETs and report requests/sec "
+        "and latency percentiles. Run it once against the sync gunicorn setup "
+        "and once against the uvicorn workers to compare (see the README)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help="e.g. http://127.0.0.1:8000")
+        parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS,
+                            help="Paths requested round-robin")
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--label', default='', help="Name for this run in the output, e.g. wsgi or asgi")
+        parser.add_argument('--json', action='store_true', help="Print the raw results as JSON")
+
+    def handle(self, *args, **options):
+        target = urlsplit(options['base_url'])
+        if target.scheme not in ('http', 'https') or not target.netloc:
+            raise CommandError("base_url must look like http://host:port")
+        connection_class = http.client.HTTPSConnection if target.scheme == 'https' else http.client.HTTPConnection
+        paths = options['paths']
+        local = threading.local()
+
+        def fetch(i):
+            # One keep-alive connection per client thread
+            if getattr(local, 'conn', None) is None:
+                local.conn = connection_class(target.netloc, timeout=30)
+            started = time.perf_counter()
+            try:
+                local.conn.request('GET', paths[i % len(paths)])
+                response = local.conn.getresponse()
+                response.read()
+                ok = response.status < 500
+            except (OSError, http.client.HTTPException):
+                local.conn.close()
+                local.conn = None
+                ok = False
+            return (time.perf_counter() - started) * 1000, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            outcomes = list(pool.map(fetch, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        samples = [ms for ms, ok in outcomes if ok]
+        result = {
+            'label': options['label'],
+            'concurrency': options['concurrency'],
+            'requests': len(outcomes),
+            'errors': len(outcomes) - len(samples),
+            'requests_per_sec': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+            **summarize(samples),
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        self.stdout.write(
+            f"{result['label'] or options['base_url']}: {result['requests']} requests at "
+            f"concurrency {result['concurrency']}, {result['errors']} errors"
+        )
+        self.stdout.write(
+            f"  {result['requests_per_sec']:.1f} req/s   p50 {result['p50_ms']:.1f} ms   "
+            f"p95 {result['p95_ms']:.1f} ms   p99 {result['p99_ms']:.1f} ms"
+        )
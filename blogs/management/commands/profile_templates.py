@@ -0,0 +1,79 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from blogs import caching, profiling
+from blogs.benchmarks import SEED_PASSWORD, seed_blog, temporary_database
+from blogs.models import Category, Post
+
+from .benchmark_views import BENCH_CACHES
+
+
+def pages(client, anonymous):
+    # name -> callable rendering one page
+    busiest = Post.objects.order_by('-comment_count', '-id').first()
+    category = Category.objects.order_by('id').first()
+    return {
+        'public_home': lambda: anonymous.get(reverse('public_home')),
+        'index': lambda: client.get(reverse('index')),
+        'post_detail': lambda: client.get(reverse('post_detail', args=[busiest.pk])),
+        'category_posts': lambda: client.get(reverse('category_posts', args=[category.slug])),
+    }
+
+
+def profile_page(name, call, repeat, warm=False, limit=15):
+    # Average per-request report over `repeat` renders. Unless `warm`, the
+    # post fragments are invalidated first so the cards are rendered too
+    response = call()
+    if response.status_code >= 400:
+        raise CommandError(f"{name} returned {response.status_code}")
+    with profiling.profile() as profile:
+        for _ in range(repeat):
+            if not warm:
+                caching.invalidate_all_fragments()
+            call()
+    return profile.report(limit=limit, runs=repeat)
+
+
+class Command(BaseCommand):
+    help = (
+        "Profile template rendering of the main pages on a seeded throwaway "
+        "database: time per template and the slowest tags, per request"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--pages', nargs='+', choices=['public_home', 'index', 'post_detail', 'category_posts'])
+        parser.add_argument('--warm', action='store_true', help="Keep cached post fragments between requests")
+        parser.add_argument('--nodes', type=int, default=15, help="Slowest tags listed per page")
+        parser.add_argument('--json', action='store_true', help="Print the raw results as JSON")
+
+    def handle(self, *args, **options):
+        results = {}
+        with override_settings(CACHES=BENCH_CACHES, BLOG_PAGE_CACHE_TIMEOUT=0), temporary_database():
+            seed_blog(posts=options['posts'], users=50, comments=options['posts'] * 5, likes=options['posts'] * 5, seed=3)
+            client = Client()
+            client.login(username='seed3-user0', password=SEED_PASSWORD)
+            calls = pages(client, Client())
+            for name in options['pages'] or calls:
+                results[name] = profile_page(name, calls[name], options['repeat'], options['warm'], options['nodes'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name, report in results.items():
+            self.stdout.write(f"\n{name} (ms per request)")
+            self.stdout.write(f"  {'template':<64}{'calls':>8}{'total':>10}{'self':>10}")
+            for row in report['templates']:
+                self.stdout.write(
+                    f"  {row['template']:<64}{row['calls']:>8}{row['total_ms']:>10.2f}{row['self_ms']:>10.2f}"
+                )
+            self.stdout.write(f"  {'slowest tags (by self time)':<64}{'calls':>8}{'total':>10}{'self':>10}")
+            for row in report['nodes']:
+                where = f"{row['template'].rsplit('/', 1)[-1]}:{row['line']}"
+                self.stdout.write(
+                    f"  {where:<28}{row['node'][:35]:<36}{row['calls']:>8}{row['total_ms']:>10.2f}{row['self_ms']:>10.2f}"
+                )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from blogs import related
+
+
+class Command(BaseCommand):
+    help = "Recompute the related-posts table from shared tags and categories"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of related-post rows inserted per statement",
+        )
+
+    def handle(self, *args, **options):
+        written = related.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Stored {written} related-post links"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from blogs import trending
+
+
+class Command(BaseCommand):
+    help = "Apply time decay to post trending scores (run periodically, e.g. hourly from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--elapsed', type=float, default=None,
+            help="Seconds of decay to apply (default: time since the previous run)",
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Recompute every score from the counters instead of decaying",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of posts (by id range) updated per statement",
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            changed = trending.rebuild_scores(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt trending scores, {changed} posts changed"))
+            return
+        updated, factor = trending.apply_decay(
+            elapsed=options['elapsed'], batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Decayed {updated} trending scores by a factor of {factor:.4f}"
+        ))
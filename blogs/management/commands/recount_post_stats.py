@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from blogs.models import Post
+
+
+class Command(BaseCommand):
+    help = "Recompute the like/bookmark/comment counter columns on Post from the relation tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of posts (by id range) updated per transaction",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = Post.objects.aggregate(last=Max('id'))['last'] or 0
+        updated = 0
+        # Walk the table in id ranges so each UPDATE only locks a slice of it
+        for start in range(0, last_id, batch_size):
+            with transaction.atomic():
+                updated += Post.objects.filter(
+                    id__gt=start, id__lte=start + batch_size
+                ).recount_stats()
+        self.stdout.write(self.style.SUCCESS(f"Recounted stats for {updated} posts"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from blogs.benchmarks import SEED_PASSWORD, seed_blog
+from blogs.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with generated users, categories, tags, posts, "
+        "comments and likes using batched bulk inserts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--likes', type=int, default=5000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0, help="Same seed, same data")
+
+    def handle(self, *args, **options):
+        seed_blog(
+            posts=options['posts'],
+            users=options['users'],
+            comments=options['comments'],
+            likes=options['likes'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Database now has {Post.objects.count()} posts and {Comment.objects.count()} comments. "
+            f"Seeded users are seed{options['seed']}-user0... with password {SEED_PASSWORD!r}"
+        ))
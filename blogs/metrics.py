@@ -0,0 +1,179 @@
+# Per-request instrumentation
+#
+# RequestMetricsMiddleware (blogs.middleware) opens a RequestMetrics for
+# every request. While it is active, a connection.execute_wrapper counts the
+# SQL queries, their total time and how often each query shape repeats (the
+# same SELECT ten times over is an N+1), and the template backend reports
+# how long rendering took. At the end the numbers go out as a Server-Timing
+# header and a structured log line, and are folded into a per-view histogram
+# that the staff-only /metrics page renders in Prometheus text format.
+#
+# The work per query is a perf_counter() pair, one regex and a dict update,
+# cheap enough to keep on in production.
+
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Request duration buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('blog_request_metrics', default=None)
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+
+def enabled():
+    return getattr(settings, 'BLOG_REQUEST_METRICS', True)
+
+
+def nplusone_threshold():
+    # A query shape repeated this many times in one request gets logged
+    return getattr(settings, 'BLOG_NPLUSONE_THRESHOLD', 5)
+
+
+def fingerprint(sql):
+    # Queries differ only by their parameters, except IN lists whose length
+    # varies; fold those so "WHERE id IN (%s, %s)" matches any list
+    return _IN_LIST.sub('(...)', sql)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.shapes = Counter()
+        self._render_depth = 0
+
+    # connection.execute_wrapper hook
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.shapes[fingerprint(sql)] += 1
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def duplicate_queries(self):
+        return sum(count - 1 for count in self.shapes.values() if count > 1)
+
+    def repeated_shapes(self, threshold):
+        return [(sql, count) for sql, count in self.shapes.most_common() if count >= threshold]
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries, {self.duplicate_queries} duplicate"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def activate(metrics):
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def install_template_timer():
+    # Wrap the Django template backend's render() once so the time spent
+    # rendering is charged to the active request. Nested renders ({% include %},
+    # render_to_string inside a view...) only count the outermost call.
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, '_blog_timed', False):
+        return
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return original(self, context, request)
+        metrics._render_depth += 1
+        started = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            metrics._render_depth -= 1
+            if not metrics._render_depth:
+                metrics.template_time += time.perf_counter() - started
+
+    render._blog_timed = True
+    Template.render = render
+
+
+class Histogram:
+    # Per-view request statistics for this worker process
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, duration, metrics):
+        with self._lock:
+            entry = self._views.get(view)
+            if entry is None:
+                entry = self._views[view] = {
+                    'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0,
+                    'queries': 0, 'db_seconds': 0.0, 'template_seconds': 0.0, 'duplicate_queries': 0,
+                }
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    entry['buckets'][i] += 1
+            entry['count'] += 1
+            entry['sum'] += duration
+            entry['queries'] += metrics.queries
+            entry['db_seconds'] += metrics.db_time
+            entry['template_seconds'] += metrics.template_time
+            entry['duplicate_queries'] += metrics.duplicate_queries
+
+    def snapshot(self):
+        with self._lock:
+            return {view: {**entry, 'buckets': list(entry['buckets'])} for view, entry in self._views.items()}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def prometheus(self):
+        lines = [
+            '# HELP blog_request_duration_seconds Time spent handling a request, by view.',
+            '# TYPE blog_request_duration_seconds histogram',
+        ]
+        views = sorted(self.snapshot().items())
+        for view, entry in views:
+            label = view.replace('\\', '\\\\').replace('"', '\\"')
+            for bound, count in zip(BUCKETS, entry['buckets']):
+                lines.append(f'blog_request_duration_seconds_bucket{{view="{label}",le="{bound}"}} {count}')
+            lines.append(f'blog_request_duration_seconds_bucket{{view="{label}",le="+Inf"}} {entry["count"]}')
+            lines.append(f'blog_request_duration_seconds_sum{{view="{label}"}} {entry["sum"]:.6f}')
+            lines.append(f'blog_request_duration_seconds_count{{view="{label}"}} {entry["count"]}')
+        for name, key, kind, help_text in (
+            ('blog_request_queries_total', 'queries', 'counter', 'SQL queries issued, by view.'),
+            ('blog_request_duplicate_queries_total', 'duplicate_queries', 'counter',
+             'Queries repeating a shape already run in the same request, by view.'),
+            ('blog_request_db_seconds_total', 'db_seconds', 'counter', 'Time spent in SQL, by view.'),
+            ('blog_request_template_seconds_total', 'template_seconds', 'counter',
+             'Time spent rendering templates, by view.'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for view, entry in views:
+                label = view.replace('\\', '\\\\').replace('"', '\\"')
+                value = entry[key]
+                lines.append(f'{name}{{view="{label}"}} {value:.6f}' if isinstance(value, float) else f'{name}{{view="{label}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+histogram = Histogram()
@@ -0,0 +1,341 @@
+# Full-page cache for logged-out readers
+#
+# Sits in front of the session and auth middleware. A GET without a session
+# cookie is an anonymous reader, so for the pages in CACHED_PAGES the stored
+# response is returned straight away: no session lookup, no auth, no template
+# rendering.
+#
+# Entries are stored per URL together with the content version they were
+# rendered from (the same tokens blogs.signals bumps on post, comment,
+# category and tag writes). An entry is served as-is while it is fresh and
+# its version is current. Once it expires or the version moves on, one
+# request takes a short lock and re-renders the page while everybody else
+# keeps getting the stale copy, so a popular page expiring doesn't send every
+# worker to the database at once.
+#
+# Every middleware here can run sync or async (sync_capable and
+# async_capable, __acall__ under ASGI). One sync-only middleware would make
+# Django run the rest of the chain, async views included, on a thread that
+# blocks for the whole request. Their own cache and database work goes
+# through sync_to_async.
+
+import hashlib
+import json
+import logging
+import time
+from contextlib import ExitStack
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import caching, metrics, profiling, routers
+from .categories import VERSION_KEY as CATEGORY_VERSION_KEY
+
+# Cached pages and the query parameters each one reads. Only those go into
+# the cache key: ?utm_source=... or a cache-busting ?x=123 gets the same
+# entry as the bare URL instead of a fresh render and an entry of its own.
+CACHED_PAGES = {
+    'public_home': (),
+    'post_detail': ('comments_after',),
+}
+LOCK_TIMEOUT = 30
+
+logger = logging.getLogger('blogs.requests')
+template_logger = logging.getLogger('blogs.templates')
+
+
+def page_cache_timeout():
+    return getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', 60)
+
+
+def page_cache_stale():
+    # How long an expired page may still be served while it is rebuilt
+    return getattr(settings, 'BLOG_PAGE_CACHE_STALE', 300)
+
+
+def _page_params(request, match):
+    return [(name, request.GET[name]) for name in CACHED_PAGES[match.url_name] if name in request.GET]
+
+
+def _page_key(path, params=()):
+    url = path + ('?' + urlencode(params) if params else '')
+    return 'blog:page:' + hashlib.md5(url.encode(), usedforsecurity=False).hexdigest()
+
+
+def _content_version(match):
+    keys = [caching.GENERATION_KEY, CATEGORY_VERSION_KEY]
+    if 'pk' in match.kwargs:
+        keys.append(caching.post_version_key(match.kwargs['pk']))
+    tokens = caching.get_tokens(keys)
+    return ':'.join(str(tokens[key]) for key in keys)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    # WhiteNoise, able to sit in an async chain: static files are found and
+    # served as before (on a thread), other requests go straight on
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class AnonymousPageCacheMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        cached, pending = self._lookup(request)
+        if cached is not None:
+            return cached
+        if pending is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+            self._save(request, response, pending)
+        finally:
+            self._unlock(pending)
+        return response
+
+    async def __acall__(self, request):
+        cached, pending = await sync_to_async(self._lookup)(request)
+        if cached is not None:
+            return cached
+        if pending is None:
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+            await sync_to_async(self._save)(request, response, pending)
+        finally:
+            await sync_to_async(self._unlock)(pending)
+        return response
+
+    def _lookup(self, request):
+        # (cached response, None) when the page can be served from the
+        # cache, (None, (key, version, entry, locked)) when it has to be
+        # rendered and stored, (None, None) when it isn't cached at all
+        match = self._cacheable_page(request)
+        if match is None:
+            return None, None
+
+        key = _page_key(request.path, _page_params(request, match))
+        version = _content_version(match)
+        entry = cache.get(key)
+        locked = False
+        if entry is not None:
+            if entry['version'] == version and entry['fresh_until'] > time.time():
+                caching.stats.record('page', True)
+                request.resolver_match = match  # so request metrics know the view
+                return self._cached_response(request, entry, 'hit'), None
+            locked = cache.add(key + ':lock', 1, LOCK_TIMEOUT)
+            if not locked:
+                # Someone else is already rebuilding this page
+                caching.stats.record('page', True)
+                request.resolver_match = match
+                return self._cached_response(request, entry, 'stale'), None
+        caching.stats.record('page', False)
+        return None, (key, version, entry, locked)
+
+    def _save(self, request, response, pending):
+        key, version, entry, _ = pending
+        if self._storable(response):
+            self._store(key, version, response, request)
+        elif entry is not None:
+            # e.g. the post was deleted; stop serving the old copy
+            cache.delete(key)
+        response['X-Page-Cache'] = 'miss'
+
+    def _unlock(self, pending):
+        key, _, _, locked = pending
+        if locked:
+            cache.delete(key + ':lock')
+
+    def _cacheable_page(self, request):
+        if not page_cache_timeout() or request.method != 'GET':
+            return None
+        if settings.SESSION_COOKIE_NAME in request.COOKIES or 'messages' in request.COOKIES:
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        return match if match.url_name in CACHED_PAGES else None
+
+    def _storable(self, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies  # e.g. a CSRF cookie: the page is per-visitor
+            and 'private' not in response.get('Cache-Control', '')
+        )
+
+    def _store(self, key, version, response, request):
+        fresh = page_cache_timeout()
+        if routers.served_from_replica(request):
+            # Possibly behind the version it is stored under: keep it for the
+            # replication lag only, and never serve it stale after that
+            fresh = keep = routers.cache_timeout(fresh, request)
+        else:
+            keep = fresh + page_cache_stale()
+        entry = {
+            'version': version,
+            'fresh_until': time.time() + fresh,
+            'status': response.status_code,
+            'content': response.content,
+            'headers': list(response.items()),
+        }
+        cache.set(key, entry, keep)
+
+    def _cached_response(self, request, entry, state):
+        headers = dict(entry['headers'])
+        etag = headers.get('ETag')
+        response = None
+        if etag:
+            response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(entry['content'], status=entry['status'])
+        for header, value in headers.items():
+            if response.status_code == 200 or header in ('ETag', 'Last-Modified', 'Cache-Control', 'Vary'):
+                response[header] = value
+        response['X-Page-Cache'] = state
+        return response
+
+
+def _time_queries(stack, current):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(current))
+
+
+class RequestMetricsMiddleware:
+    # Query count, DB time, duplicate queries, template and total time for
+    # every request; see blogs/metrics.py. Goes first in MIDDLEWARE so page
+    # cache hits are measured too.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        metrics.install_template_timer()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not metrics.enabled():
+            return self.get_response(request)
+        current = metrics.RequestMetrics()
+        token = metrics.activate(current)
+        try:
+            with ExitStack() as stack:
+                _time_queries(stack, current)
+                response = self.get_response(request)
+        finally:
+            metrics.deactivate(token)
+        return self._report(request, response, current)
+
+    async def __acall__(self, request):
+        if not metrics.enabled():
+            return await self.get_response(request)
+        current = metrics.RequestMetrics()
+        token = metrics.activate(current)
+        stack = ExitStack()
+        try:
+            # Connections are per thread: wrap the ones of the thread the
+            # request's sync_to_async calls (and so its queries) run on
+            await sync_to_async(_time_queries)(stack, current)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            metrics.deactivate(token)
+        return self._report(request, response, current)
+
+    def _report(self, request, response, current):
+        total = current.elapsed
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match and match.view_name else 'unresolved'
+        response['Server-Timing'] = current.server_timing(total)
+        metrics.histogram.observe(view, total, current)
+
+        logger.info(json.dumps({
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 1),
+            'db_ms': round(current.db_time * 1000, 1),
+            'template_ms': round(current.template_time * 1000, 1),
+            'queries': current.queries,
+            'duplicate_queries': current.duplicate_queries,
+        }))
+        for sql, count in current.repeated_shapes(metrics.nplusone_threshold()):
+            logger.warning(json.dumps({'view': view, 'path': request.path, 'repeated_query': sql, 'count': count}))
+        return response
+
+
+class TemplateProfilerMiddleware:
+    # Development only: per-template and per-tag render times of every
+    # request, logged on blogs.templates (see blogs/profiling.py). Removes
+    # itself unless DEBUG and BLOG_TEMPLATE_PROFILER are both on.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not profiling.enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with profiling.profile() as profile:
+            response = self.get_response(request)
+        return self._log(request, response, profile)
+
+    async def __acall__(self, request):
+        with profiling.profile() as profile:
+            response = await self.get_response(request)
+        return self._log(request, response, profile)
+
+    def _log(self, request, response, profile):
+        report = profile.report(limit=getattr(settings, 'BLOG_TEMPLATE_PROFILER_NODES', 15))
+        if report['templates']:
+            template_logger.info(json.dumps({'path': request.path, **report}))
+        return response
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:28
+
+from django.db import migrations, models
+
+
+# Databases set up before this migration existed (the committed db.sqlite3
+# among them) already have the tag tables, so these two only touch the
+# database when the table is missing. The migration state is the same either way.
+def _table_exists(schema_editor, table):
+    return table in schema_editor.connection.introspection.table_names()
+
+
+class CreateModelIfMissing(migrations.CreateModel):
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.name)
+        if not _table_exists(schema_editor, model._meta.db_table):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+
+class AddFieldIfMissing(migrations.AddField):
+    # Only for many-to-many fields, whose table is the through table
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        through = model._meta.get_field(self.name).remote_field.through
+        if not _table_exists(schema_editor, through._meta.db_table):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0001_initial_squashed_0004_post_bookmarks_post_excerpt_post_featured_image_and_more'),
+    ]
+
+    operations = [
+        CreateModelIfMissing(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30, unique=True)),
+                ('slug', models.SlugField(blank=True, unique=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='featured_image',
+            field=models.ImageField(blank=True, help_text='Cover image for your post', null=True, upload_to='posts/'),
+        ),
+        AddFieldIfMissing(
+            model_name='post',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='posts', to='blogs.tag'),
+        ),
+    ]
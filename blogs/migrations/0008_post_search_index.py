@@ -0,0 +1,73 @@
+# Full-text search index for posts, see blogs/search.py
+#
+# The index lives outside the Django model state because it is different on
+# every database: a generated tsvector column with a GIN index on PostgreSQL
+# and an FTS5 virtual table on SQLite. Other databases get nothing and fall
+# back to the icontains search.
+
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE blogs_post ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX blogs_post_search_vector_idx ON blogs_post USING GIN (search_vector)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS blogs_post_search_vector_idx",
+    "ALTER TABLE blogs_post DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE blogs_post_fts USING fts5(title, content, tokenize = 'porter unicode61')",
+    "INSERT INTO blogs_post_fts (rowid, title, content) SELECT id, title, content FROM blogs_post",
+]
+SQLITE_BACKWARD = [
+    "DROP TABLE IF EXISTS blogs_post_fts",
+]
+
+
+def sqlite_has_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # Some builds ship FTS5 without reporting the compile option
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.blogs_fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp.blogs_fts5_probe")
+        except Exception:
+            return False
+        return True
+
+
+def run_for_vendor(postgres, sqlite):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        if vendor == 'postgresql':
+            statements = postgres
+        elif vendor == 'sqlite' and sqlite_has_fts5(schema_editor):
+            statements = sqlite
+        else:
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0007_post_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_BACKWARD, SQLITE_BACKWARD),
+        ),
+    ]
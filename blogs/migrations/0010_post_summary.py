@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:39
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+SUMMARY_WORDS = 50
+
+
+def backfill_summaries(apps, schema_editor):
+    Post = apps.get_model('blogs', 'Post')
+    batch = []
+    for post in Post.objects.only('id', 'content', 'excerpt').iterator(chunk_size=500):
+        if post.excerpt and post.excerpt.strip():
+            post.summary = post.excerpt.strip()
+        else:
+            post.summary = Truncator(post.content).words(SUMMARY_WORDS)
+        batch.append(post)
+        if len(batch) >= 500:
+            Post.objects.bulk_update(batch, ['summary'])
+            batch = []
+    Post.objects.bulk_update(batch, ['summary'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0009_post_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='summary',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
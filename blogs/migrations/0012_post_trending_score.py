@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:59
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_scores(apps, schema_editor):
+    # Seed scores from the existing counters, decayed by post age so old
+    # posts don't start out on top of the trending list
+    Post = apps.get_model('blogs', 'Post')
+    weights = getattr(settings, 'BLOG_TRENDING_WEIGHTS',
+                      {'like_count': 1.0, 'bookmark_count': 2.0, 'comment_count': 3.0})
+    half_life = getattr(settings, 'BLOG_TRENDING_HALF_LIFE_HOURS', 24) * 3600
+    now = timezone.now()
+    batch = []
+    for post in Post.objects.only('id', 'created_at', *weights).iterator(chunk_size=500):
+        raw = sum(getattr(post, field) * weight for field, weight in weights.items())
+        if not raw:
+            continue
+        age = max((now - post.created_at).total_seconds(), 0)
+        post.trending_score = raw * 0.5 ** (age / half_life)
+        batch.append(post)
+        if len(batch) >= 500:
+            Post.objects.bulk_update(batch, ['trending_score'])
+            batch = []
+    Post.objects.bulk_update(batch, ['trending_score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0011_comment_thread_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-trending_score', '-id'], name='post_trending_idx'),
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
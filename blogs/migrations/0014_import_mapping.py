@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0013_related_post'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportMapping',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('export_id', models.CharField(max_length=64)),
+                ('kind', models.CharField(max_length=20)),
+                ('source_id', models.BigIntegerField()),
+                ('target_id', models.BigIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('export_id', 'kind', 'source_id'), name='import_mapping_unique')],
+            },
+        ),
+    ]
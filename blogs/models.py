@@ -1,6 +1,13 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.utils.text import slugify
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils.text import Truncator, slugify
+
+from . import caching
 
 class Category(models.Model):
     # Store categories like Tech, Lifestyle, etc.
@@ -19,16 +26,84 @@ class Category(models.Model):
 
 class Tag(models.Model):
     name = models.CharField(max_length=30, unique=True)
-    slug = models.SlugField(unique=True, blank=True)
+    slug = models.SlugField(unique=True, blank=True, allow_unicode=True)
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = slugify(self.name, allow_unicode=True)
         super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
+def _count_subquery(model, field='post'):
+    # Correlated COUNT(*) of the rows in `model` pointing at a post
+    counts = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+# How much one like, bookmark or comment adds to a post's trending score
+DEFAULT_TRENDING_WEIGHTS = {'like_count': 1.0, 'bookmark_count': 2.0, 'comment_count': 3.0}
+
+
+def trending_weight(counter):
+    return getattr(settings, 'BLOG_TRENDING_WEIGHTS', DEFAULT_TRENDING_WEIGHTS).get(counter, 0.0)
+
+
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        # Everything a post card needs, loaded in a fixed number of queries
+        return (
+            self.select_related('author', 'category')
+            .prefetch_related('tags')
+            # Cards show the precomputed summary, never the full body
+            .defer('content')
+            .order_by('-created_at', '-id')
+        )
+
+    def adjust_counter(self, field, delta):
+        # Atomic in-database increment/decrement of one of the counter
+        # columns, clamped at zero so drift can never make it negative. The
+        # trending score moves by the interaction's weight in the same UPDATE.
+        updates = {field: Greatest(F(field) + delta, 0)}
+        weight = trending_weight(field)
+        if weight:
+            updates['trending_score'] = Greatest(F('trending_score') + delta * weight, 0.0)
+        return self.update(**updates)
+
+    def trending(self):
+        return self.filter(trending_score__gt=0).order_by('-trending_score', '-id')
+
+    def recount_stats(self):
+        # Recompute the counter columns from the relation tables in a
+        # single UPDATE (used by the recount_post_stats command)
+        return self.update(
+            like_count=_count_subquery(Post.likes.through),
+            bookmark_count=_count_subquery(Post.bookmarks.through),
+            comment_count=_count_subquery(Comment),
+        )
+
+    def with_viewer_flags(self, user):
+        # Per-viewer "has liked/bookmarked" flags as EXISTS subqueries so the
+        # detail page never loads the whole likes/bookmarks relation
+        if not user.is_authenticated:
+            return self.annotate(viewer_has_liked=Value(False), viewer_has_bookmarked=Value(False))
+        return self.annotate(
+            viewer_has_liked=Exists(
+                Post.likes.through.objects.filter(post=OuterRef('pk'), user_id=user.pk)
+            ),
+            viewer_has_bookmarked=Exists(
+                Post.bookmarks.through.objects.filter(post=OuterRef('pk'), user_id=user.pk)
+            ),
+        )
+
+
 class Post(models.Model):
     # Basic post info
     title = models.CharField(max_length=200)
@@ -43,36 +118,135 @@ class Post(models.Model):
     
     # Optional fields
     excerpt = models.TextField(blank=True, null=True)  # Short preview text
+    # What the listing pages show: the excerpt if the author wrote one,
+    # otherwise the first SUMMARY_WORDS words of the content (see save())
+    summary = models.TextField(blank=True, default='', editable=False)
     featured_image = models.ImageField(
         upload_to="posts/", 
         blank=True, 
         null=True,
         help_text="Cover image for your post"
     )
+    # Filled in by blogs.images once the resized copies have been generated
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Denormalized interaction totals, kept in sync by blogs.signals
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    bookmark_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # Time-decayed weighted interactions, see blogs/trending.py
+    trending_score = models.FloatField(default=0.0, editable=False)
     
     # Interaction tracking
     likes = models.ManyToManyField(
         User, 
         related_name="liked_posts", 
+        through='Like',
         blank=True
     )
     bookmarks = models.ManyToManyField(
         User, 
         related_name="bookmarked_posts", 
+        through='Bookmark',
         blank=True
     )
 
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Back the keyset paging in blogs.pagination for the main feed
+            # and for per-category feeds
+            models.Index(fields=['-created_at', '-id'], name='post_feed_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='post_category_feed_idx'),
+            # Top-N trending lookups and the decay job's low-score sweep
+            models.Index(fields=['-trending_score', '-id'], name='post_trending_idx'),
+            # An author's own posts, newest first (blogs.activity)
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_feed_idx'),
+        ]
+
+    SUMMARY_WORDS = 50
+
     def __str__(self):
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # Remember the stored category so a save can tell whether the post
+        # moved (blogs.signals); unknown when the field was deferred
+        if 'category_id' in post.__dict__:
+            post._blog_saved_category_id = post.category_id
+        return post
+
+    def build_summary(self):
+        if self.excerpt and self.excerpt.strip():
+            return self.excerpt.strip()
+        return Truncator(self.content).words(self.SUMMARY_WORDS)
+
+    def save(self, *args, **kwargs):
+        # Compute the listing summary once here rather than running
+        # truncatewords over the whole body on every page view
+        self.summary = self.build_summary()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'content', 'excerpt'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'summary'}
+        super().save(*args, **kwargs)
     
     def total_likes(self):
-        return self.likes.count()
+        return self.like_count
 
     def total_bookmarks(self):
-        return self.bookmarks.count()
+        return self.bookmark_count
+
+    def _srcset(self, fmt):
+        sizes = (self.image_renditions or {}).get('sizes', {})
+        return ', '.join(
+            f"{default_storage.url(entry[fmt])} {width}w"
+            for width, entry in sorted(sizes.items(), key=lambda item: int(item[0]))
+        )
 
-    def comment_count(self):
-        return self.comments.count()
+    def webp_srcset(self):
+        return self._srcset('webp')
+
+    def jpeg_srcset(self):
+        return self._srcset('jpeg')
+
+    def toggle_like(self, user):
+        return self._toggle_relation(Post.likes.through, 'like_count', user)
+
+    def toggle_bookmark(self, user):
+        return self._toggle_relation(Post.bookmarks.through, 'bookmark_count', user)
+
+    def _toggle_relation(self, through, counter, user):
+        # Flip one row in a likes/bookmarks through table and return
+        # (is_now_active, new_count). The DELETE doubles as the existence
+        # check, so this is a couple of indexed statements no matter how
+        # many users share the relation. Working on the through table
+        # directly skips m2m_changed, so the counter and the cached
+        # fragments are taken care of here.
+        posts = Post.objects.filter(pk=self.pk)
+        with transaction.atomic():
+            removed, _ = through.objects.filter(post_id=self.pk, user_id=user.pk).delete()
+            if removed:
+                posts.adjust_counter(counter, -removed)
+                active = False
+            else:
+                try:
+                    with transaction.atomic():
+                        through.objects.create(post_id=self.pk, user_id=user.pk)
+                except IntegrityError:
+                    # A concurrent request (double click) inserted the row
+                    # first; the unique constraint keeps a single row
+                    pass
+                else:
+                    posts.adjust_counter(counter, 1)
+                active = True
+            count = posts.values_list(counter, flat=True).get()
+            caching.invalidate_post(self.pk)
+        return active, count
 
 
 class Comment(models.Model):
@@ -81,5 +255,87 @@ class Comment(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Threads are read oldest-first per post, see pagination.thread_page
+            models.Index(fields=['post', 'created_at'], name='comment_thread_idx'),
+            # A user's comments, newest first (blogs.activity)
+            models.Index(fields=['user', '-created_at', '-id'], name='comment_user_recent_idx'),
+        ]
+
     def __str__(self):
         return f"Comment by {self.user.username} on {self.post.title}"
+
+
+class Like(models.Model):
+    # Through table of Post.likes. It is the table Django created for the
+    # plain many-to-many (blogs_post_likes), plus when each like happened
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'blogs_post_likes'
+        unique_together = [('post', 'user')]
+        indexes = [
+            # "Liked posts", most recently liked first
+            models.Index(fields=['user', '-created_at', '-id'], name='like_user_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} likes {self.post_id}"
+
+
+class Bookmark(models.Model):
+    # Through table of Post.bookmarks (blogs_post_bookmarks), see Like
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'blogs_post_bookmarks'
+        unique_together = [('post', 'user')]
+        indexes = [
+            # "My bookmarks", most recently bookmarked first
+            models.Index(fields=['user', '-created_at', '-id'], name='bookmark_user_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} bookmarked {self.post_id}"
+
+
+class RelatedPost(models.Model):
+    # Precomputed "related posts" list, built by blogs.related: the top
+    # BLOG_RELATED_POSTS posts sharing tags/category with `post`, best first
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'related'], name='related_post_unique'),
+        ]
+        indexes = [
+            # The post page reads one post's list in score order
+            models.Index(fields=['post', '-score'], name='related_post_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} -> {self.related_id} ({self.score:.3f})"
+
+
+class ImportMapping(models.Model):
+    # Source id -> local id of every object brought in by blogs.transfer, per
+    # export file. Lets an interrupted import resume without duplicating rows
+    export_id = models.CharField(max_length=64)
+    kind = models.CharField(max_length=20)
+    source_id = models.BigIntegerField()
+    target_id = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['export_id', 'kind', 'source_id'], name='import_mapping_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.source_id} -> {self.target_id}"
@@ -0,0 +1,157 @@
+# Paging helpers shared by every post listing view
+#
+# Two modes are supported:
+#   ?page=N          classic OFFSET paging, handy for jumping to a page number
+#   ?after=/?before= keyset paging on (created_at, id), so deep pages cost the
+#                    same as the first one because the index is used to seek
+#                    straight to the cursor instead of skipping N rows
+
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+PAGING_PARAMS = ('page', 'after', 'before')
+
+
+def encode_cursor(row):
+    # A model instance or a values() row with created_at and id
+    if isinstance(row, dict):
+        created_at, pk = row['created_at'], row['id']
+    else:
+        created_at, pk = row.created_at, row.pk
+    raw = f"{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if created_at is None:
+        return None
+    return created_at, pk
+
+
+class FeedPage:
+    # Minimal page object the templates use for prev/next links
+    def __init__(self, request, object_list, next_params=None, previous_params=None, number=None):
+        self.request = request
+        self.object_list = object_list
+        self.next_params = next_params
+        self.previous_params = previous_params
+        self.number = number
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_params is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_params is not None
+
+    def _url(self, params):
+        query = self.request.GET.copy()
+        for key in PAGING_PARAMS:
+            query.pop(key, None)
+        query.update(params)
+        return '?' + query.urlencode()
+
+    @property
+    def next_url(self):
+        return self._url(self.next_params) if self.has_next else ''
+
+    @property
+    def previous_url(self):
+        return self._url(self.previous_params) if self.has_previous else ''
+
+
+def page_size():
+    return getattr(settings, 'BLOG_PAGE_SIZE', 10)
+
+
+def comment_page_size():
+    return getattr(settings, 'BLOG_COMMENT_PAGE_SIZE', 20)
+
+
+def paginate(request, queryset):
+    # Pick offset or keyset paging depending on the query string
+    if 'page' in request.GET:
+        return offset_page(request, queryset)
+    return keyset_page(request, queryset)
+
+
+def offset_page(request, queryset):
+    paginator = Paginator(queryset, page_size())
+    try:
+        page = paginator.page(request.GET.get('page'))
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+    return FeedPage(
+        request,
+        list(page.object_list),
+        next_params={'page': page.next_page_number()} if page.has_next() else None,
+        previous_params={'page': page.previous_page_number()} if page.has_previous() else None,
+        number=page.number,
+    )
+
+
+def keyset_page(request, queryset):
+    size = page_size()
+    after = decode_cursor(request.GET.get('after', ''))
+    before = decode_cursor(request.GET.get('before', ''))
+
+    if before:
+        created_at, pk = before
+        rows = list(
+            queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+            .order_by('created_at', 'id')[:size + 1]
+        )
+        has_more = len(rows) > size
+        rows = rows[:size][::-1]
+        has_previous, has_next = has_more, True
+    else:
+        if after:
+            created_at, pk = after
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            )
+        rows = list(queryset.order_by('-created_at', '-id')[:size + 1])
+        has_next = len(rows) > size
+        rows = rows[:size]
+        has_previous = after is not None
+
+    return FeedPage(
+        request,
+        rows,
+        next_params={'after': encode_cursor(rows[-1])} if rows and has_next else None,
+        previous_params={'before': encode_cursor(rows[0])} if rows and has_previous else None,
+    )
+
+
+def thread_page(queryset, cursor, size):
+    # Oldest-first keyset paging for comment threads. Returns the rows and the
+    # cursor for the next batch (None once the thread is exhausted).
+    if cursor:
+        created_at, pk = cursor
+        queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+    rows = list(queryset.order_by('created_at', 'id')[:size + 1])
+    if len(rows) > size:
+        rows = rows[:size]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
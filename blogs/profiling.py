@@ -0,0 +1,159 @@
+# Template render profiler for development
+#
+# While a RenderProfile is active, every template render and every tag or
+# {{ variable }} node inside a template is timed. Each gets two numbers:
+# "total", the time from start to end including everything it rendered in
+# turn (the body of a {% for %}, the template behind an {% include %}), and
+# "self", the part spent in the node itself. A template's self time is the
+# self time of its own nodes, so the templates' self times add up to the
+# page's render time and point at the template doing the work, while a
+# node's self time points at the tag doing it ({% url %} reversing, a slow
+# filter, a query fired from a property).
+#
+# TemplateProfilerMiddleware (blogs.middleware) profiles every request when
+# BLOG_TEMPLATE_PROFILER is on and DEBUG is too, and logs the report on the
+# blogs.templates logger. The profile_templates command prints the same
+# report for the main pages against a seeded throwaway database.
+#
+# It costs a couple of perf_counter() calls and a dict update per node, which
+# distorts small nodes a little and is not meant for production.
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+_current = ContextVar('blog_render_profile', default=None)
+
+
+def enabled():
+    return settings.DEBUG and getattr(settings, 'BLOG_TEMPLATE_PROFILER', False)
+
+
+def _template_name(template):
+    return template.origin.template_name or template.origin.name
+
+
+def _node_label(node):
+    from django.template.base import VariableNode
+
+    token = getattr(node, 'token', None)
+    if token is None:
+        return type(node).__name__
+    contents = token.contents if len(token.contents) <= 60 else token.contents[:57] + '...'
+    return f'{{{{ {contents} }}}}' if isinstance(node, VariableNode) else f'{{% {contents} %}}'
+
+
+class RenderProfile:
+    def __init__(self):
+        self.templates = {}  # name -> [calls, total, self]
+        self.nodes = {}  # (template name, line, label) -> [calls, total, self]
+        # Time spent in timed children of each open frame
+        self._children = []
+
+    def _enter(self):
+        self._children.append(0.0)
+        return time.perf_counter()
+
+    def _leave(self, started):
+        elapsed = time.perf_counter() - started
+        own = elapsed - self._children.pop()
+        if self._children:
+            self._children[-1] += elapsed
+        return elapsed, own
+
+    @staticmethod
+    def _add(table, key, calls, elapsed, own):
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = [0, 0.0, 0.0]
+        entry[0] += calls
+        entry[1] += elapsed
+        entry[2] += own
+
+    def template_done(self, template, started):
+        elapsed, own = self._leave(started)
+        self._add(self.templates, _template_name(template), 1, elapsed, own)
+
+    def node_done(self, node, started):
+        elapsed, own = self._leave(started)
+        origin = getattr(node, 'origin', None)
+        name = (origin.template_name or origin.name) if origin else '<unknown>'
+        token = getattr(node, 'token', None)
+        self._add(self.nodes, (name, token.lineno if token else None, _node_label(node)), 1, elapsed, own)
+        # The node's own work is its template's work
+        self._add(self.templates, name, 0, 0.0, own)
+
+    def report(self, limit=20, runs=1):
+        # Slowest templates by total time and slowest nodes by self time, in
+        # milliseconds per run
+        def row(entry):
+            calls, total, own = entry
+            return {
+                'calls': round(calls / runs, 1),
+                'total_ms': round(total * 1000 / runs, 3),
+                'self_ms': round(own * 1000 / runs, 3),
+            }
+
+        templates = sorted(self.templates.items(), key=lambda item: -item[1][1])
+        nodes = sorted(self.nodes.items(), key=lambda item: -item[1][2])[:limit]
+        return {
+            'templates': [{'template': name, **row(entry)} for name, entry in templates],
+            'nodes': [
+                {'template': name, 'line': line, 'node': label, **row(entry)}
+                for (name, line, label), entry in nodes
+            ],
+        }
+
+
+def install():
+    # Wrap Template._render and Node.render_annotated once. Nothing is timed
+    # unless a profile is active. Installed lazily (not at import) so the
+    # test runner's own Template._render instrumentation stays underneath.
+    from django.template.base import Node, Template, TextNode
+
+    render_template, render_node = Template._render, Node.render_annotated
+
+    def _render(self, context):
+        profile = _current.get()
+        if profile is None:
+            return render_template(self, context)
+        started = profile._enter()
+        try:
+            return render_template(self, context)
+        finally:
+            profile.template_done(self, started)
+
+    def render_annotated(self, context):
+        profile = _current.get()
+        # Plain text between the tags isn't worth a timer
+        if profile is None or isinstance(self, TextNode):
+            return render_node(self, context)
+        started = profile._enter()
+        try:
+            return render_node(self, context)
+        finally:
+            profile.node_done(self, started)
+
+    # Checked separately: the test runner puts its own Template._render back
+    # when it tears down
+    if not getattr(render_template, '_blog_profiled', False):
+        _render._blog_profiled = True
+        Template._render = _render
+    if not getattr(render_node, '_blog_profiled', False):
+        render_annotated._blog_profiled = True
+        Node.render_annotated = render_annotated
+
+
+@contextmanager
+def profile(current=None):
+    # Profile every render in the block into `current` (a new RenderProfile
+    # by default), which is what the block gets
+    install()
+    current = current or RenderProfile()
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
@@ -0,0 +1,219 @@
+# Related posts
+#
+# Two posts are related when they share tags or a category. Each post is a
+# sparse binary feature vector (one column per tag, plus its category at
+# BLOG_RELATED_CATEGORY_WEIGHT) and the similarity of two posts is the cosine
+# of their vectors. The top BLOG_RELATED_POSTS matches of every post are
+# stored in the RelatedPost table, so the post page reads its list with one
+# indexed query instead of joining the tag tables on every view.
+#
+# The rebuild_related_posts command computes the whole table offline: the
+# incidence matrix is kept as NumPy index arrays (CSR by post and CSC by
+# feature) and similarities are computed for blocks of posts at a time with
+# a single bincount over the posting lists, so memory stays bounded.
+#
+# When a post's tags or category change (post_create/post_edit), update_post
+# rescores it against the posts it can share something with and patches its
+# own list plus the lists it enters or leaves. Only the newest
+# BLOG_RELATED_CANDIDATES posts sharing a tag or the category are considered,
+# so on big categories the incremental result can differ slightly from a full
+# rebuild; run the command periodically to fold everything back together.
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from . import caching
+from .models import Post, RelatedPost
+
+# Upper bound on the float cells of one similarity block (rows x posts)
+BLOCK_CELLS = 4_000_000
+
+
+def related_count():
+    return getattr(settings, 'BLOG_RELATED_POSTS', 5)
+
+
+def category_weight():
+    return getattr(settings, 'BLOG_RELATED_CATEGORY_WEIGHT', 0.5)
+
+
+def candidate_limit():
+    # Most posts per shared tag/category considered by an incremental update
+    return getattr(settings, 'BLOG_RELATED_CANDIDATES', 500)
+
+
+class FeatureMatrix:
+    # Sparse post x feature incidence matrix held as plain NumPy arrays
+
+    def __init__(self, posts, tag_links):
+        # posts: (id, category_id or None) pairs; tag_links: (post_id, tag_id) pairs
+        posts = sorted(posts)
+        self.post_ids = np.array([pk for pk, _ in posts], dtype=np.int64)
+        categories = np.array([-1 if category is None else category for _, category in posts], dtype=np.int64)
+        links = np.array(list(tag_links), dtype=np.int64).reshape(-1, 2)
+        links = links[np.isin(links[:, 0], self.post_ids)]
+
+        has_category = categories >= 0
+        # Tags and categories share one feature space: even keys are tags,
+        # odd keys categories, then compacted to 0..n_features-1
+        rows = np.concatenate([
+            np.searchsorted(self.post_ids, links[:, 0]),
+            np.flatnonzero(has_category),
+        ])
+        keys = np.concatenate([
+            links[:, 1] * 2,
+            categories[has_category] * 2 + 1,
+        ])
+        weights = np.concatenate([
+            np.ones(len(links)),
+            np.full(int(has_category.sum()), float(category_weight())),
+        ])
+        _, cols = np.unique(keys, return_inverse=True)
+        self.n_posts = len(self.post_ids)
+        n_features = int(cols.max()) + 1 if len(cols) else 0
+
+        self.norms = np.sqrt(np.bincount(rows, weights * weights, minlength=self.n_posts))
+
+        by_row = np.argsort(rows, kind='stable')
+        self.row_ptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=self.n_posts))])
+        self.row_cols, self.row_weights = cols[by_row], weights[by_row]
+
+        by_col = np.argsort(cols, kind='stable')
+        self.col_ptr = np.concatenate([[0], np.cumsum(np.bincount(cols, minlength=n_features))])
+        self.col_rows, self.col_weights = rows[by_col], weights[by_col]
+
+    def index_of(self, post_id):
+        return int(np.searchsorted(self.post_ids, post_id))
+
+    def similarities(self, start, stop):
+        # Cosine similarity of posts [start, stop) to every post, as a dense
+        # (stop - start) x n_posts block. Every (row feature, posting) pair
+        # contributes w_row * w_posting to one cell; bincount sums them all.
+        lo, hi = self.row_ptr[start], self.row_ptr[stop]
+        rows = np.repeat(np.arange(stop - start), np.diff(self.row_ptr[start:stop + 1]))
+        cols, weights = self.row_cols[lo:hi], self.row_weights[lo:hi]
+
+        lengths = self.col_ptr[cols + 1] - self.col_ptr[cols]
+        first = np.repeat(self.col_ptr[cols] - (np.cumsum(lengths) - lengths), lengths)
+        postings = first + np.arange(int(lengths.sum()))
+        cells = np.repeat(rows, lengths) * self.n_posts + self.col_rows[postings]
+        values = np.repeat(weights, lengths) * self.col_weights[postings]
+
+        block = np.bincount(cells, values, minlength=(stop - start) * self.n_posts)
+        block = block.reshape(stop - start, self.n_posts)
+        denominator = np.outer(self.norms[start:stop], self.norms)
+        np.divide(block, denominator, out=block, where=denominator > 0)
+        block[np.arange(stop - start), np.arange(start, stop)] = 0  # not related to itself
+        return block
+
+    def top(self, block, k):
+        # Best k (post_id, score) pairs per block row, ties going to the
+        # newer post
+        k = min(k, self.n_posts - 1)
+        if k <= 0:
+            return [[] for _ in range(len(block))]
+        ranked = block + (block > 0) * np.arange(self.n_posts) * (1e-9 / self.n_posts)
+        best = np.argpartition(-ranked, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(ranked, best, axis=1), axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        scores = np.take_along_axis(block, best, axis=1)
+        return [
+            [(int(self.post_ids[col]), float(score)) for col, score in zip(row_cols, row_scores) if score > 0]
+            for row_cols, row_scores in zip(best, scores)
+        ]
+
+
+def _load(post_filter=None):
+    posts = Post.objects.all() if post_filter is None else Post.objects.filter(**post_filter)
+    links = Post.tags.through.objects.all()
+    if post_filter is not None:
+        links = links.filter(post__in=posts)
+    return posts.values_list('id', 'category_id'), links.values_list('post_id', 'tag_id')
+
+
+def rebuild(batch_size=1000):
+    # Recompute the whole table; returns the number of rows written
+    matrix = FeatureMatrix(*_load())
+    k = related_count()
+    block_rows = max(1, min(512, BLOCK_CELLS // max(matrix.n_posts, 1)))
+    rows = []
+    for start in range(0, matrix.n_posts, block_rows):
+        stop = min(start + block_rows, matrix.n_posts)
+        for offset, matches in enumerate(matrix.top(matrix.similarities(start, stop), k)):
+            post_id = int(matrix.post_ids[start + offset])
+            rows += [RelatedPost(post_id=post_id, related_id=other, score=score) for other, score in matches]
+    with transaction.atomic():
+        RelatedPost.objects.all().delete()
+        RelatedPost.objects.bulk_create(rows, batch_size=batch_size)
+    caching.invalidate_all_fragments()
+    return len(rows)
+
+
+def update_post(post):
+    # Incrementally refresh one post's list and its place in the lists of
+    # the posts around it, after its tags or category changed
+    k = related_count()
+    post_id = post.pk
+    shared = Q(tags__in=Post.tags.through.objects.filter(post_id=post_id).values('tag_id'))
+    if post.category_id is not None:
+        shared |= Q(category_id=post.category_id)
+
+    candidates = {post_id}
+    candidates.update(
+        Post.objects.filter(shared).order_by('-id').values_list('id', flat=True).distinct()[:candidate_limit()]
+    )
+    # Posts currently listing this one must be rescored too, it may have to leave
+    listing = set(RelatedPost.objects.filter(related_id=post_id).values_list('post_id', flat=True))
+    candidates |= listing
+
+    matrix = FeatureMatrix(*_load({'id__in': candidates}))
+    row = matrix.index_of(post_id)
+    block = matrix.similarities(row, row + 1)
+    own = matrix.top(block, k)[0]
+    # Cosine similarity is symmetric, so the same row scores this post
+    # inside every candidate's list
+    scores = {int(pk): float(score) for pk, score in zip(matrix.post_ids, block[0]) if score > 0}
+
+    current = {}
+    for owner, other, score in (
+        RelatedPost.objects.filter(post_id__in=set(scores) | listing)
+        .values_list('post_id', 'related_id', 'score')
+    ):
+        current.setdefault(owner, []).append((other, score))
+
+    replaced = {post_id: own}
+    for owner in set(scores) | listing:
+        entries = [(other, score) for other, score in current.get(owner, []) if other != post_id]
+        if owner in scores:
+            entries.append((post_id, scores[owner]))
+        entries = sorted(entries, key=lambda entry: (-entry[1], -entry[0]))[:k]
+        if sorted(entries) != sorted(current.get(owner, [])):
+            replaced[owner] = entries
+
+    # Joins the caller's transaction (the post form) without a savepoint
+    with transaction.atomic(savepoint=False):
+        RelatedPost.objects.filter(post_id__in=replaced).delete()
+        RelatedPost.objects.bulk_create([
+            RelatedPost(post_id=owner, related_id=other, score=score)
+            for owner, entries in replaced.items() for other, score in entries
+        ])
+    caching.invalidate_posts(replaced)
+    return len(replaced)
+
+
+def related_entries(post_id):
+    # The stored list for the post page: one query on related_post_score_idx
+    # joined to the related posts by primary key
+    return (
+        RelatedPost.objects.filter(post_id=post_id)
+        .select_related('related')
+        .only('related__id', 'related__title', 'related__created_at', 'related__summary')
+        .order_by('-score', '-related_id')
+    )
+
+
+def related_posts(post_id):
+    return [entry.related for entry in related_entries(post_id)]
@@ -0,0 +1,146 @@
+# Read-replica routing
+#
+# Replicas are listed in REPLICA_DATABASE_URLS and become the "replica1",
+# "replica2"... aliases in DATABASES. Only reads made inside a view wrapped
+# in @replica_reads (the listing, search and detail pages) go to a replica,
+# and only for blog content: sessions, users and everything else keep
+# reading the primary, as do all writes.
+#
+# Replication lags, so a reader who just wrote something (a comment, a like,
+# a new post) would not see it on the next page. Every successful write
+# request therefore gets a short-lived cookie (StickyPrimaryMiddleware) and
+# reads stay on the primary until it expires.
+#
+# The same lag applies to caches: a write bumps the version tokens right
+# away, and a page or fragment rendered from a replica just after it would
+# be stored under the new tokens with the old content. cache_timeout()
+# keeps anything rendered from a replica no longer than the sticky window,
+# the lag we already assume replication stays within.
+
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'blog_primary'
+REPLICA_APPS = {'blogs'}
+
+_use_replica = ContextVar('blog_use_replica', default=False)
+
+
+def replica_aliases():
+    if not getattr(settings, 'BLOG_READ_REPLICAS', False):
+        return []
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+def sticky_seconds():
+    return getattr(settings, 'BLOG_REPLICA_STICKY_SECONDS', 10)
+
+
+def pinned_to_primary(request):
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def _wants_replica(request):
+    return request.method in ('GET', 'HEAD') and bool(replica_aliases()) and not pinned_to_primary(request)
+
+
+def _use_replica_for(request):
+    use = _wants_replica(request)
+    request._blog_replica_reads = use
+    return use
+
+
+def served_from_replica(request=None):
+    # Whether the view for `request` read from a replica, or without a
+    # request, whether the code running now does
+    if request is not None:
+        return getattr(request, '_blog_replica_reads', False)
+    return _use_replica.get() and bool(replica_aliases())
+
+
+def cache_timeout(timeout, request=None):
+    # How long to cache something rendered now (or for `request`)
+    if served_from_replica(request):
+        return min(timeout, sticky_seconds())
+    return timeout
+
+
+def replica_reads(view):
+    # Let the blog content reads of a GET go to a replica
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_inner(request, *args, **kwargs):
+            token = _use_replica.set(_use_replica_for(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+        return async_inner
+
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        token = _use_replica.set(_use_replica_for(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return inner
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and model._meta.app_label in REPLICA_APPS:
+            replicas = replica_aliases()
+            if replicas:
+                return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from replication, not from migrate
+        return db == DEFAULT_DB_ALIAS
+
+
+class StickyPrimaryMiddleware:
+    # Pin a client's reads to the primary for a few seconds after a write.
+    # Runs in whichever mode the chain is in, so ASGI requests stay async.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self._pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._pin(request, await self.get_response(request))
+
+    def _pin(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 and replica_aliases():
+            seconds = sticky_seconds()
+            response.set_cookie(
+                STICKY_COOKIE, f'{time.time() + seconds:.3f}',
+                max_age=seconds, httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,279 @@
+# Pluggable full-text search for posts
+#
+# The backend is picked from settings.BLOG_SEARCH_BACKEND (a dotted path) or,
+# when that is not set, from the database vendor:
+#   postgresql -> PostgresSearchBackend (generated tsvector column + GIN index)
+#   sqlite     -> SQLiteSearchBackend   (FTS5 virtual table kept in sync by signals)
+#   otherwise  -> SimpleSearchBackend   (the old icontains scan)
+#
+# Backends only return post ids with a rank and highlighted fragments; the
+# posts themselves are then loaded through Post.objects.feed() so search pages
+# get the same query-count guarantees as every other listing.
+
+import re
+
+from django.conf import settings
+from django.db import connection, connections, router
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+from .models import Post
+
+FTS_TABLE = 'blogs_post_fts'
+
+# Control characters used as highlight markers by the database so the text can
+# be HTML-escaped before the real <mark> tags are put in
+MARK_START, MARK_END = '\x02', '\x03'
+
+SNIPPET_WORDS = 30
+
+
+def read_connection():
+    # Searches are reads and may go to a replica (see blogs.routers); index
+    # maintenance always writes through the default connection
+    return connections[router.db_for_read(Post)]
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def render_highlight(text):
+    # Escape user content, then turn the markers into <mark> tags
+    html = escape(text).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    return mark_safe(html)
+
+
+class SearchHit:
+    def __init__(self, post_id, rank=None, title=None, snippet=None):
+        self.post_id = post_id
+        self.rank = rank
+        self.title = title
+        self.snippet = snippet
+
+
+class SearchResults:
+    # Lazy, sliceable result set so django.core.paginator.Paginator can page
+    # through it; each slice is one ranked query plus one feed query
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+
+    @cached_property
+    def _count(self):
+        return self.backend.count(self.query)
+
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = self._count if index.stop is None else index.stop
+        if stop <= start:
+            return []
+        hits = self.backend.hits(self.query, start, stop - start)
+        posts = Post.objects.feed().in_bulk([hit.post_id for hit in hits])
+        results = []
+        for hit in hits:
+            post = posts.get(hit.post_id)
+            if post is None:
+                continue
+            post.search_rank = hit.rank
+            post.search_title = render_highlight(hit.title) if hit.title else post.title
+            post.search_snippet = render_highlight(hit.snippet) if hit.snippet else ''
+            results.append(post)
+        return results
+
+
+class BaseSearchBackend:
+    def search(self, query):
+        return SearchResults(self, query)
+
+    def count(self, query):
+        raise NotImplementedError
+
+    def hits(self, query, offset, limit):
+        raise NotImplementedError
+
+    # Index maintenance hooks, called from blogs.signals
+    def index_post(self, post):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def rebuild(self, batch_size=1000):
+        return 0
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    # The original LIKE '%q%' search, kept as a fallback and as the baseline
+    # for the search benchmark
+    def _queryset(self, query):
+        return Post.objects.filter(Q(title__icontains=query) | Q(content__icontains=query))
+
+    def count(self, query):
+        return self._queryset(query).count()
+
+    def hits(self, query, offset, limit):
+        rows = (
+            self._queryset(query)
+            .order_by('-created_at', '-id')
+            .values_list('id', 'title', 'content')[offset:offset + limit]
+        )
+        pattern = re.compile(re.escape(query), re.IGNORECASE)
+        hits = []
+        for post_id, title, content in rows:
+            match = pattern.search(content)
+            start = max(content.rfind(' ', 0, max(match.start() - 80, 0)), 0) if match else 0
+            snippet = Truncator(content[start:]).words(SNIPPET_WORDS)
+            hits.append(SearchHit(
+                post_id,
+                title=pattern.sub(lambda m: MARK_START + m.group(0) + MARK_END, title),
+                snippet=pattern.sub(lambda m: MARK_START + m.group(0) + MARK_END, snippet),
+            ))
+        return hits
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    # FTS5 table whose rowid is the post id; see migration 0008_post_search_index
+
+    def match_expression(self, query):
+        # Quote every term so user input can't inject FTS5 syntax and treat
+        # the last one as a prefix so results show up while typing
+        terms = search_terms(query)
+        if not terms:
+            return None
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def count(self, query):
+        match = self.match_expression(query)
+        if match is None:
+            return 0
+        with read_connection().cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+            return cursor.fetchone()[0]
+
+    def hits(self, query, offset, limit):
+        match = self.match_expression(query)
+        if match is None:
+            return []
+        with read_connection().cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, bm25({FTS_TABLE}, 10.0, 1.0) AS rank, "
+                f"highlight({FTS_TABLE}, 0, %s, %s), "
+                f"snippet({FTS_TABLE}, 1, %s, %s, '…', %s) "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY rank LIMIT %s OFFSET %s",
+                [MARK_START, MARK_END, MARK_START, MARK_END, SNIPPET_WORDS, match, limit, offset],
+            )
+            return [SearchHit(*row) for row in cursor.fetchall()]
+
+    def index_post(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (%s, %s, %s)",
+                [post.pk, post.title, post.content],
+            )
+
+    def remove_post(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+
+    def rebuild(self, batch_size=1000):
+        post_table = Post._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(f"SELECT coalesce(max(id), 0) FROM {post_table}")
+            last_id = cursor.fetchone()[0]
+            for start in range(0, last_id, batch_size):
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE} (rowid, title, content) "
+                    f"SELECT id, title, content FROM {post_table} WHERE id > %s AND id <= %s",
+                    [start, start + batch_size],
+                )
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+            cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+            return cursor.fetchone()[0]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    # Uses the generated `search_vector` tsvector column and its GIN index
+    # (see migration 0008_post_search_index). The column is maintained by
+    # PostgreSQL itself, so the index hooks have nothing to do.
+    config = 'english'
+
+    def count(self, query):
+        with read_connection().cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM blogs_post "
+                "WHERE search_vector @@ websearch_to_tsquery(%s, %s)",
+                [self.config, query],
+            )
+            return cursor.fetchone()[0]
+
+    def hits(self, query, offset, limit):
+        options = f"StartSel={MARK_START}, StopSel={MARK_END}, MaxWords={SNIPPET_WORDS}, MinWords=15"
+        with read_connection().cursor() as cursor:
+            # Rank and page first, then build headlines for the page rows only
+            cursor.execute(
+                "SELECT hit.id, hit.rank, "
+                "ts_headline(%s, hit.title, q, %s), ts_headline(%s, hit.content, q, %s) "
+                "FROM ("
+                "  SELECT id, title, content, ts_rank(search_vector, q) AS rank "
+                "  FROM blogs_post, websearch_to_tsquery(%s, %s) q "
+                "  WHERE search_vector @@ q ORDER BY rank DESC, id DESC LIMIT %s OFFSET %s"
+                ") hit, websearch_to_tsquery(%s, %s) q "
+                "ORDER BY hit.rank DESC, hit.id DESC",
+                [
+                    self.config, 'HighlightAll=true, ' + options, self.config, options,
+                    self.config, query, limit, offset,
+                    self.config, query,
+                ],
+            )
+            return [SearchHit(*row) for row in cursor.fetchall()]
+
+    def rebuild(self, batch_size=1000):
+        with connection.cursor() as cursor:
+            cursor.execute("REINDEX INDEX blogs_post_search_vector_idx")
+            cursor.execute("SELECT count(*) FROM blogs_post")
+            return cursor.fetchone()[0]
+
+
+def fts5_table_exists():
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'BLOG_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'postgresql':
+            _backend = PostgresSearchBackend()
+        elif connection.vendor == 'sqlite' and fts5_table_exists():
+            _backend = SQLiteSearchBackend()
+        else:
+            _backend = SimpleSearchBackend()
+    return _backend
+
+
+def reset_search_backend():
+    global _backend
+    _backend = None
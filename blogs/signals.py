@@ -0,0 +1,149 @@
+# Signal handlers that keep data derived from posts in sync
+#
+# Everything that changes likes, bookmarks or comments goes through here:
+# the views, the admin and the shell alike, so the denormalized counters, the
+# search index and the fragment caches stay correct no matter where the
+# change came from.
+
+from django.core.signals import setting_changed
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import caching, images, search
+from .categories import registry as category_registry
+from .models import Category, Comment, Post, Tag
+
+
+def _relation_changed(counter, sender, instance, action, reverse, pk_set, **kwargs):
+    # pk_set holds ids from the other side of the relation: user ids for
+    # post.likes.add(...), post ids for user.liked_posts.add(...)
+    if reverse:
+        lookup, other_field = {'user_id': instance.pk}, 'post_id'
+    else:
+        lookup, other_field = {'post_id': instance.pk}, 'user_id'
+
+    if action == 'pre_remove':
+        # Django passes the requested ids, not the rows actually removed
+        instance._blog_removed = set(
+            sender.objects.filter(**lookup, **{f'{other_field}__in': pk_set})
+            .values_list(other_field, flat=True)
+        )
+    elif action == 'pre_clear':
+        instance._blog_removed = set(
+            sender.objects.filter(**lookup).values_list(other_field, flat=True)
+        )
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if action == 'post_add':
+            changed, delta = pk_set or set(), 1
+        else:
+            changed, delta = instance.__dict__.pop('_blog_removed', set()), -1
+        if not changed:
+            return
+        if reverse:
+            Post.objects.filter(pk__in=changed).adjust_counter(counter, delta)
+            caching.invalidate_posts(changed)
+        else:
+            Post.objects.filter(pk=instance.pk).adjust_counter(counter, delta * len(changed))
+            caching.invalidate_post(instance.pk)
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def likes_changed(**kwargs):
+    _relation_changed('like_count', **kwargs)
+
+
+@receiver(m2m_changed, sender=Post.bookmarks.through)
+def bookmarks_changed(**kwargs):
+    _relation_changed('bookmark_count', **kwargs)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        caching.invalidate_post(instance.pk)
+    elif pk_set:
+        caching.invalidate_posts(pk_set)
+    else:
+        # tag.posts.clear() doesn't say which posts were affected
+        caching.invalidate_all_fragments()
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).adjust_counter('comment_count', 1)
+    caching.invalidate_post(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    if instance.post_id in getattr(origin, '_blog_deleted_posts', ()):
+        # Goes with its post: no counter or fragment left to update
+        return
+    Post.objects.filter(pk=instance.post_id).adjust_counter('comment_count', -1)
+    caching.invalidate_post(instance.post_id)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, origin=None, **kwargs):
+    # Every pre_delete of a delete() call comes before the first row goes, so
+    # the comments cascading after it can tell their post is going too. Kept
+    # on the object delete() was called on, so it lasts for that call only
+    if origin is not None:
+        if not hasattr(origin, '_blog_deleted_posts'):
+            origin._blog_deleted_posts = set()
+        origin._blog_deleted_posts.add(instance.pk)
+
+
+_UNKNOWN = object()
+
+
+def _category_changed(instance, created, update_fields):
+    if created:
+        return True
+    if update_fields is not None and not {'category', 'category_id'} & set(update_fields):
+        return False
+    # Not loaded from the database (or the category was deferred): assume it moved
+    saved = instance.__dict__.get('_blog_saved_category_id', _UNKNOWN)
+    return saved is _UNKNOWN or saved != instance.category_id
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    if not raw:
+        search.get_search_backend().index_post(instance)
+        if images.needs_renditions(instance):
+            images.schedule_renditions(instance)
+        elif not instance.featured_image and instance.image_renditions:
+            images.clear_renditions(instance)
+    caching.invalidate_post(instance.pk)
+    # Only a new post or a move changes the sidebar totals
+    if _category_changed(instance, created, update_fields):
+        category_registry.invalidate()
+    instance._blog_saved_category_id = instance.category_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    search.get_search_backend().remove_post(instance.pk)
+    category_registry.invalidate()
+
+
+# Category and tag names appear on every card, so renaming one (or deleting
+# it) retires all cached fragments at once
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def taxonomy_changed(sender, **kwargs):
+    caching.invalidate_all_fragments()
+    if sender is Category:
+        category_registry.invalidate()
+
+
+@receiver(setting_changed)
+def search_setting_changed(setting, **kwargs):
+    if setting == 'BLOG_SEARCH_BACKEND':
+        search.reset_search_backend()
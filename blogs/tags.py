@@ -0,0 +1,68 @@
+# Tag handling for the post create/edit views
+#
+# Tags arrive as one comma-separated string. They are normalized and matched
+# on their slug, looked up in a single IN query, the missing ones are created
+# with one bulk INSERT and the post's tag set is replaced in one go.
+
+import re
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .models import Tag
+
+MAX_TAG_LENGTH = Tag._meta.get_field('name').max_length
+
+
+def parse_tag_names(raw):
+    # "Django, django ,  Web  Dev" -> [('Django', 'django'), ('Web Dev', 'web-dev')]
+    # Slugs keep non-ASCII letters, otherwise "日本語" would slugify to '' and vanish
+    seen, result = set(), []
+    for part in (raw or '').split(','):
+        name = re.sub(r'\s+', ' ', part).strip()[:MAX_TAG_LENGTH].strip()
+        slug = slugify(name, allow_unicode=True)
+        if not slug or slug in seen:
+            continue
+        seen.add(slug)
+        result.append((name, slug))
+    return result
+
+
+def resolve_tags(raw):
+    # Return Tag objects for every name in `raw`, creating missing ones
+    wanted = parse_tag_names(raw)
+    if not wanted:
+        return []
+    slugs = [slug for _, slug in wanted]
+    by_slug = {tag.slug: tag for tag in Tag.objects.filter(slug__in=slugs)}
+
+    missing = [(name, slug) for name, slug in wanted if slug not in by_slug]
+    if missing:
+        # ignore_conflicts covers a concurrent request creating the same tag
+        Tag.objects.bulk_create(
+            [Tag(name=name, slug=slug) for name, slug in missing],
+            ignore_conflicts=True,
+        )
+        created = Tag.objects.filter(
+            Q(slug__in=[slug for _, slug in missing]) | Q(name__in=[name for name, _ in missing])
+        )
+        by_name = {}
+        for tag in created:
+            by_slug.setdefault(tag.slug, tag)
+            by_name[tag.name] = tag
+        for name, slug in missing:
+            # A differently-slugged tag may already own this exact name
+            if slug not in by_slug and name in by_name:
+                by_slug[slug] = by_name[name]
+
+    return [by_slug[slug] for slug in slugs if slug in by_slug]
+
+
+def set_post_tags(post, raw):
+    # Returns whether the post's set of tags actually changed
+    with transaction.atomic():
+        tags = resolve_tags(raw)
+        before = set(post.tags.values_list('id', flat=True))
+        post.tags.set(tags)
+    return before != {tag.pk for tag in tags}
@@ -0,0 +1,58 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from blogs import caching
+
+register = template.Library()
+
+# Card template of each fragment kind the views prime (caching.prime_fragments)
+CARD_TEMPLATES = {
+    'card': 'blogs/includes/post_card.html',
+    'category_card': 'blogs/includes/compact_post_card.html',
+}
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, kind, post):
+        self.nodelist = nodelist
+        self.kind = kind
+        self.post = post
+
+    def render(self, context):
+        kind = self.kind.resolve(context)
+        post = self.post.resolve(context)
+        return mark_safe(caching.render_fragment(kind, post, lambda: self.nodelist.render(context)))
+
+
+@register.tag
+def cachedfragment(parser, token):
+    """
+    Cache the enclosed markup for one post, keyed by the post's version:
+
+        {% cachedfragment "card" post %} ... {% endcachedfragment %}
+
+    The markup must only depend on the post, never on the viewer.
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag takes a fragment name and a post")
+    nodelist = parser.parse(('endcachedfragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post, kind='card'):
+    """
+    Render a post's card, memoized per post version like {% cachedfragment %}:
+
+        {% post_card post %}  {% post_card post "category_card" %}
+
+    The card template is rendered with nothing but the post in its context,
+    so it can't pick up anything viewer specific, and a cache hit skips
+    rendering (and its {% url %} lookups) altogether.
+    """
+    card = context.template.engine.get_template(CARD_TEMPLATES[kind])
+    return mark_safe(caching.render_fragment(
+        kind, post, lambda: card.render(template.Context({'post': post}, autoescape=context.autoescape)),
+    ))
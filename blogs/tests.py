@@ -1,3 +1,1633 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, router
+from django.middleware.csrf import _get_new_csrf_string
+from django.test import AsyncClient, Client, LiveServerTestCase, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.template import Context, Template
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from my_blog.database import apply_profile, sqlite_options
+from my_blog.templating import template_config
+
+from . import api, caching, metrics, middleware, profiling, related, routers, transfer, trending, writebehind
+from .benchmarks import SEED_PASSWORD, concurrent_sqlite_writes, seed_blog
+from .management.commands import benchmark_api, benchmark_views, profile_templates
+from .categories import VERSION_KEY, registry as category_registry
+from .models import Bookmark, Category, Comment, Like, Post, Tag
+from .search import SimpleSearchBackend, SQLiteSearchBackend, get_search_backend, reset_search_backend
+from .tags import parse_tag_names, resolve_tags
+
+
+class BlogTestCase(TestCase):
+    # The cache outlives the per-test transaction, so start every test cold
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        caching.stats.reset()
+
+
+class FeedQueryTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345')
+        cls.category = Category.objects.create(name='Tech')
+        cls.tag = Tag.objects.create(name='django')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def make_posts(self, count):
+        for i in range(count):
+            author = User.objects.create_user(f'author{Post.objects.count()}')
+            post = Post.objects.create(
+                title=f'Post {i}', content='Some words ' * 20,
+                author=author, category=self.category,
+            )
+            post.tags.add(self.tag)
+            post.likes.add(self.user)
+            post.bookmarks.add(self.user)
+            Comment.objects.create(post=post, user=self.user, content='Nice')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url):
+        self.make_posts(2)
+        # The trending sidebar list is site-wide and cached separately
+        trending.top_posts()
+        few = self.count_queries(url)
+        self.make_posts(8)
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_index_query_count_is_constant(self):
+        self.assertConstantQueries(reverse('index'))
+
+    def test_category_posts_query_count_is_constant(self):
+        self.assertConstantQueries(reverse('category_posts', args=[self.category.slug]))
+
+    def test_search_query_count_is_constant(self):
+        self.assertConstantQueries(reverse('search_posts') + '?q=words')
+
+    def test_bookmarks_query_count_is_constant(self):
+        self.assertConstantQueries(reverse('my_bookmarks'))
+
+    def test_feed_never_loads_post_bodies(self):
+        self.make_posts(2)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('index'))
+        feed_sql = [q['sql'] for q in ctx.captured_queries if 'FROM "blogs_post"' in q['sql']]
+        self.assertTrue(feed_sql)
+        self.assertFalse(any('"blogs_post"."content"' in sql for sql in feed_sql))
+
+    def test_summary_is_computed_on_save(self):
+        post = Post.objects.create(title='Long', content='word ' * 80, author=self.user)
+        self.assertEqual(post.summary, ' '.join(['word'] * 50) + '…')
+        post.excerpt = '  Hand written  '
+        post.save(update_fields=['excerpt'])
+        post.refresh_from_db()
+        self.assertEqual(post.summary, 'Hand written')
+
+    def test_feed_counts_match_relations(self):
+        self.make_posts(1)
+        post = Post.objects.feed().get()
+        with self.assertNumQueries(0):
+            self.assertEqual(post.total_likes(), 1)
+            self.assertEqual(post.total_bookmarks(), 1)
+            self.assertEqual(post.comment_count, 1)
+
+
+@override_settings(BLOG_PAGE_SIZE=3)
+class FeedPaginationTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345')
+        cls.posts = [
+            Post.objects.create(title=f'Post {i}', content='Body', author=cls.user)
+            for i in range(8)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def titles(self, response):
+        return [post.title for post in response.context['posts']]
+
+    def test_keyset_pages_walk_the_whole_feed(self):
+        url, seen = reverse('index'), []
+        while url:
+            response = self.client.get(url)
+            seen += self.titles(response)
+            page = response.context['page']
+            url = reverse('index') + page.next_url if page.has_next else None
+        self.assertEqual(seen, [f'Post {i}' for i in reversed(range(8))])
+
+    def test_previous_link_returns_the_earlier_page(self):
+        first = self.client.get(reverse('index'))
+        second = self.client.get(reverse('index') + first.context['page'].next_url)
+        back = self.client.get(reverse('index') + second.context['page'].previous_url)
+        self.assertEqual(self.titles(back), self.titles(first))
+        self.assertFalse(back.context['page'].has_previous)
+
+    def test_offset_paging(self):
+        response = self.client.get(reverse('index') + '?page=3')
+        self.assertEqual(self.titles(response), ['Post 1', 'Post 0'])
+        self.assertEqual(response.context['page'].previous_url, '?page=2')
+
+    def test_search_links_keep_the_query(self):
+        response = self.client.get(reverse('search_posts') + '?q=Post')
+        self.assertIn('q=Post', response.context['page'].next_url)
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('index') + '?after=garbage')
+        self.assertEqual(self.titles(response), ['Post 7', 'Post 6', 'Post 5'])
+
+
+class PostCounterTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345')
+        cls.other = User.objects.create_user('other')
+        cls.post = Post.objects.create(title='Counted', content='Body', author=cls.other)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def counts(self):
+        self.post.refresh_from_db()
+        return self.post.like_count, self.post.bookmark_count, self.post.comment_count
+
+    def test_toggle_views_update_counters(self):
+        self.client.post(reverse('toggle_like', args=[self.post.pk]))
+        self.client.post(reverse('toggle_bookmark', args=[self.post.pk]))
+        self.assertEqual(self.counts(), (1, 1, 0))
+        self.client.post(reverse('toggle_like', args=[self.post.pk]))
+        self.assertEqual(self.counts(), (0, 1, 0))
+
+    def test_comment_create_and_delete_update_counter(self):
+        self.client.post(reverse('post_detail', args=[self.post.pk]), {'content': 'Hi'})
+        self.assertEqual(self.counts(), (0, 0, 1))
+        comment = Comment.objects.get()
+        self.client.post(reverse('comment_delete', args=[comment.pk]))
+        self.assertEqual(self.counts(), (0, 0, 0))
+
+    def test_deleting_a_post_skips_its_comment_updates(self):
+        doomed = Post.objects.create(title='Doomed', content='Body', author=self.other)
+        Comment.objects.bulk_create([Comment(post=doomed, user=self.user, content=str(i)) for i in range(5)])
+        Comment.objects.create(post=self.post, user=self.user, content='Stays')
+        with CaptureQueriesContext(connection) as ctx:
+            doomed.delete()
+        self.assertFalse([q for q in ctx.captured_queries if 'comment_count' in q['sql']])
+        self.assertEqual(self.counts(), (0, 0, 1))
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_deleting_a_commenter_updates_the_posts_that_stay(self):
+        Comment.objects.create(post=self.post, user=self.user, content='Bye')
+        self.user.delete()
+        self.assertEqual(self.counts(), (0, 0, 0))
+
+    def test_admin_style_relation_edits_stay_in_sync(self):
+        self.post.likes.set([self.user, self.other])
+        self.post.likes.remove(self.user, self.user)
+        self.assertEqual(self.counts()[0], 1)
+        self.other.liked_posts.clear()
+        self.user.bookmarked_posts.add(self.post)
+        self.post.likes.remove(self.user)
+        self.assertEqual(self.counts(), (0, 1, 0))
+
+    def test_recount_command_repairs_drift(self):
+        self.post.likes.add(self.user)
+        Comment.objects.create(post=self.post, user=self.user, content='Hi')
+        Post.objects.update(like_count=7, bookmark_count=3, comment_count=0)
+        call_command('recount_post_stats', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.counts(), (1, 0, 1))
+
+
+class SearchTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer')
+        cls.match_title = Post.objects.create(
+            title='Scaling Django', content='Notes on caching.', author=cls.user)
+        cls.match_body = Post.objects.create(
+            title='Weekly notes', content='We moved one <b>Django</b> service.', author=cls.user)
+        Post.objects.create(title='Unrelated', content='Nothing to see.', author=cls.user)
+
+    def test_sqlite_backend_is_used_and_ranks_title_matches_first(self):
+        backend = get_search_backend()
+        self.assertIsInstance(backend, SQLiteSearchBackend)
+        results = backend.search('django')
+        self.assertEqual(results.count(), 2)
+        self.assertEqual([p.pk for p in results[0:10]], [self.match_title.pk, self.match_body.pk])
+
+    def test_highlights_escape_post_content(self):
+        post = get_search_backend().search('django')[1]
+        self.assertIn('<mark>Django</mark>', post.search_snippet)
+        self.assertIn('&lt;b&gt;', post.search_snippet)
+
+    def test_index_follows_post_saves_and_deletes(self):
+        backend = get_search_backend()
+        self.match_body.content = 'Rewritten about flask'
+        self.match_body.save()
+        self.assertEqual(backend.search('django').count(), 1)
+        self.assertEqual(backend.search('flask').count(), 1)
+        self.match_title.delete()
+        self.assertEqual(backend.search('django').count(), 0)
+
+    def test_prefix_matching_and_syntax_is_not_injected(self):
+        backend = get_search_backend()
+        self.assertEqual(backend.search('djan').count(), 2)
+        self.assertEqual(backend.search('"django" OR NEAR(').count(), 0)
+
+    def test_rebuild_restores_index(self):
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(get_search_backend().search('django').count(), 2)
+
+    @override_settings(BLOG_SEARCH_BACKEND='blogs.search.SimpleSearchBackend')
+    def test_simple_backend_fallback(self):
+        results = get_search_backend().search('django')
+        self.assertIsInstance(results.backend, SimpleSearchBackend)
+        self.assertEqual(results.count(), 2)
+        newest, oldest = results[0:2]
+        self.assertIn('<mark>Django</mark>', newest.search_snippet)
+        self.assertIn('<mark>Django</mark>', oldest.search_title)
+
+    def test_search_view_renders_highlighted_results(self):
+        response = self.client.get(reverse('search_posts') + '?q=django')
+        self.assertContains(response, '<mark>Django</mark>')
+        self.assertEqual(len(response.context['posts']), 2)
+
+
+class ToggleTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345')
+        cls.post = Post.objects.create(title='Viral', content='Body', author=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def toggle(self, name='toggle_like'):
+        return self.client.post(
+            reverse(name, args=[self.post.pk]), HTTP_ACCEPT='application/json'
+        )
+
+    def test_json_toggle_returns_state_and_count(self):
+        self.assertEqual(self.toggle().json(), {'active': True, 'count': 1})
+        self.assertEqual(self.toggle().json(), {'active': False, 'count': 0})
+        self.assertEqual(self.toggle('toggle_bookmark').json(), {'active': True, 'count': 1})
+
+    def test_html_toggle_still_redirects(self):
+        response = self.client.post(reverse('toggle_like', args=[self.post.pk]))
+        self.assertRedirects(response, reverse('post_detail', args=[self.post.pk]))
+
+    def test_toggle_cost_does_not_grow_with_likers(self):
+        def like_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                self.post.toggle_like(self.user)
+            self.post.toggle_like(self.user)
+            return len(ctx.captured_queries)
+
+        few = like_queries()
+        self.post.likes.add(*[User.objects.create_user(f'fan{i}') for i in range(30)])
+        self.assertEqual(like_queries(), few)
+
+    def test_duplicate_insert_is_absorbed(self):
+        # Simulate losing a double-click race: the DELETE saw nothing but
+        # the row exists by the time we insert
+        Post.likes.through.objects.create(post=self.post, user=self.user)
+        Post.objects.filter(pk=self.post.pk).update(like_count=1)
+        with mock.patch('django.db.models.query.QuerySet.delete', return_value=(0, {})):
+            self.assertEqual(self.post.toggle_like(self.user), (True, 1))
+        self.assertEqual(self.post.likes.count(), 1)
+
+    def test_detail_page_flags_viewer_state(self):
+        self.post.toggle_bookmark(self.user)
+        response = self.client.get(reverse('post_detail', args=[self.post.pk]))
+        post = response.context['post']
+        self.assertFalse(post.viewer_has_liked)
+        self.assertTrue(post.viewer_has_bookmarked)
+
+
+class FragmentCacheTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345', is_staff=True)
+        cls.category = Category.objects.create(name='Tech')
+        cls.post = Post.objects.create(
+            title='Cached', content='Body', author=cls.user, category=cls.category)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_second_render_hits_the_card_cache(self):
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        self.assertEqual(caching.stats.snapshot()['card'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_comment_invalidates_the_card(self):
+        self.client.get(reverse('index'))
+        self.client.post(reverse('post_detail', args=[self.post.pk]), {'content': 'Hi'})
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, '<i class="bi bi-chat"></i> 1')
+        self.assertEqual(caching.stats.snapshot()['card']['hits'], 0)
+
+    def test_toggle_invalidates_the_card(self):
+        self.client.get(reverse('index'))
+        self.post.toggle_like(self.user)
+        self.assertContains(self.client.get(reverse('index')), '<i class="bi bi-heart"></i> 1')
+
+    def test_category_rename_invalidates_cards_and_sidebar(self):
+        self.client.get(reverse('index'))
+        self.category.name = 'Technology'
+        self.category.save()
+        response = self.client.get(reverse('index'))
+        self.assertEqual(caching.stats.snapshot()['card']['hits'], 0)
+        self.assertContains(response, 'Technology', count=2)
+
+    def test_unknown_category_is_404(self):
+        self.assertEqual(self.client.get(reverse('category_posts', args=['nope'])).status_code, 404)
+
+    def test_cache_stats_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('cache_stats')).status_code, 200)
+        self.client.force_login(User.objects.create_user('plain'))
+        self.assertEqual(self.client.get(reverse('cache_stats')).status_code, 302)
+
+
+class CategoryRegistryTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345')
+        cls.category = Category.objects.create(name='Tech')
+        Post.objects.create(title='One', content='Body', author=cls.user, category=cls.category)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def category_queries(self, func):
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        return [q for q in ctx.captured_queries if 'FROM "blogs_category"' in q['sql']]
+
+    def test_steady_state_pages_run_no_category_queries(self):
+        urls = [
+            reverse('index'),
+            reverse('category_posts', args=[self.category.slug]),
+            reverse('search_posts') + '?q=one',
+            reverse('my_bookmarks'),
+            reverse('post_create'),
+        ]
+        for url in urls:
+            self.client.get(url)
+        for url in urls:
+            self.assertEqual(self.category_queries(lambda: self.client.get(url)), [], url)
+
+    def test_post_form_validates_against_the_registry(self):
+        category_registry.all()
+        data = {'title': 'New', 'content': 'Text', 'category': str(self.category.pk)}
+        self.assertEqual(self.category_queries(lambda: self.client.post(reverse('post_create'), data)), [])
+        self.assertEqual(Post.objects.get(title='New').category, self.category)
+        data['category'] = '999'
+        response = self.client.post(reverse('post_create'), data)
+        self.assertIn('category', response.context['form'].errors)
+
+    def test_changes_reload_the_registry(self):
+        self.assertEqual([c.num_posts for c in category_registry.all()], [1])
+        Category.objects.create(name='Art')
+        self.assertEqual([c.name for c in category_registry.all()], ['Art', 'Tech'])
+
+    def test_only_category_moves_reload_the_registry(self):
+        post = Post.objects.get()
+        art = Category.objects.create(name='Art')
+        version = cache.get(VERSION_KEY)
+        post.title = 'Edited'
+        post.save()
+        Post.objects.get().save(update_fields=['title'])
+        self.assertEqual(cache.get(VERSION_KEY), version)
+        post.category = art
+        post.save()
+        self.assertNotEqual(cache.get(VERSION_KEY), version)
+        self.assertEqual([c.num_posts for c in category_registry.all()], [1, 0])
+
+    def test_other_workers_are_told_through_the_shared_version(self):
+        category_registry.all()
+        # Simulate a write in another worker: the row changes without this
+        # process's signals running, only the shared version key moves
+        Category.objects.filter(pk=self.category.pk).update(name='Renamed')
+        self.assertEqual(category_registry.all()[0].name, 'Tech')
+        cache.set(VERSION_KEY, 'bumped-elsewhere', None)
+        self.assertEqual(category_registry.all()[0].name, 'Renamed')
+
+    @override_settings(BLOG_CATEGORY_REGISTRY_MAX=1)
+    def test_registry_is_bounded_and_falls_back_to_the_database(self):
+        Category.objects.create(name='Art')
+        self.assertEqual(len(category_registry.all()), 1)
+        self.assertEqual(category_registry.get_by_slug('tech').id, self.category.pk)
+
+
+def make_image(width=1600, height=900, fmt='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 80, 40)).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+@override_settings(BLOG_IMAGE_ASYNC=False, BLOG_IMAGE_WIDTHS=(320, 640))
+class ImageRenditionTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer', password='pass12345')
+        cls.category = Category.objects.create(name='Tech')
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        media_override = override_settings(MEDIA_ROOT=media)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.client.force_login(self.user)
+
+    def create_post(self):
+        upload = SimpleUploadedFile('cover.png', make_image(), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post_create'), {
+                'title': 'Pictured', 'content': 'Body',
+                'category': str(self.category.pk), 'featured_image': upload,
+            })
+        return Post.objects.get(title='Pictured')
+
+    def test_upload_generates_renditions(self):
+        post = self.create_post()
+        self.assertEqual((post.image_width, post.image_height), (1600, 900))
+        self.assertEqual(sorted(post.image_renditions['sizes'], key=int), ['320', '640', '1600'])
+        self.assertEqual(post.image_renditions['sizes']['320']['height'], 180)
+        self.assertIn('320w', post.webp_srcset())
+
+    def test_feed_emits_srcset_and_lazy_loading(self):
+        self.create_post()
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'width="1600" height="900"')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_backfill_command(self):
+        post = self.create_post()
+        Post.objects.filter(pk=post.pk).update(image_renditions={}, image_width=None, image_height=None)
+        call_command('generate_image_renditions', workers=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.image_width, 1600)
+        self.assertEqual(len(post.image_renditions['sizes']), 3)
+
+    def test_backfill_skips_missing_files(self):
+        post = self.create_post()
+        Post.objects.filter(pk=post.pk).update(image_renditions={}, image_width=None, image_height=None)
+        Post.objects.create(title='Lost', content='Body', author=self.user, featured_image='posts/gone.png')
+        err = StringIO()
+        call_command('generate_image_renditions', workers=1, stdout=StringIO(), stderr=err)
+        self.assertIn('gone.png', err.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(len(post.image_renditions['sizes']), 3)
+
+
+class TagTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer', password='pass12345')
+        cls.category = Category.objects.create(name='Tech')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def post_data(self, tags, title='Tagged'):
+        return {'title': title, 'content': 'Body', 'category': str(self.category.pk), 'tags': tags}
+
+    def test_names_are_normalized_and_deduplicated(self):
+        self.assertEqual(
+            parse_tag_names(' Django, django ,,  Web   Dev, ' + 'x' * 40),
+            [('Django', 'django'), ('Web Dev', 'web-dev'), ('x' * 30, 'x' * 30)],
+        )
+
+    def test_resolution_query_count_does_not_grow_with_tags(self):
+        Tag.objects.create(name='existing')
+        few = ', '.join(['existing', 'a1', 'a2'])
+        many = ', '.join(['existing'] + ['b%d' % i for i in range(20)])
+        with CaptureQueriesContext(connection) as small:
+            resolve_tags(few)
+        with CaptureQueriesContext(connection) as large:
+            tags = resolve_tags(many)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(tags), 21)
+        self.assertEqual(Tag.objects.filter(name='existing').count(), 1)
+
+    def test_non_ascii_names_keep_their_tags(self):
+        self.assertEqual(
+            parse_tag_names('日本語, Ελληνικά, Café'),
+            [('日本語', '日本語'), ('Ελληνικά', 'ελληνικά'), ('Café', 'café')],
+        )
+        self.client.post(reverse('post_create'), self.post_data('日本語, Ελληνικά'))
+        post = Post.objects.get(title='Tagged')
+        self.assertEqual(sorted(post.tags.values_list('name', flat=True)), ['Ελληνικά', '日本語'])
+        response = self.client.get(reverse('tag_posts', args=['日本語']))
+        self.assertContains(response, 'Tagged')
+
+    def test_create_and_edit_replace_the_tag_set(self):
+        self.client.post(reverse('post_create'), self.post_data('Python, python, Web'))
+        post = Post.objects.get(title='Tagged')
+        self.assertEqual(sorted(post.tags.values_list('slug', flat=True)), ['python', 'web'])
+        self.client.post(reverse('post_edit', args=[post.pk]), self.post_data('web, Django'))
+        self.assertEqual(sorted(post.tags.values_list('slug', flat=True)), ['django', 'web'])
+        self.assertEqual(Tag.objects.count(), 3)
+
+    def test_tag_page_lists_tagged_posts(self):
+        self.client.post(reverse('post_create'), self.post_data('python'))
+        self.client.post(reverse('post_create'), self.post_data('', title='Untagged'))
+        response = self.client.get(reverse('tag_posts', args=['python']))
+        self.assertContains(response, 'Tagged')
+        self.assertNotContains(response, 'Untagged')
+        self.assertEqual(self.client.get(reverse('tag_posts', args=['missing'])).status_code, 404)
+
+
+@override_settings(BLOG_COMMENT_PAGE_SIZE=3, BLOG_PAGE_CACHE_TIMEOUT=0)
+class CommentThreadTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345')
+        cls.post = Post.objects.create(title='Busy', content='Body', author=cls.user)
+        for i in range(7):
+            commenter = User.objects.create_user(f'c{i}', password='pass12345')
+            Comment.objects.create(post=cls.post, user=commenter, content=f'comment-{i}')
+
+    def test_first_batch_is_bounded_and_uses_the_counter(self):
+        url = reverse('post_detail', args=[self.post.pk])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual([c.content for c in response.context['comments']], ['comment-0', 'comment-1', 'comment-2'])
+        self.assertContains(response, 'Comments (7)')
+        sql = [q['sql'] for q in ctx.captured_queries]
+        self.assertFalse([q for q in sql if 'COUNT(' in q and 'blogs_comment' in q])
+        self.assertEqual(len([q for q in sql if 'FROM "auth_user"' in q]), 0)
+
+    def test_load_more_walks_the_whole_thread(self):
+        url = reverse('post_comments', args=[self.post.pk])
+        seen = []
+        while url:
+            data = self.client.get(url).json()
+            seen += [f'comment-{i}' for i in range(7) if f'comment-{i}<' in data['html']]
+            url = data['next']
+        self.assertEqual(seen, [f'comment-{i}' for i in range(7)])
+
+    def test_fallback_link_renders_the_next_batch(self):
+        first = self.client.get(reverse('post_detail', args=[self.post.pk]))
+        response = self.client.get(reverse('post_detail', args=[self.post.pk]), {'comments_after': first.context['comments_next']})
+        self.assertEqual([c.content for c in response.context['comments']], ['comment-3', 'comment-4', 'comment-5'])
+
+    def test_unknown_post_is_404(self):
+        self.assertEqual(self.client.get(reverse('post_comments', args=[999])).status_code, 404)
+
+
+class ConditionalGetTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345')
+        cls.category = Category.objects.create(name='Tech')
+        cls.post = Post.objects.create(title='Cached', content='Body', author=cls.user, category=cls.category)
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        return first, self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+    def test_unchanged_post_is_not_rendered_again(self):
+        first, second = self.revalidate(reverse('post_detail', args=[self.post.pk]))
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.templates, [])
+        self.assertEqual(second.content, b'')
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_modified_since_is_honoured(self):
+        url = reverse('category_posts', args=[self.category.slug])
+        first = self.client.get(url)
+        second = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_new_comment_changes_the_validators(self):
+        url = reverse('post_detail', args=[self.post.pk])
+        first = self.client.get(url)
+        Comment.objects.create(post=self.post, user=self.user, content='Fresh')
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertContains(second, 'Fresh')
+
+    def test_post_edit_changes_category_page(self):
+        url = reverse('category_posts', args=[self.category.slug])
+        first = self.client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(title='Renamed', updated_at=timezone.now())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_anonymous_and_logged_in_responses_are_kept_apart(self):
+        url = reverse('post_detail', args=[self.post.pk])
+        anonymous = self.client.get(url)
+        self.assertIn('public', anonymous['Cache-Control'])
+        self.assertIn('Cookie', anonymous['Vary'])
+        self.client.force_login(self.user)
+        logged_in = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+        self.assertEqual(logged_in.status_code, 200)
+        self.assertIn('private', logged_in['Cache-Control'])
+        self.assertIn('Cookie', logged_in['Vary'])
+
+    def test_rotated_csrf_token_is_not_revalidated(self):
+        # The cached copy's forms hold the old token and would be refused
+        self.client.force_login(self.user)
+        url = reverse('post_detail', args=[self.post.pk])
+        self.client.get(url)  # sets the CSRF cookie
+        first = self.client.get(url)
+        self.assertIn('csrfmiddlewaretoken', first.content.decode())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = _get_new_csrf_string()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_public_home_and_missing_pages(self):
+        self.assertEqual(self.revalidate(reverse('public_home'))[1].status_code, 304)
+        missing = self.client.get(reverse('post_detail', args=[999]))
+        self.assertEqual(missing.status_code, 404)
+        self.assertFalse(missing.has_header('ETag'))
+
+
+class AnonymousPageCacheTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer', password='pass12345')
+        cls.post = Post.objects.create(title='Popular', content='Body', author=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('post_detail', args=[self.post.pk])
+
+    def test_repeat_visit_skips_the_view_and_the_database(self):
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertEqual(response.templates, [])
+        self.assertContains(response, 'Popular')
+        self.assertNotIn('csrftoken', response.cookies)
+
+    def test_unused_query_parameters_share_the_entry(self):
+        self.client.get(self.url)
+        for query in ('?utm_source=news', '?x=123&utm_medium=mail'):
+            self.assertEqual(self.client.get(self.url + query)['X-Page-Cache'], 'hit', query)
+        # A parameter the page reads still gets its own entry
+        self.assertEqual(self.client.get(self.url + '?comments_after=abc')['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get(self.url + '?comments_after=abc&ref=x')['X-Page-Cache'], 'hit')
+
+    def test_comment_purges_the_page(self):
+        self.client.get(self.url)
+        Comment.objects.create(post=self.post, user=self.user, content='Brand new')
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Brand new')
+
+    def test_logged_in_readers_bypass_the_cache(self):
+        self.client.get(self.url)
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_stale_copy_is_served_while_another_request_rebuilds(self):
+        self.client.get(self.url)
+        Post.objects.filter(pk=self.post.pk).update(title='Renamed')
+        caching.invalidate_post(self.post.pk)
+        lock = middleware._page_key(self.url) + ':lock'
+        cache.add(lock, 1)
+        stale = self.client.get(self.url)
+        self.assertEqual(stale['X-Page-Cache'], 'stale')
+        self.assertContains(stale, 'Popular')
+        cache.delete(lock)
+        fresh = self.client.get(self.url)
+        self.assertEqual(fresh['X-Page-Cache'], 'miss')
+        self.assertContains(fresh, 'Renamed')
+
+    def test_expired_page_is_rebuilt(self):
+        self.client.get(self.url)
+        with mock.patch('blogs.middleware.time.time', return_value=time.time() + 3600):
+            self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'miss')
+
+    def test_deleted_post_is_dropped_from_the_cache(self):
+        self.client.get(self.url)
+        Post.objects.filter(pk=self.post.pk).delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertIsNone(cache.get(middleware._page_key(self.url)))
+
+    def test_conditional_get_against_cached_page(self):
+        first = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+
+
+@override_settings(ROOT_URLCONF='blogs.async_urls', BLOG_PAGE_CACHE_TIMEOUT=0)
+class AsyncViewTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345')
+        cls.category = Category.objects.create(name='Tech')
+        cls.post = Post.objects.create(title='Async post', content='Body text', author=cls.user, category=cls.category)
+        Comment.objects.create(post=cls.post, user=cls.user, content='First!')
+
+    def test_routes_use_the_async_views(self):
+        from django.urls import resolve
+        self.assertTrue(asyncio.iscoroutinefunction(resolve(reverse('post_detail', args=[self.post.pk])).func))
+        self.assertFalse(asyncio.iscoroutinefunction(resolve(reverse('post_create')).func))
+
+    async def test_read_pages_render(self):
+        response = await self.async_client.get(reverse('post_detail', args=[self.post.pk]))
+        self.assertContains(response, 'Async post')
+        self.assertContains(response, 'First!')
+        self.assertTrue(response.has_header('ETag'))
+        response = await self.async_client.get(reverse('category_posts', args=[self.category.slug]))
+        self.assertContains(response, 'Async post')
+        response = await self.async_client.get(reverse('search_posts'), {'q': 'async'})
+        self.assertContains(response, reverse('post_detail', args=[self.post.pk]))
+        response = await self.async_client.get(reverse('post_detail', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_first_search_on_a_fresh_worker(self):
+        # Choosing the backend checks for the FTS5 table, a sync-only query
+        reset_search_backend()
+        self.addCleanup(reset_search_backend)
+        response = await self.async_client.get(reverse('search_posts'), {'q': 'async'})
+        self.assertContains(response, reverse('post_detail', args=[self.post.pk]))
+
+    async def test_related_posts_are_listed(self):
+        other = await Post.objects.acreate(title='Async sibling', content='Body', author=self.user, category=self.category)
+        await sync_to_async(related.rebuild)()
+        response = await self.async_client.get(reverse('post_detail', args=[self.post.pk]))
+        self.assertEqual([post.pk for post in response.context['related_posts']], [other.pk])
+
+    @override_settings(BLOG_PAGE_CACHE_TIMEOUT=60)
+    async def test_middleware_chain_stays_async(self):
+        # With DEBUG on, Django logs every handler it has to adapt for a
+        # middleware that can't run async, i.e. every thread it would block
+        url = reverse('post_detail', args=[self.post.pk])
+        with override_settings(DEBUG=True), self.assertLogs('django.request', 'DEBUG') as logs:
+            logging.getLogger('django.request').debug('loading middleware')
+            client = AsyncClient()
+            first = await client.get(url)
+            second = await client.get(url)
+        self.assertEqual([line for line in logs.output if 'adapted' in line], [])
+        self.assertContains(first, 'Async post')
+        self.assertEqual((first['X-Page-Cache'], second['X-Page-Cache']), ('miss', 'hit'))
+        # The query timer was installed on the thread the queries ran on
+        self.assertNotIn('"0 queries', first['Server-Timing'])
+
+    async def test_feed_needs_login(self):
+        response = await self.async_client.get(reverse('index'))
+        self.assertEqual(response.status_code, 302)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('index'))
+        self.assertContains(response, 'Async post')
+
+    def test_comment_post_goes_through_the_sync_view(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('post_detail', args=[self.post.pk]), {'content': 'From async route'})
+        self.assertTrue(Comment.objects.filter(content='From async route').exists())
+
+
+class LoadTestCommandTests(LiveServerTestCase):
+    def test_reports_throughput_and_percentiles(self):
+        out = StringIO()
+        call_command('loadtest', self.live_server_url, paths=['/'], concurrency=2, requests=6, json=True, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual((result['requests'], result['errors']), (6, 0))
+        self.assertGreater(result['requests_per_sec'], 0)
+        self.assertIn('p99_ms', result)
+
+
+@override_settings(BLOG_PAGE_CACHE_TIMEOUT=0)
+class SeedAndBenchmarkTests(BlogTestCase):
+    def test_seed_command_bulk_generates_consistent_data(self):
+        call_command('seed_blog', posts=30, users=5, comments=60, likes=40, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Comment.objects.count(), 60)
+        busiest = Post.objects.order_by('-comment_count').first()
+        self.assertEqual(busiest.comment_count, busiest.comments.count())
+        self.assertTrue(all(Post.objects.values_list('summary', flat=True)))
+        self.assertTrue(self.client.login(username='seed0-user0', password=SEED_PASSWORD))
+
+    def test_hot_views_stay_within_their_query_budgets(self):
+        seed_blog(posts=40, users=5, comments=100, likes=50, seed=1)
+        self.client.login(username='seed1-user0', password=SEED_PASSWORD)
+        results = [
+            {'posts': 40, 'view': name, **benchmark_views.measure(name, call, repeat=1)}
+            for name, call in benchmark_views.scenarios(self.client).items()
+        ]
+        self.assertEqual(benchmark_views.check_regressions(results), [])
+
+    def test_baseline_comparison_flags_extra_queries(self):
+        baseline = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        self.addCleanup(os.unlink, baseline.name)
+        json.dump([{'posts': 10, 'view': 'index', 'queries': 3}], baseline)
+        baseline.close()
+        results = [{'posts': 10, 'view': 'index', 'queries': 4}]
+        self.assertEqual(len(benchmark_views.check_regressions(results, baseline.name)), 1)
+        results[0]['queries'] = 3
+        self.assertEqual(benchmark_views.check_regressions(results, baseline.name), [])
+
+
+class RequestMetricsTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345')
+        cls.staff = User.objects.create_user('ops', password='pass12345', is_staff=True)
+        cls.post = Post.objects.create(title='Measured', content='Body', author=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        metrics.histogram.reset()
+
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs('blogs.requests', 'INFO') as logs:
+            response = self.client.get(reverse('post_detail', args=[self.post.pk]))
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries, 0 duplicate", tpl;dur=[\d.]+, total;dur=')
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((line['view'], line['status']), ('post_detail', 200))
+        self.assertGreater(line['queries'], 0)
+        self.assertGreater(line['template_ms'], 0)
+
+    def test_repeated_query_shapes_are_flagged(self):
+        recorder = metrics.RequestMetrics()
+        run = lambda sql, params, many, context: None
+        for pk in range(6):
+            recorder(run, 'SELECT * FROM blogs_post WHERE id = %s', [pk], False, {})
+        recorder(run, 'SELECT * FROM blogs_tag WHERE id IN (%s, %s)', [1, 2], False, {})
+        recorder(run, 'SELECT * FROM blogs_tag WHERE id IN (%s)', [3], False, {})
+        self.assertEqual(recorder.queries, 8)
+        self.assertEqual(recorder.duplicate_queries, 6)
+        self.assertEqual(recorder.repeated_shapes(5), [('SELECT * FROM blogs_post WHERE id = %s', 6)])
+
+    def test_metrics_endpoint_is_staff_only_prometheus_text(self):
+        self.client.get(reverse('post_detail', args=[self.post.pk]))
+        self.client.get(reverse('post_detail', args=[self.post.pk]))  # page cache hit, same view
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('blog_request_duration_seconds_count{view="post_detail"} 2', body)
+        self.assertIn('blog_request_duration_seconds_bucket{view="post_detail",le="+Inf"} 2', body)
+        self.assertIn('# TYPE blog_request_queries_total counter', body)
+
+    @override_settings(BLOG_REQUEST_METRICS=False)
+    def test_can_be_switched_off(self):
+        response = self.client.get(reverse('post_detail', args=[self.post.pk]))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class DatabaseProfileTests(TestCase):
+    def test_sqlite_profile(self):
+        config = apply_profile({'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'x.sqlite3'})
+        self.assertEqual(config['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertNotIn('journal_mode', config['OPTIONS']['init_command'])
+        self.assertIn('PRAGMA cache_size=', config['OPTIONS']['init_command'])
+        with mock.patch.dict(os.environ, {'SQLITE_WAL': 'True'}):
+            wal = apply_profile({'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'x.sqlite3'})
+        self.assertIn('PRAGMA journal_mode=WAL', wal['OPTIONS']['init_command'])
+        self.assertIn('PRAGMA synchronous=NORMAL', wal['OPTIONS']['init_command'])
+        self.assertEqual(apply_profile({'ENGINE': 'django.db.backends.sqlite3'}, 'plain'), {'ENGINE': 'django.db.backends.sqlite3'})
+
+    def test_postgres_profile(self):
+        base = {'ENGINE': 'django.db.backends.postgresql', 'CONN_MAX_AGE': 600}
+        with mock.patch('my_blog.database.psycopg_pool_available', return_value=True):
+            pooled = apply_profile(dict(base))
+        self.assertTrue(pooled['CONN_HEALTH_CHECKS'])
+        self.assertEqual(pooled['CONN_MAX_AGE'], 0)
+        self.assertIn('max_size', pooled['OPTIONS']['pool'])
+        with mock.patch('my_blog.database.psycopg_pool_available', return_value=False):
+            persistent = apply_profile(dict(base))
+        self.assertEqual((persistent['CONN_MAX_AGE'], persistent['CONN_HEALTH_CHECKS']), (600, True))
+        self.assertNotIn('pool', persistent['OPTIONS'])
+
+    def test_concurrent_writers_do_not_hit_database_is_locked(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            result = concurrent_sqlite_writes(os.path.join(tmp, 'db.sqlite3'), sqlite_options(wal=True), threads=6, writes_per_thread=30)
+        self.assertEqual(result['errors'], 0)
+        self.assertEqual(result['writes'], 180)
+        self.assertGreater(result['writes_per_sec'], 0)
+
+
+@override_settings(BLOG_READ_REPLICAS=True, BLOG_PAGE_CACHE_TIMEOUT=0)
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', password='pass12345')
+        self.post = Post.objects.create(title='Replicated', content='Body', author=self.user)
+        self.client.force_login(self.user)
+
+    def queries_by_alias(self, func):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica1']) as replica:
+            response = func()
+        return response, [q['sql'] for q in primary], [q['sql'] for q in replica]
+
+    def test_listing_and_detail_reads_use_the_replica(self):
+        for url in (reverse('index'), reverse('post_detail', args=[self.post.pk]), reverse('search_posts') + '?q=repl'):
+            response, primary, replica = self.queries_by_alias(lambda: self.client.get(url))
+            self.assertContains(response, 'Replicated')
+            self.assertTrue(any('blogs_post' in sql for sql in replica), url)
+            self.assertFalse(any('"blogs_post"' in sql for sql in primary), url)
+            # Sessions and users stay on the primary
+            self.assertTrue(any('django_session' in sql for sql in primary), url)
+
+    def test_writer_is_pinned_to_the_primary(self):
+        response = self.client.post(reverse('post_detail', args=[self.post.pk]), {'content': 'Mine'})
+        self.assertIn(routers.STICKY_COOKIE, response.cookies)
+        response, primary, replica = self.queries_by_alias(
+            lambda: self.client.get(reverse('post_detail', args=[self.post.pk]))
+        )
+        self.assertContains(response, 'Mine')
+        self.assertEqual(replica, [])
+        self.client.cookies[routers.STICKY_COOKIE] = str(time.time() - 1)
+        _, _, replica = self.queries_by_alias(lambda: self.client.get(reverse('post_detail', args=[self.post.pk])))
+        self.assertNotEqual(replica, [])
+
+    def test_writes_and_unmarked_code_use_the_primary(self):
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertFalse(router.allow_migrate('replica1', 'blogs'))
+
+    @override_settings(BLOG_PAGE_CACHE_TIMEOUT=60, BLOG_CACHE_TIMEOUT=600, BLOG_REPLICA_STICKY_SECONDS=5)
+    def test_replica_renders_are_cached_for_the_lag_only(self):
+        # The version tokens are already bumped by a write the replica may
+        # not have yet, so what it renders must not be kept for long
+        timeouts = {}
+        original = LocMemCache.set
+
+        def record(backend, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+            timeouts[key.split(':')[1]] = timeout
+            return original(backend, key, value, timeout, version)
+
+        url = reverse('post_detail', args=[self.post.pk])
+        with mock.patch.object(LocMemCache, 'set', record):
+            response = Client().get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertEqual((timeouts['page'], timeouts['fragment']), (5, 5))
+
+        cache.clear()
+        timeouts.clear()
+        pinned = Client()
+        pinned.cookies[routers.STICKY_COOKIE] = str(time.time() + 60)
+        with mock.patch.object(LocMemCache, 'set', record):
+            pinned.get(url)
+        self.assertEqual((timeouts['page'], timeouts['fragment']), (60 + 300, 600))
+
+
+class LocalReplicaTests(SimpleTestCase):
+    # The README's two-file setup, run for real: a primary and a copy of it
+    # as the replica, in a separate process with the normal settings
+    SCRIPT = """
+import json, shutil, time
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from blogs.models import Post
+from blogs.routers import STICKY_COOKIE
+call_command('migrate', verbosity=0)
+connections.close_all()
+shutil.copyfile({primary!r}, {replica!r})
+post = Post.objects.create(title='Not replicated yet', content='Body', author=User.objects.create_user('writer'))
+client = Client()
+url = reverse('post_detail', args=[post.pk])
+stale = client.get(url).status_code
+client.cookies[STICKY_COOKIE] = str(time.time() + 60)
+print(json.dumps({{'replica': stale, 'pinned': client.get(url).status_code}}))
+"""
+
+    def test_two_sqlite_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            primary, replica = os.path.join(tmp, 'db.sqlite3'), os.path.join(tmp, 'replica.sqlite3')
+            env = {key: value for key, value in os.environ.items() if key not in ('REDIS_URL', 'CACHE_DIR')}
+            env.update({
+                'DJANGO_SETTINGS_MODULE': 'my_blog.settings',
+                'DATABASE_URL': f'sqlite:///{primary}',
+                'REPLICA_DATABASE_URLS': f'sqlite:///{replica}',
+                'BLOG_PAGE_CACHE_TIMEOUT': '0',
+            })
+            result = subprocess.run(
+                [sys.executable, 'manage.py', 'shell', '-c', self.SCRIPT.format(primary=primary, replica=replica)],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=120,
+            )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        # The new post only exists on the primary until the copy catches up
+        self.assertEqual(json.loads(result.stdout.splitlines()[-1]), {'replica': 404, 'pinned': 200})
+
+
+class TrendingTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345')
+        cls.author = User.objects.create_user('author')
+        cls.quiet = Post.objects.create(title='Quiet post', content='Body', author=cls.author)
+        cls.busy = Post.objects.create(title='Busy post', content='Body', author=cls.author)
+
+    def score(self, post):
+        post.refresh_from_db()
+        return post.trending_score
+
+    def test_interactions_move_the_score_with_the_counter(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('toggle_like', args=[self.busy.pk]))
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "blogs_post"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('trending_score', updates[0])
+        self.client.post(reverse('toggle_bookmark', args=[self.busy.pk]))
+        self.client.post(reverse('post_detail', args=[self.busy.pk]), {'content': 'Nice'})
+        self.assertEqual(self.score(self.busy), 6.0)
+        self.client.post(reverse('toggle_like', args=[self.busy.pk]))
+        self.assertEqual(self.score(self.busy), 5.0)
+
+    @override_settings(BLOG_TRENDING_HALF_LIFE_HOURS=1)
+    def test_decay_halves_scores_per_half_life(self):
+        Post.objects.filter(pk=self.busy.pk).update(trending_score=8.0)
+        Post.objects.filter(pk=self.quiet.pk).update(trending_score=0.015)
+        call_command('recompute_trending', elapsed=3600, batch_size=1, stdout=StringIO())
+        self.assertAlmostEqual(self.score(self.busy), 4.0)
+        # Dropped below the floor
+        self.assertEqual(self.score(self.quiet), 0)
+
+    def test_top_list_is_cached_until_decay(self):
+        Post.objects.filter(pk=self.busy.pk).update(trending_score=3.0)
+        Post.objects.filter(pk=self.quiet.pk).update(trending_score=1.0)
+        self.assertEqual([entry.id for entry in trending.top_posts()], [self.busy.pk, self.quiet.pk])
+        with self.assertNumQueries(0):
+            self.assertEqual(trending.top_posts(1)[0].title, 'Busy post')
+        Post.objects.filter(pk=self.quiet.pk).update(trending_score=10.0)
+        trending.apply_decay(elapsed=0)
+        self.assertEqual(trending.top_posts()[0].id, self.quiet.pk)
+
+    def test_trending_page_and_sidebar(self):
+        Post.objects.filter(pk=self.busy.pk).update(trending_score=3.0)
+        Post.objects.filter(pk=self.quiet.pk).update(trending_score=1.0)
+        response = self.client.get(reverse('trending_posts'))
+        content = response.content.decode()
+        self.assertLess(content.index('Busy post'), content.index('Quiet post'))
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('index')), reverse('trending_posts'))
+
+    def test_rebuild_uses_counters_and_age(self):
+        Post.objects.filter(pk=self.busy.pk).update(like_count=2, comment_count=1)
+        Post.objects.filter(pk=self.quiet.pk).update(
+            like_count=2, comment_count=1, created_at=timezone.now() - timezone.timedelta(hours=24),
+        )
+        call_command('recompute_trending', rebuild=True, stdout=StringIO())
+        self.assertAlmostEqual(self.score(self.busy), 5.0, places=2)
+        self.assertAlmostEqual(self.score(self.quiet), 2.5, places=2)
+
+
+class RelatedPostTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer', password='pass12345')
+        cls.tech = Category.objects.create(name='Tech')
+        cls.food = Category.objects.create(name='Food')
+        cls.django, cls.python, cls.baking = (Tag.objects.create(name=name) for name in ('django', 'python', 'baking'))
+
+    def make_post(self, title, category, *tags):
+        post = Post.objects.create(title=title, content='Body', author=self.user, category=category)
+        post.tags.set(tags)
+        return post
+
+    def test_matrix_matches_pairwise_cosine(self):
+        import numpy as np
+        posts = [(1, 10), (2, 10), (3, None), (4, 11)]
+        links = [(1, 1), (1, 2), (2, 1), (3, 2), (3, 3), (4, 3)]
+        matrix = related.FeatureMatrix(posts, links)
+        block = matrix.similarities(0, 4)
+        # Post 1: tags 1, 2 + category (0.5); post 2: tag 1 + same category
+        expected = (1 + 0.25) / (np.sqrt(2.25) * np.sqrt(1.25))
+        self.assertAlmostEqual(block[0, 1], expected)
+        self.assertAlmostEqual(block[1, 0], expected)
+        self.assertEqual(block[0, 0], 0)
+        self.assertEqual(block[1, 3], 0)
+        self.assertEqual([pk for pk, _ in matrix.top(block, 2)[0]], [2, 3])
+
+    def test_rebuild_stores_top_k_and_detail_reads_them_in_one_query(self):
+        post = self.make_post('Django intro', self.tech, self.django, self.python)
+        close = self.make_post('Django ORM', self.tech, self.django, self.python)
+        partial = self.make_post('Python tips', self.food, self.python)
+        self.make_post('Bread', self.food, self.baking)
+        call_command('rebuild_related_posts', stdout=StringIO())
+        self.assertEqual([p.pk for p in related.related_posts(post.pk)], [close.pk, partial.pk])
+        with self.assertNumQueries(1):
+            titles = [p.title for p in related.related_posts(post.pk)]
+        self.assertEqual(titles, ['Django ORM', 'Python tips'])
+        self.assertContains(self.client.get(reverse('post_detail', args=[post.pk])), 'Related Posts')
+
+    def test_edits_update_lists_incrementally(self):
+        self.client.force_login(self.user)
+        post = self.make_post('Django intro', self.tech, self.django)
+        self.client.post(reverse('post_create'), {
+            'title': 'New Django post', 'content': 'Body', 'category': str(self.tech.pk), 'tags': 'django',
+        })
+        new = Post.objects.get(title='New Django post')
+        self.assertEqual([p.pk for p in related.related_posts(new.pk)], [post.pk])
+        self.assertEqual([p.pk for p in related.related_posts(post.pk)], [new.pk])
+
+        self.client.post(reverse('post_edit', args=[new.pk]), {
+            'title': 'New Django post', 'content': 'Body', 'category': str(self.food.pk), 'tags': 'baking',
+        })
+        self.assertEqual(related.related_posts(new.pk), [])
+        self.assertEqual(related.related_posts(post.pk), [])
+
+
+class TransferTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass12345')
+        cls.reader = User.objects.create_user('reader')
+        cls.category = Category.objects.create(name='Tech')
+        cls.post = Post.objects.create(title='Exported', content='Body text', author=cls.author, category=cls.category)
+        cls.post.tags.set([Tag.objects.create(name='django')])
+        cls.post.likes.add(cls.reader)
+        cls.post.bookmarks.add(cls.reader)
+        Comment.objects.create(post=cls.post, user=cls.reader, content='Hello')
+        old = timezone.now() - timezone.timedelta(days=30)
+        Post.objects.filter(pk=cls.post.pk).update(created_at=old, updated_at=old)
+
+    def export(self):
+        return list(transfer.export_lines(chunk_size=2))
+
+    def wipe(self):
+        Post.objects.all().delete()
+        Category.objects.all().delete()
+        Tag.objects.all().delete()
+
+    def test_export_is_lazy_ndjson(self):
+        lines = transfer.export_lines()
+        with self.assertNumQueries(0):
+            header = json.loads(next(lines))
+        self.assertEqual(header['format'], transfer.FORMAT)
+        types = [json.loads(line)['type'] for line in lines]
+        self.assertEqual(types, ['user', 'user', 'category', 'tag', 'post', 'post_tag', 'comment', 'like', 'bookmark'])
+
+    def test_round_trip_remaps_ids_and_keeps_timestamps(self):
+        lines = self.export()
+        created_at = Post.objects.get().created_at
+        liked_at = Post.likes.through.objects.get().created_at
+        self.wipe()
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dump.ndjson.gz')
+            with transfer.open_dump(path, 'w') as dump:
+                dump.writelines(lines)
+            call_command('import_blog', path, batch_size=1, stdout=out)
+        self.assertIn('post: 1 imported', out.getvalue())
+
+        post = Post.objects.get()
+        self.assertNotEqual(post.pk, self.post.pk)
+        self.assertEqual(post.created_at, created_at)
+        self.assertEqual(post.author, self.author)
+        self.assertEqual(post.category.slug, 'tech')
+        self.assertEqual([tag.name for tag in post.tags.all()], ['django'])
+        self.assertEqual((post.like_count, post.bookmark_count, post.comment_count), (1, 1, 1))
+        self.assertEqual(Post.likes.through.objects.get().created_at, liked_at)
+        self.assertEqual(post.comments.get().user, self.reader)
+        self.assertEqual(User.objects.count(), 2)
+
+    def test_failed_import_resumes_without_duplicates(self):
+        lines = self.export()
+        self.wipe()
+        real = transfer.Importer._import_links
+
+        def fail_on_likes(importer, kind, batch):
+            if kind == 'like':
+                raise RuntimeError('connection lost')
+            return real(importer, kind, batch)
+
+        with mock.patch.object(transfer.Importer, '_import_links', fail_on_likes):
+            with self.assertRaises(RuntimeError):
+                transfer.import_lines(lines)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertFalse(Post.likes.through.objects.exists())
+
+        created, skipped = transfer.import_lines(lines)
+        self.assertEqual(created['post'], 0)
+        self.assertEqual(created['like'], 1)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Post.objects.get().like_count, 1)
+
+    def test_bad_file_is_rejected(self):
+        with self.assertRaises(transfer.TransferError):
+            transfer.import_lines(['{"type": "post", "id": 1}\n'])
+
+    def test_corrupt_line_is_reported_with_its_number(self):
+        lines = self.export()
+        self.wipe()
+        lines.insert(3, '{"type": "tag", "id": \n')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dump.ndjson')
+            with open(path, 'w') as dump:
+                dump.writelines(lines)
+            with self.assertRaisesMessage(CommandError, 'Line 4 is not valid JSON'):
+                call_command('import_blog', path, stdout=StringIO())
+
+    def test_links_already_present_are_not_counted(self):
+        lines = self.export()
+        self.wipe()
+        created, _ = transfer.import_lines(lines)
+        self.assertEqual((created['like'], created['bookmark']), (1, 1))
+        created, _ = transfer.import_lines(lines + [lines[-1]])
+        self.assertEqual((created['like'], created['bookmark']), (0, 0))
+        self.assertEqual(Post.bookmarks.through.objects.count(), 1)
+
+    def test_staff_download_streams(self):
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(reverse('export_blog')).status_code, 302)
+        User.objects.filter(pk=self.author.pk).update(is_staff=True)
+        response = self.client.get(reverse('export_blog'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[5])['title'], 'Exported')
+
+
+class ApiTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer')
+        cls.category = Category.objects.create(name='Tech')
+        cls.tag = Tag.objects.create(name='django')
+        cls.posts = []
+        for i in range(12):
+            post = Post.objects.create(
+                title=f'Post {i}', content='Full body ' * 20, author=cls.user, category=cls.category,
+            )
+            cls.posts.append(post)
+        cls.posts[-1].tags.add(cls.tag)
+        Comment.objects.create(post=cls.posts[-1], user=cls.user, content='First')
+
+    def get(self, name, *args, query='', **headers):
+        return self.client.get(reverse(f'api-v1:{name}', args=args) + query, **headers)
+
+    def test_feed_is_cursor_paginated_without_content(self):
+        first = self.get('posts').json()
+        self.assertEqual(len(first['results']), 10)
+        self.assertEqual(first['results'][0]['title'], 'Post 11')
+        self.assertEqual(first['results'][0]['tags'], ['django'])
+        self.assertNotIn('content', first['results'][0])
+        second = self.client.get(reverse('api-v1:posts') + first['next']).json()
+        self.assertEqual([row['title'] for row in second['results']], ['Post 1', 'Post 0'])
+        self.assertIsNone(second['next'])
+
+    def test_sparse_fieldsets_select_only_those_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get('posts', query='?fields=id,title').json()
+        self.assertEqual(set(data['results'][0]), {'id', 'title'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"content"', queries[0]['sql'])
+        self.assertEqual(self.get('posts', query='?fields=title,password').status_code, 400)
+
+    def test_post_comments_categories_and_tags(self):
+        post = self.posts[-1]
+        data = self.get('post', post.pk).json()
+        self.assertEqual(data['content'], post.content)
+        self.assertEqual(data['url'], reverse('post_detail', args=[post.pk]))
+        self.assertEqual(self.get('post', 999999).status_code, 404)
+        comments = self.get('post_comments', post.pk).json()
+        self.assertEqual([c['content'] for c in comments['results']], ['First'])
+        self.assertEqual(self.get('categories').json()['results'][0]['num_posts'], 12)
+        self.assertEqual(self.get('tags').json()['results'], [
+            {'id': self.tag.pk, 'name': 'django', 'slug': 'django', 'num_posts': 1},
+        ])
+
+    def test_etag_and_compression(self):
+        response = self.get('posts')
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        self.assertEqual(self.get('posts', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        gzipped = self.get('posts', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(gzipped.content)), response.json())
+        self.assertIn('Accept-Encoding', gzipped['Vary'])
+        if api.brotli is not None:
+            compressed = self.get('posts', HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(compressed['Content-Encoding'], 'br')
+            self.assertEqual(json.loads(api.brotli.decompress(compressed.content)), response.json())
+
+    def test_benchmark_strategies_serialize_the_same_posts(self):
+        calls = benchmark_api.strategies(5)
+        by_values = json.loads(calls['values, feed fields']())
+        by_instances = json.loads(calls['model instances']())
+        self.assertEqual([row['id'] for row in by_values], [row['id'] for row in by_instances])
+        self.assertEqual(len(json.loads(calls['django serializers']())), 5)
+
+
+@override_settings(BLOG_WRITE_BEHIND=True, BLOG_WRITE_BEHIND_INTERVAL=0)
+class WriteBehindTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345')
+        cls.other = User.objects.create_user('other', password='pass12345')
+        cls.post = Post.objects.create(title='Viral', content='Body', author=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        writebehind.buffer._dirty.clear()
+        self.client.force_login(self.user)
+
+    def toggle(self, name='toggle_like'):
+        return self.client.post(reverse(name, args=[self.post.pk]), HTTP_ACCEPT='application/json').json()
+
+    def test_toggle_is_visible_before_it_is_written(self):
+        self.assertEqual(self.toggle(), {'active': True, 'count': 1})
+        self.assertFalse(self.post.likes.exists())
+        self.assertEqual(Post.objects.get(pk=self.post.pk).like_count, 0)
+        post = self.client.get(reverse('post_detail', args=[self.post.pk])).context['post']
+        self.assertEqual(post.like_count, 1)
+        self.assertTrue(post.viewer_has_liked)
+
+    def test_flush_writes_only_the_final_state(self):
+        for _ in range(3):
+            self.toggle()
+        self.client.force_login(self.other)
+        self.assertEqual(self.toggle(), {'active': True, 'count': 2})
+        self.toggle()
+        self.assertEqual(writebehind.buffer.pending(), 2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(writebehind.buffer.flush(), 1)
+        self.assertLessEqual(len(ctx.captured_queries), 8)
+        self.assertEqual(list(self.post.likes.all()), [self.user])
+        self.assertEqual(Post.objects.get(pk=self.post.pk).like_count, 1)
+        # The pending delta went into the stored counter, nothing is counted twice
+        self.assertEqual(writebehind.buffer.count('like', self.post.pk, 1), 1)
+        self.assertEqual(writebehind.buffer.flush(), 0)
+
+    def test_flush_removes_rows(self):
+        self.post.toggle_bookmark(self.user)
+        self.assertEqual(self.toggle('toggle_bookmark'), {'active': False, 'count': 0})
+        writebehind.buffer.flush()
+        self.assertFalse(self.post.bookmarks.exists())
+        self.assertEqual(Post.objects.get(pk=self.post.pk).bookmark_count, 0)
+
+    def test_stop_flushes_pending_toggles(self):
+        self.toggle()
+        writebehind.buffer.stop()
+        self.assertEqual(writebehind.buffer.pending(), 0)
+        self.assertTrue(self.post.likes.filter(pk=self.user.pk).exists())
+
+    def test_failed_flush_keeps_toggles(self):
+        self.toggle()
+        with mock.patch.object(writebehind.WriteBehindBuffer, '_apply', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                writebehind.buffer.flush()
+        self.assertEqual(writebehind.buffer.pending(), 1)
+        self.assertEqual(writebehind.buffer.flush(), 1)
+
+    def test_flush_after_the_delta_expired_does_not_go_negative(self):
+        self.toggle()
+        cache.delete(writebehind._delta_key('like', self.post.pk))  # its TTL ran out
+        self.assertEqual(writebehind.buffer.flush(), 1)
+        self.assertIsNone(cache.get(writebehind._delta_key('like', self.post.pk)))
+        post = self.client.get(reverse('post_detail', args=[self.post.pk])).context['post']
+        self.assertEqual(post.like_count, 1)
+
+    def test_toggles_keep_the_delta_alive(self):
+        key = writebehind._delta_key('like', self.post.pk)
+        with mock.patch.object(cache, 'touch', wraps=cache.touch) as touch:
+            self.toggle()
+        touch.assert_any_call(key, writebehind.state_timeout())
+
+    def test_toggles_from_several_workers_each_flip_once(self):
+        # One buffer per worker, so no process-local lock is shared; the
+        # first toggle seeds the counter, the rest race on cache.incr only
+        workers = [writebehind.WriteBehindBuffer() for _ in range(8)]
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(workers[0].toggle('like', post, self.user), (True, 1))
+        barrier = threading.Barrier(len(workers) - 1)
+        results = []
+
+        def toggle(worker):
+            barrier.wait()
+            results.append(worker.toggle('like', post, self.user)[0])
+
+        threads = [threading.Thread(target=toggle, args=(worker,)) for worker in workers[1:]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Seven flips after the first: four unlikes and three likes
+        self.assertEqual(sorted(results), [False] * 4 + [True] * 3)
+        self.assertEqual(workers[0].count('like', post.pk, 0), 0)
+        workers[0].flush()
+        self.assertFalse(post.likes.exists())
+
+    def test_rows_keep_the_toggle_time(self):
+        toggled_at = timezone.now() - timezone.timedelta(minutes=5)
+        with mock.patch('blogs.writebehind.timezone.now', return_value=toggled_at):
+            self.toggle()
+        writebehind.buffer.flush()
+        self.assertEqual(Like.objects.get(post=self.post, user=self.user).created_at, toggled_at)
+
+
+class ActivityTests(BlogTestCase):
+    # Queries per page, sessions and auth included. Fixed: they must not
+    # grow with the number of posts, likes or comments on the page
+    BUDGETS = {
+        'my_activity': 10,  # a count and the latest entries per list
+        'my_posts': 3,
+        'my_likes': 3,
+        'my_bookmarks': 3,
+        'my_comments': 3,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345')
+        cls.author = User.objects.create_user('author', password='pass12345')
+        cls.category = Category.objects.create(name='Tech')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def make_activity(self, count):
+        start = timezone.now() - timezone.timedelta(days=1)
+        for i in range(count):
+            post = Post.objects.create(title=f'Post {i}', content='Body', author=self.author, category=self.category)
+            Post.objects.create(title=f'Mine {i}', content='Body', author=self.user)
+            Like.objects.create(post=post, user=self.user, created_at=start + timezone.timedelta(minutes=i))
+            Bookmark.objects.create(post=post, user=self.user, created_at=start + timezone.timedelta(minutes=i))
+            Comment.objects.create(post=post, user=self.user, content=f'Comment {i}')
+
+    def test_query_budgets(self):
+        self.make_activity(2)
+        # Site-wide sidebar lists are cached separately
+        trending.top_posts()
+        for name, budget in self.BUDGETS.items():
+            with self.subTest(name):
+                with self.assertNumQueries(budget):
+                    self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+        self.make_activity(8)
+        for name, budget in self.BUDGETS.items():
+            with self.subTest(name):
+                with self.assertNumQueries(budget):
+                    self.client.get(reverse(name))
+
+    def test_bookmarks_are_listed_by_bookmark_time(self):
+        old = Post.objects.create(title='Old post', content='Body', author=self.author)
+        new = Post.objects.create(title='New post', content='Body', author=self.author)
+        new.bookmarks.add(self.user)
+        old.bookmarks.add(self.user)
+        response = self.client.get(reverse('my_bookmarks'))
+        self.assertEqual([post.title for post in response.context['entries']], ['Old post', 'New post'])
+
+    @override_settings(BLOG_PAGE_SIZE=3)
+    def test_lists_page_through_every_entry(self):
+        self.make_activity(7)
+        for name, total in (('my_posts', 7), ('my_likes', 7), ('my_comments', 7)):
+            seen, url = [], reverse(name)
+            while url:
+                response = self.client.get(url)
+                seen += [entry.pk for entry in response.context['entries']]
+                page = response.context['page']
+                url = reverse(name) + page.next_url if page.has_next else None
+            self.assertEqual(len(set(seen)), total, name)
+        likes = [post.title for post in self.client.get(reverse('my_likes')).context['entries']]
+        self.assertEqual(likes, ['Post 6', 'Post 5', 'Post 4'])
+
+    def test_dashboard_shows_totals_and_only_own_activity(self):
+        self.make_activity(3)
+        Comment.objects.create(post=Post.objects.first(), user=self.author, content='Not mine')
+        summary = {item['section'].kind: item for item in self.client.get(reverse('my_activity')).context['summary']}
+        self.assertEqual({kind: item['count'] for kind, item in summary.items()},
+                         {'posts': 3, 'likes': 3, 'bookmarks': 3, 'comments': 3})
+        self.assertEqual(summary['comments']['entries'][0].content, 'Comment 2')
+        self.assertNotContains(self.client.get(reverse('my_comments')), 'Not mine')
+
+    def test_lists_need_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('my_likes'))
+        self.assertEqual(response.status_code, 302)
+
+
+class TemplateRenderingTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345')
+        cls.category = Category.objects.create(name='Tech')
+        cls.posts = [
+            Post.objects.create(title=f'Post {i}', content='Body', author=cls.user, category=cls.category)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        trending.top_posts()
+
+    def test_template_profiles(self):
+        production = template_config(['templates'], ['ctx'], 'production')
+        self.assertNotIn('APP_DIRS', production)
+        self.assertEqual(production['OPTIONS']['loaders'][0][0], 'django.template.loaders.cached.Loader')
+        self.assertFalse(production['OPTIONS']['debug'])
+        development = template_config(['templates'], ['ctx'], 'development')
+        self.assertTrue(development['APP_DIRS'])
+        self.assertNotIn('loaders', development['OPTIONS'])
+
+    def test_post_card_is_memoized_per_post_version(self):
+        first = self.client.get(reverse('index'))
+        self.assertContains(first, reverse('post_detail', args=[self.posts[0].pk]), count=2)
+        self.assertEqual(caching.stats.snapshot()['card']['misses'], 3)
+        self.posts[0].toggle_like(self.user)
+        caching.stats.reset()
+        with profiling.profile() as profile:
+            second = self.client.get(reverse('index'))
+        # Only the liked post's card is rendered again
+        self.assertEqual(caching.stats.snapshot()['card'], {'hits': 2, 'misses': 1, 'hit_ratio': 0.6667})
+        self.assertEqual(profile.templates['blogs/includes/post_card.html'][0], 1)
+        self.assertEqual(first.content.count(b'<article'), second.content.count(b'<article'))
+
+    def test_compact_cards_use_post_card(self):
+        response = self.client.get(reverse('category_posts', args=[self.category.slug]))
+        self.assertContains(response, 'Post 2')
+        self.assertEqual(caching.stats.snapshot()['category_card']['misses'], 3)
+
+    def test_profiler_reports_templates_and_tags(self):
+        template = Template(
+            "{% for post in posts %}{% url 'post_detail' post.pk %}{{ post.title|upper }}{% endfor %}"
+        )
+        with profiling.profile() as profile:
+            template.render(Context({'posts': self.posts}))
+        report = profile.report()
+        self.assertEqual([row['calls'] for row in report['templates']], [1])
+        nodes = {row['node']: row for row in report['nodes']}
+        self.assertEqual(nodes["{% url 'post_detail' post.pk %}"]['calls'], 3)
+        self.assertEqual(nodes['{{ post.title|upper }}']['calls'], 3)
+        loop = nodes['{% for post in posts %}']
+        self.assertGreaterEqual(loop['total_ms'], loop['self_ms'])
+        # A template's self time is its nodes' self time plus its own overhead
+        template_row = report['templates'][0]
+        self.assertLessEqual(sum(row['self_ms'] for row in report['nodes']), template_row['self_ms'])
+        self.assertLessEqual(template_row['self_ms'], template_row['total_ms'])
+
+    def test_profiler_middleware_is_debug_only(self):
+        with self.assertNoLogs('blogs.templates'):
+            self.client.get(reverse('index'))
+        with override_settings(DEBUG=True, BLOG_TEMPLATE_PROFILER=True):
+            self.client = self.client_class()
+            self.client.force_login(self.user)
+            with self.assertLogs('blogs.templates', 'INFO') as logs:
+                self.client.get(reverse('index'))
+        report = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(report['path'], reverse('index'))
+        templates = {row['template'] for row in report['templates']}
+        self.assertLessEqual({'blogs/index.html', 'blogs/base.html'}, templates)
+
+    def test_profile_command_renders_cards_cold(self):
+        report = profile_templates.profile_page('index', lambda: self.client.get(reverse('index')), repeat=2)
+        cards = next(row for row in report['templates'] if row['template'] == 'blogs/includes/post_card.html')
+        self.assertEqual(cards['calls'], 3)
+        warm = profile_templates.profile_page('index', lambda: self.client.get(reverse('index')), repeat=2, warm=True)
+        self.assertNotIn('blogs/includes/post_card.html', {row['template'] for row in warm['templates']})
@@ -0,0 +1,285 @@
+# Streaming NDJSON export and resumable bulk import
+#
+# An export is one JSON object per line: a header carrying a random
+# export_id, then users, categories, tags, posts, post tags, comments, likes
+# and bookmarks, each section in id order. Rows are read with
+# values().iterator(chunk_size=...) and written out one line at a time, so
+# memory stays flat however big the blog is, both in the export_blog command
+# and behind the staff-only download view.
+#
+# Derived columns (summaries aside) are not exported: counters, trending
+# scores, related posts, the search index and image renditions are rebuilt
+# after an import. Passwords are not exported either; imported users get an
+# unusable password and have to reset it. Media files are referenced by name
+# only and have to be copied separately.
+#
+# The import reads the lines back in batches. Every batch is one transaction
+# that bulk-inserts the new rows and records source id -> new id in
+# ImportMapping under the file's export_id. Foreign keys are remapped through
+# those records, users/categories/tags are merged with existing ones by
+# username/slug, and rows already mapped are skipped, so a failed import can
+# simply be run again and picks up where it stopped.
+
+import datetime
+import gzip
+import json
+import uuid
+from collections import Counter
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching, related, trending
+from .categories import registry as category_registry
+from .models import Category, Comment, ImportMapping, Post, Tag
+from .search import get_search_backend
+
+FORMAT = 'blog-ndjson'
+VERSION = 1
+
+
+class TransferError(ValueError):
+    pass
+
+
+def export_chunk_size():
+    return getattr(settings, 'BLOG_EXPORT_CHUNK_SIZE', 2000)
+
+
+def _sections():
+    # (record type, queryset, exported fields), in dependency order
+    return (
+        ('user', User.objects.all(), ('id', 'username', 'email', 'first_name', 'last_name', 'date_joined')),
+        ('category', Category.objects.all(), ('id', 'name', 'slug')),
+        ('tag', Tag.objects.all(), ('id', 'name', 'slug')),
+        ('post', Post.objects.all(), (
+            'id', 'author_id', 'category_id', 'title', 'content', 'excerpt', 'featured_image',
+            'created_at', 'updated_at',
+        )),
+        ('post_tag', Post.tags.through.objects.all(), ('post_id', 'tag_id')),
+        ('comment', Comment.objects.all(), ('id', 'post_id', 'user_id', 'content', 'created_at')),
+        ('like', Post.likes.through.objects.all(), ('post_id', 'user_id', 'created_at')),
+        ('bookmark', Post.bookmarks.through.objects.all(), ('post_id', 'user_id', 'created_at')),
+    )
+
+
+class _Encoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder rounds datetimes to milliseconds; backups keep them exact
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _line(record):
+    return json.dumps(record, cls=_Encoder, separators=(',', ':')) + '\n'
+
+
+def export_lines(chunk_size=None):
+    # Generator of NDJSON lines; nothing is read before the first line is asked for
+    chunk_size = chunk_size or export_chunk_size()
+    yield _line({
+        'type': 'header', 'format': FORMAT, 'version': VERSION,
+        'export_id': uuid.uuid4().hex, 'exported_at': timezone.now(),
+    })
+    for kind, queryset, fields in _sections():
+        for row in queryset.order_by('pk').values(*fields).iterator(chunk_size=chunk_size):
+            yield _line({'type': kind, **row})
+
+
+def open_dump(path, mode):
+    # Plain or gzip-compressed (by extension) text file
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class Importer:
+    # kind -> (model, natural key field or None, {field: kind it refers to})
+    OBJECTS = {
+        'user': (User, 'username', {}),
+        'category': (Category, 'slug', {}),
+        'tag': (Tag, 'slug', {}),
+        'post': (Post, None, {'author_id': 'user', 'category_id': 'category'}),
+        'comment': (Comment, None, {'post_id': 'post', 'user_id': 'user'}),
+    }
+    # kind -> (through model, {field: kind it refers to})
+    LINKS = {
+        'post_tag': (Post.tags.through, {'post_id': 'post', 'tag_id': 'tag'}),
+        'like': (Post.likes.through, {'post_id': 'post', 'user_id': 'user'}),
+        'bookmark': (Post.bookmarks.through, {'post_id': 'post', 'user_id': 'user'}),
+    }
+    # Nullable references; a missing target becomes NULL instead of a skip
+    OPTIONAL = {'category_id'}
+
+    def __init__(self, lines, batch_size=1000, progress=None):
+        self.lines = iter(lines)
+        self.batch_size = batch_size
+        self.progress = progress
+        self.export_id = None
+        self.created = Counter()
+        self.skipped = Counter()
+
+    def run(self):
+        self._read_header()
+        for kind, group in groupby(self._records(), key=lambda record: record.get('type')):
+            if kind not in self.OBJECTS and kind not in self.LINKS:
+                raise TransferError(f"Unknown record type {kind!r}")
+            while batch := list(islice(group, self.batch_size)):
+                with transaction.atomic():
+                    if kind in self.OBJECTS:
+                        self._import_objects(kind, batch)
+                    else:
+                        self._import_links(kind, batch)
+                if self.progress:
+                    self.progress(kind, self.created[kind], self.skipped[kind])
+        return self.created, self.skipped
+
+    def _read_header(self):
+        try:
+            header = json.loads(next(self.lines))
+        except (StopIteration, json.JSONDecodeError):
+            raise TransferError("Not a blog export: missing header line")
+        if header.get('type') != 'header' or header.get('format') != FORMAT:
+            raise TransferError("Not a blog export: bad header line")
+        if header.get('version') != VERSION:
+            raise TransferError(f"Unsupported export version {header.get('version')!r}")
+        self.export_id = header['export_id']
+
+    def _records(self):
+        # Line 1 was the header
+        for number, line in enumerate(self.lines, start=2):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise TransferError(f"Line {number} is not valid JSON ({exc.msg})") from exc
+            if not isinstance(record, dict):
+                raise TransferError(f"Line {number} is not a record")
+            yield record
+
+    def _mapped(self, kind, source_ids):
+        return dict(
+            ImportMapping.objects.filter(export_id=self.export_id, kind=kind, source_id__in=set(source_ids))
+            .values_list('source_id', 'target_id')
+        )
+
+    def _remap(self, batch, references):
+        # Rewrite foreign keys to local ids; drops records whose required
+        # targets never made it in
+        maps = {
+            field: self._mapped(kind, [record[field] for record in batch if record.get(field) is not None])
+            for field, kind in references.items()
+        }
+        remapped = []
+        for record in batch:
+            for field, mapping in maps.items():
+                if record.get(field) is None:
+                    continue
+                record[field] = mapping.get(record[field])
+                if record[field] is None and field not in self.OPTIONAL:
+                    break
+            else:
+                remapped.append(record)
+        return remapped
+
+    def _import_objects(self, kind, batch):
+        model, natural_key, references = self.OBJECTS[kind]
+        done = self._mapped(kind, [record['id'] for record in batch])
+        pending = [record for record in batch if record['id'] not in done]
+        records = self._remap(pending, references)
+        self.skipped[kind] += len(pending) - len(records)
+
+        mappings = []
+        if natural_key:
+            # Merge with rows that already exist under the same username/slug
+            existing = dict(
+                model.objects.filter(**{f'{natural_key}__in': [record[natural_key] for record in records]})
+                .values_list(natural_key, 'id')
+            )
+            mappings += [(record['id'], existing[record[natural_key]]) for record in records
+                         if record[natural_key] in existing]
+            records = [record for record in records if record[natural_key] not in existing]
+
+        objects = [self._build(model, record) for record in records]
+        model.objects.bulk_create(objects)
+        self._restore_timestamps(model, objects, records)
+        mappings += [(record['id'], obj.pk) for record, obj in zip(records, objects)]
+        ImportMapping.objects.bulk_create([
+            ImportMapping(export_id=self.export_id, kind=kind, source_id=source, target_id=target)
+            for source, target in mappings
+        ])
+        self.created[kind] += len(mappings)
+
+    def _build(self, model, record):
+        fields = {key: value for key, value in record.items() if key not in ('type', 'id')}
+        obj = model(**fields)
+        if model is User:
+            obj.password = make_password(None)
+        elif model is Post:
+            obj.featured_image = fields.get('featured_image') or None
+            obj.summary = obj.build_summary()
+        return obj
+
+    def _restore_timestamps(self, model, objects, records):
+        # bulk_create stamps auto_now/auto_now_add fields with the current
+        # time; put the exported values back
+        stamps = [field.name for field in model._meta.concrete_fields
+                  if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+        stamps = [name for name in stamps if records and name in records[0]]
+        if not stamps:
+            return
+        for obj, record in zip(objects, records):
+            for name in stamps:
+                setattr(obj, name, parse_datetime(record[name]))
+        model.objects.bulk_update(objects, stamps)
+
+    def _import_links(self, kind, batch):
+        through, references = self.LINKS[kind]
+        records = self._remap(batch, references)
+        self.skipped[kind] += len(batch) - len(records)
+        # Rows from a previous, interrupted run (or repeated in the file) are
+        # left out, so only rows actually inserted are counted
+        fields = list(references)
+        wanted = {tuple(record[field] for field in fields): record for record in records}
+        existing = set(
+            through.objects.filter(**{f'{field}__in': {record[field] for record in records} for field in fields})
+            .values_list(*fields)
+        )
+        new = [record for key, record in wanted.items() if key not in existing]
+        through.objects.bulk_create(
+            [through(**{field: record[field] for field in references}, **self._link_extras(record))
+             for record in new],
+            ignore_conflicts=True,
+        )
+        self.created[kind] += len(new)
+
+    def _link_extras(self, record):
+        # Likes and bookmarks carry when they were made; exports from before
+        # that was recorded don't, and get the import time instead
+        if record.get('created_at'):
+            return {'created_at': parse_datetime(record['created_at'])}
+        return {}
+
+
+def refresh_derived_data(batch_size=1000):
+    # Bulk inserts skip the signals, so rebuild everything they maintain
+    Post.objects.recount_stats()
+    trending.rebuild_scores(batch_size=batch_size)
+    related.rebuild(batch_size=batch_size)
+    get_search_backend().rebuild()
+    category_registry.invalidate()
+    caching.invalidate_all_fragments()
+
+
+def import_lines(lines, batch_size=1000, progress=None):
+    created, skipped = Importer(lines, batch_size, progress).run()
+    refresh_derived_data(batch_size)
+    return created, skipped
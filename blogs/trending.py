@@ -0,0 +1,126 @@
+# Trending posts
+#
+# Every post carries a trending_score column: the weighted sum of its likes,
+# bookmarks and comments (BLOG_TRENDING_WEIGHTS), decayed over time. New
+# interactions add their weight in the same UPDATE that moves the counter
+# (PostQuerySet.adjust_counter), so the score is always current without any
+# counting at read time. The recompute_trending command runs periodically and
+# multiplies every score by 0.5 ** (elapsed / half-life) in id-range batches,
+# which ages old interactions out of the ranking.
+#
+# The /trending/ page and the sidebar widget read a precomputed top-N list
+# kept in the shared cache; on a miss it is reloaded with one query that walks
+# the post_trending_idx index.
+
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Max
+from django.utils import timezone
+
+from . import caching
+from .models import Post, trending_weight
+
+TOP_KEY = 'blog:trending:top'
+DECAYED_AT_KEY = 'blog:trending:decayed_at'
+
+# Scores that have decayed below this are reset to zero so the trending
+# index only ever holds posts with recent activity
+SCORE_FLOOR = 0.01
+
+
+def half_life_hours():
+    return getattr(settings, 'BLOG_TRENDING_HALF_LIFE_HOURS', 24)
+
+
+def list_size():
+    return getattr(settings, 'BLOG_TRENDING_SIZE', 50)
+
+
+def cache_timeout():
+    return getattr(settings, 'BLOG_TRENDING_CACHE_TIMEOUT', 300)
+
+
+def decay_interval():
+    # How often the decay job is expected to run; used when it has no record
+    # of its previous run (first run, or the cache was cleared)
+    return getattr(settings, 'BLOG_TRENDING_DECAY_INTERVAL', 3600)
+
+
+class TrendingEntry(NamedTuple):
+    id: int
+    title: str
+    score: float
+
+    @property
+    def pk(self):
+        return self.id
+
+
+def top_posts(limit=None):
+    entries = cache.get(TOP_KEY)
+    caching.stats.record('trending', entries is not None)
+    if entries is None:
+        rows = Post.objects.trending().values_list('id', 'title', 'trending_score')[:list_size()]
+        entries = [TrendingEntry(*row) for row in rows]
+        cache.set(TOP_KEY, entries, cache_timeout())
+    return entries[:limit] if limit is not None else entries
+
+
+def invalidate():
+    cache.delete(TOP_KEY)
+
+
+def decay_factor(elapsed):
+    return 0.5 ** (elapsed / (half_life_hours() * 3600))
+
+
+def apply_decay(elapsed=None, batch_size=1000):
+    # Multiply every live score by the decay for the time since the last run.
+    # Returns (rows updated, factor applied)
+    now = time.time()
+    if elapsed is None:
+        last = cache.get(DECAYED_AT_KEY)
+        elapsed = now - last if last is not None else decay_interval()
+    factor = decay_factor(max(elapsed, 0))
+
+    updated = 0
+    live = Post.objects.filter(trending_score__gt=0)
+    max_id = live.aggregate(top=Max('id'))['top'] or 0
+    # Id ranges keep each UPDATE (and the write lock it holds) short
+    for start in range(0, max_id, batch_size):
+        updated += live.filter(id__gt=start, id__lte=start + batch_size).update(
+            trending_score=F('trending_score') * factor
+        )
+    Post.objects.filter(trending_score__gt=0, trending_score__lt=SCORE_FLOOR).update(trending_score=0)
+
+    cache.set(DECAYED_AT_KEY, now, None)
+    invalidate()
+    return updated, factor
+
+
+def rebuild_scores(batch_size=1000):
+    # Recompute every score from the counter columns, decayed by post age.
+    # Only needed after changing the weights or half-life
+    now = timezone.now()
+    fields = ['like_count', 'bookmark_count', 'comment_count']
+    changed = []
+    total = 0
+    for post in Post.objects.only('id', 'created_at', 'trending_score', *fields).iterator(chunk_size=batch_size):
+        raw = sum(getattr(post, field) * trending_weight(field) for field in fields)
+        age = max((now - post.created_at).total_seconds(), 0)
+        score = raw * decay_factor(age) if raw else 0.0
+        if score < SCORE_FLOOR:
+            score = 0.0
+        if score != post.trending_score:
+            post.trending_score = score
+            changed.append(post)
+        if len(changed) >= batch_size:
+            total += Post.objects.bulk_update(changed, ['trending_score'])
+            changed = []
+    total += Post.objects.bulk_update(changed, ['trending_score'])
+    cache.set(DECAYED_AT_KEY, time.time(), None)
+    invalidate()
+    return total
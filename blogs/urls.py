@@ -1,7 +1,7 @@
 # URL configuration for the blog app
 # Maps URLs to their corresponding view functions
 
-from django.urls import path
+from django.urls import include, path
 from django.contrib.auth import views as auth_views  # Django's built-in auth views
 from . import views
 
@@ -17,9 +17,20 @@ urlpatterns = [
     path('login/', auth_views.LoginView.as_view(template_name='blogs/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('category/<slug:slug>/', views.category_posts, name='category_posts'),
+    path('tag/<str:slug>/', views.tag_posts, name='tag_posts'),
+    path('trending/', views.trending_posts, name='trending_posts'),
     path('comment/<int:pk>/delete/', views.comment_delete, name='comment_delete'),
     path('search/', views.search_posts, name='search_posts'),
     path('post/<int:pk>/like/', views.toggle_like, name='toggle_like'),
     path('post/<int:pk>/bookmark/', views.toggle_bookmark, name='toggle_bookmark'),
+    path('post/<int:pk>/comments/', views.post_comments, name='post_comments'),
+    path('activity/', views.my_activity, name='my_activity'),
+    path('activity/posts/', views.my_posts, name='my_posts'),
+    path('activity/likes/', views.my_likes, name='my_likes'),
     path('bookmarks/', views.my_bookmarks, name='my_bookmarks'),
+    path('activity/comments/', views.my_comments, name='my_comments'),
+    path('cache/stats/', views.cache_stats, name='cache_stats'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('export/blog.ndjson', views.export_blog, name='export_blog'),
+    path('api/v1/', include('blogs.api_urls', namespace='api-v1')),
 ]
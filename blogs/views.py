@@ -1,35 +1,55 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
-from .models import Post, Comment, Category
+from .models import Post, Comment, Category, Tag
 from .forms import RegisterForm, PostForm, CommentForm
-from django.http import HttpResponseRedirect
+from .pagination import comment_page_size, decode_cursor, offset_page, paginate, thread_page
+from .search import get_search_backend
+from . import activity, caching, metrics, related, transfer, trending, writebehind
+from .categories import registry as category_registry
+from .tags import set_post_tags
+from .conditional import category_validators, conditional_page, home_validators, post_validators
+from .routers import replica_reads
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.db import transaction
 
 
 # Main page view - shows all blog posts (only for logged-in users)
 from django.contrib.auth.decorators import login_required
 
 @login_required
+@replica_reads
 def index(request):
-    posts = Post.objects.all().order_by('-created_at')
-    categories = Category.objects.all()
+    page = paginate(request, Post.objects.feed())
+    caching.prime_fragments('card', page.object_list)
     return render(request, 'blogs/index.html', {
-        'posts': posts,
-        'categories': categories
+        'posts': page.object_list,
+        'page': page,
     })
 
 # Public home page for non-logged-in users
+@conditional_page(home_validators)
 def public_home(request):
     if request.user.is_authenticated:
         return redirect('index')
     return render(request, 'blogs/public_home.html')
 
 # Single post page with comments
+@replica_reads
+@conditional_page(post_validators)
 def post_detail(request, pk):
     # Find the post or show 404 if not found
-    post = get_object_or_404(Post, pk=pk)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'category').with_viewer_flags(request.user),
+        pk=pk,
+    )
+    comments, comments_next = comment_batch(post.pk, request.GET.get('comments_after'))
+    if writebehind.enabled():
+        # Toggles still waiting in the write-behind buffer
+        writebehind.buffer.overlay(post, request.user)
 
     # Handle new comment submission
     if request.method == "POST":
@@ -39,7 +59,9 @@ def post_detail(request, pk):
             comment = form.save(commit=False)
             comment.post = post
             comment.user = request.user
-            comment.save()
+            # The comment and its counter bump (blogs.signals) commit together
+            with transaction.atomic():
+                comment.save()
             return redirect('post_detail', pk=post.pk)
     else:
         form = CommentForm()
@@ -47,9 +69,27 @@ def post_detail(request, pk):
     return render(request, 'blogs/post_detail.html', {
         'post': post, 
         'comments': comments, 
+        'comments_next': comments_next,
+        'related_posts': related.related_posts(post.pk),
         'form': form
     })
 
+def comment_batch(post_id, after=None):
+    # One page of a post's thread, oldest first, with authors joined in
+    queryset = Comment.objects.filter(post_id=post_id).select_related('user')
+    return thread_page(queryset, decode_cursor(after or ''), comment_page_size())
+
+@replica_reads
+def post_comments(request, pk):
+    # "Load more" endpoint: the next batch of comments as rendered HTML
+    get_object_or_404(Post.objects.only('pk'), pk=pk)
+    comments, next_cursor = comment_batch(pk, request.GET.get('after'))
+    html = render_to_string('blogs/includes/comment_list.html', {'comments': comments}, request=request)
+    return JsonResponse({
+        'html': html,
+        'next': f"{reverse('post_comments', args=[pk])}?after={next_cursor}" if next_cursor else None,
+    })
+
 def register(request):
     if request.method == "POST":
         form = RegisterForm(request.POST)
@@ -67,18 +107,13 @@ def post_create(request):
     if request.method == "POST":
         form = PostForm(request.POST, request.FILES)
         if form.is_valid():
-            post = form.save(commit=False)
-            post.author = request.user
-            post.save()  # Save to get an ID
-            # Handle tags after post is saved
-            tag_names = [t.strip() for t in form.cleaned_data.get('tags', '').split(',') if t.strip()]
-            from .models import Tag
-            tag_objs = []
-            for tag_name in tag_names:
-                tag_obj, _ = Tag.objects.get_or_create(name=tag_name)
-                tag_objs.append(tag_obj)
-            post.tags.set(tag_objs)
-            form.save_m2m()
+            # The post and its tags are saved together or not at all
+            with transaction.atomic():
+                post = form.save(commit=False)
+                post.author = request.user
+                post.save()  # Save to get an ID
+                set_post_tags(post, form.cleaned_data.get('tags', ''))
+                related.update_post(post)
             return redirect('post_detail', pk=post.pk)
     else:
         form = PostForm()
@@ -92,17 +127,23 @@ def post_edit(request, pk):
         return redirect('post_detail', pk=post.pk)
 
     if request.method == "POST":
-        form = PostForm(request.POST, instance=post)
+        old_category_id = post.category_id
+        form = PostForm(request.POST, request.FILES, instance=post)
         if form.is_valid():
-            post = form.save(commit=False)
+            with transaction.atomic():
+                post = form.save(commit=False)
 
-            # Handle new category creation
-            new_cat_name = form.cleaned_data.get('new_category')
-            if new_cat_name:
-                category, created = Category.objects.get_or_create(name=new_cat_name)
-                post.category = category
+                # Handle new category creation
+                new_cat_name = form.cleaned_data.get('new_category')
+                if new_cat_name:
+                    category, created = Category.objects.get_or_create(name=new_cat_name)
+                    post.category = category
 
-            post.save()
+                post.save()
+                tags_changed = set_post_tags(post, form.cleaned_data.get('tags', ''))
+                # Related lists only depend on tags and category
+                if tags_changed or post.category_id != old_category_id:
+                    related.update_post(post)
             return redirect('post_detail', pk=post.pk)
     else:
         form = PostForm(instance=post)
@@ -120,59 +161,142 @@ def post_delete(request, pk):
 def comment_delete(request, pk):
     comment = get_object_or_404(Comment, pk=pk)
     if request.user == comment.user:
-        post_pk = comment.post.pk
-        comment.delete()
+        post_pk = comment.post_id
+        with transaction.atomic():
+            comment.delete()
         return redirect('post_detail', pk=post_pk)
-    return redirect('post_detail', pk=comment.post.pk)
+    return redirect('post_detail', pk=comment.post_id)
 
+@replica_reads
+@conditional_page(category_validators)
 def category_posts(request, slug):
-    category = get_object_or_404(Category, slug=slug)
-    posts = Post.objects.filter(category=category).order_by('-created_at')
-    categories = Category.objects.all()
+    category = category_registry.get_by_slug(slug)
+    if category is None:
+        raise Http404("No category matches the given query.")
+    page = paginate(request, Post.objects.feed().filter(category_id=category.id))
+    caching.prime_fragments('category_card', page.object_list)
     return render(request, 'blogs/category_posts.html', {
         'category': category,
-        'categories': categories,
-        'posts': posts
+        'posts': page.object_list,
+        'page': page,
     })
 
+@replica_reads
+def tag_posts(request, slug):
+    tag = get_object_or_404(Tag, slug=slug)
+    page = paginate(request, Post.objects.feed().filter(tags=tag))
+    caching.prime_fragments('category_card', page.object_list)
+    return render(request, 'blogs/tag_posts.html', {
+        'tag': tag,
+        'posts': page.object_list,
+        'page': page,
+    })
+
+@replica_reads
+def trending_posts(request):
+    # Ranked by the cached top-N list, so this is one id lookup plus the
+    # usual card prefetches; no counting or sorting at request time
+    entries = trending.top_posts()
+    by_id = Post.objects.feed().in_bulk([entry.id for entry in entries])
+    posts = [by_id[entry.id] for entry in entries if entry.id in by_id]
+    caching.prime_fragments('category_card', posts)
+    return render(request, 'blogs/trending.html', {'posts': posts})
+
+@replica_reads
 def search_posts(request):
-    query = request.GET.get('q', '')
-    if query:
-        posts = Post.objects.filter(title__icontains=query) | \
-                Post.objects.filter(content__icontains=query)
-    else:
-        posts = Post.objects.none()
-    
-    categories = Category.objects.all()
+    query = request.GET.get('q', '').strip()
+    # Ranked results can't be keyset-paged on created_at, so search always
+    # uses page numbers
+    results = get_search_backend().search(query) if query else []
+    page = offset_page(request, results)
     return render(request, 'blogs/search_results.html', {
-        'posts': posts,
+        'posts': page.object_list,
+        'page': page,
         'query': query,
-        'categories': categories
     })
 
+# AJAX callers (fetch with an Accept: application/json header) get the new
+# state back as JSON instead of a redirect and a full page re-render
+def wants_json(request):
+    return (
+        request.headers.get('x-requested-with') == 'XMLHttpRequest'
+        or request.headers.get('accept', '').startswith('application/json')
+    )
+
 @login_required
 def toggle_like(request, pk):
-    post = get_object_or_404(Post, pk=pk)
-    if request.user in post.likes.all():
-        post.likes.remove(request.user)
+    post = get_object_or_404(Post.objects.only('id', 'like_count'), pk=pk)
+    if writebehind.enabled():
+        liked, count = writebehind.buffer.toggle('like', post, request.user)
     else:
-        post.likes.add(request.user)
+        liked, count = post.toggle_like(request.user)
+    if wants_json(request):
+        return JsonResponse({'active': liked, 'count': count})
     return HttpResponseRedirect(reverse('post_detail', args=[str(pk)]))
 
 @login_required
 def toggle_bookmark(request, pk):
-    post = get_object_or_404(Post, pk=pk)
-    if request.user in post.bookmarks.all():
-        post.bookmarks.remove(request.user)
+    post = get_object_or_404(Post.objects.only('id', 'bookmark_count'), pk=pk)
+    if writebehind.enabled():
+        bookmarked, count = writebehind.buffer.toggle('bookmark', post, request.user)
     else:
-        post.bookmarks.add(request.user)
+        bookmarked, count = post.toggle_bookmark(request.user)
+    if wants_json(request):
+        return JsonResponse({'active': bookmarked, 'count': count})
     return HttpResponseRedirect(reverse('post_detail', args=[str(pk)]))
 
+# The signed-in user's activity: totals and latest entries of every list
 @login_required
+@replica_reads
+def my_activity(request):
+    return render(request, 'blogs/activity.html', {
+        'summary': activity.dashboard(request.user),
+    })
+
+def activity_page(request, kind):
+    # One paginated list from blogs.activity
+    page = paginate(request, activity.rows(kind, request.user))
+    return render(request, 'blogs/activity_list.html', {
+        'section': activity.SECTIONS[kind],
+        'sections': activity.SECTIONS.values(),
+        'entries': activity.entries(kind, page.object_list),
+        'page': page,
+    })
+
+@login_required
+@replica_reads
+def my_posts(request):
+    return activity_page(request, 'posts')
+
+@login_required
+@replica_reads
+def my_likes(request):
+    return activity_page(request, 'likes')
+
+# Bookmarks in the order they were made, newest first
+@login_required
+@replica_reads
 def my_bookmarks(request):
-    posts = Post.objects.filter(bookmarks=request.user).order_by('-created_at')
-    categories = Category.objects.all()
-    return render(request, 'blogs/my_bookmarks.html', {
-        'posts': posts,
-        'categories': categories
-    })
\ No newline at end of file
+    return activity_page(request, 'bookmarks')
+
+@login_required
+@replica_reads
+def my_comments(request):
+    return activity_page(request, 'comments')
+
+# Fragment/sidebar cache hit and miss counters for this worker process
+@staff_member_required
+def cache_stats(request):
+    return JsonResponse(caching.stats.snapshot())
+
+# Per-view request histogram for this worker process, for Prometheus to scrape
+@staff_member_required
+def metrics_view(request):
+    return HttpResponse(metrics.histogram.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Full NDJSON dump for staff, streamed row by row (same format as export_blog)
+@staff_member_required
+def export_blog(request):
+    response = StreamingHttpResponse(transfer.export_lines(), content_type='application/x-ndjson')
+    response['Content-Disposition'] = 'attachment; filename="blog-export.ndjson"'
+    return response
@@ -0,0 +1,263 @@
+# Write-behind buffering for like/bookmark toggles (BLOG_WRITE_BEHIND)
+#
+# With the buffer on, a toggle doesn't touch the relation tables at all.
+# Each (relation, post, user) has a toggle counter in the shared cache whose
+# parity is the user's state (odd: liked). It starts at 1 or 0 from the row
+# in the database (cache.add, so only the first toggle seeds it) and every
+# toggle is a single cache.incr, so concurrent toggles from any number of
+# workers each flip the state exactly once and each know which way they
+# flipped it. The post's pending count delta is bumped the same way, the
+# toggle time is kept next to the counter for the row's created_at, and the
+# key is remembered in this process' dirty set. A
+# background thread flushes the dirty set every BLOG_WRITE_BEHIND_INTERVAL
+# seconds: it reads the latest wanted state of each key, diffs it against
+# the rows that exist, and applies the difference with one bulk_create, one
+# bulk DELETE and one counter UPDATE per delta per relation, in a single
+# transaction. Only the final state per user and post is ever written, so
+# double clicks and like/unlike bursts collapse, and a key flushed by two
+# workers is harmless (the second sees nothing left to do).
+#
+# Pages read the stored counters plus the pending deltas and the viewer's
+# pending state (overlay()), so a toggle shows up immediately. The dirty set
+# is flushed once more when the worker process exits normally; a hard kill
+# loses at most one interval of toggles.
+
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import caching
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# relation -> (through model, counter column, viewer flag from with_viewer_flags)
+RELATIONS = {
+    'like': (Post.likes.through, 'like_count', 'viewer_has_liked'),
+    'bookmark': (Post.bookmarks.through, 'bookmark_count', 'viewer_has_bookmarked'),
+}
+
+
+def enabled():
+    return getattr(settings, 'BLOG_WRITE_BEHIND', False)
+
+
+def flush_interval():
+    # Seconds between background flushes; 0 means no thread (flush() by hand)
+    return getattr(settings, 'BLOG_WRITE_BEHIND_INTERVAL', 1.0)
+
+
+def state_timeout():
+    # How long a pending state may wait in the cache for its flush
+    return getattr(settings, 'BLOG_WRITE_BEHIND_TTL', 600)
+
+
+def _state_key(relation, post_id, user_id):
+    return f'blog:wb:{relation}:{post_id}:{user_id}'
+
+
+def _time_key(relation, post_id, user_id):
+    return f'blog:wb:{relation}:{post_id}:{user_id}:at'
+
+
+def _is_active(toggles):
+    return toggles % 2 == 1
+
+
+def _delta_key(relation, post_id):
+    return f'blog:wb:{relation}:{post_id}:delta'
+
+
+def _adjust(key, amount):
+    # Add a toggle to a post's pending delta. incr keeps the expiry the key
+    # was created with, so push it back on every change or a busy post's
+    # delta would expire with toggles still unflushed
+    if not amount:
+        return
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # Not there yet (or evicted): start it, unless someone beat us to it
+        if not cache.add(key, amount, state_timeout()):
+            cache.incr(key, amount)
+    cache.touch(key, state_timeout())
+
+
+def _settle(key, amount):
+    # Take what a flush wrote off the pending delta. A missing key lost
+    # those toggles from the overlay already; starting it at -amount would
+    # take them off the stored counter a second time
+    if not amount:
+        return
+    try:
+        cache.incr(key, -amount)
+    except ValueError:
+        pass
+
+
+class WriteBehindBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def toggle(self, relation, post, user):
+        # Flip the user's state and return (is_now_active, count to show)
+        through, counter, _ = RELATIONS[relation]
+        key = _state_key(relation, post.pk, user.pk)
+        toggled_at = timezone.now()
+        while True:
+            try:
+                active = _is_active(cache.incr(key))
+                cache.touch(key, state_timeout())
+                break
+            except ValueError:
+                # First toggle (or evicted): seed the counter from the row
+                exists = through.objects.filter(post_id=post.pk, user_id=user.pk).exists()
+                cache.add(key, int(exists), state_timeout())
+        cache.set(_time_key(relation, post.pk, user.pk), toggled_at, state_timeout())
+        _adjust(_delta_key(relation, post.pk), 1 if active else -1)
+        with self._lock:
+            self._dirty.add((relation, post.pk, user.pk))
+        self._ensure_started()
+        caching.invalidate_post(post.pk)
+        return active, self.count(relation, post.pk, getattr(post, counter))
+
+    def count(self, relation, post_id, stored):
+        return max(stored + (cache.get(_delta_key(relation, post_id)) or 0), 0)
+
+    def overlay(self, post, user):
+        # Apply pending toggles to a post about to be rendered: the counters
+        # for everybody, the viewer_has_* flags for the viewer
+        keys = {relation: _delta_key(relation, post.pk) for relation in RELATIONS}
+        if user.is_authenticated:
+            keys.update({f'{relation}:viewer': _state_key(relation, post.pk, user.pk) for relation in RELATIONS})
+        found = cache.get_many(list(keys.values()))
+        for relation, (_, counter, flag) in RELATIONS.items():
+            delta = found.get(keys[relation])
+            if delta:
+                setattr(post, counter, max(getattr(post, counter) + delta, 0))
+            viewer = found.get(keys.get(f'{relation}:viewer'))
+            if viewer is not None:
+                setattr(post, flag, _is_active(viewer))
+        return post
+
+    def pending(self):
+        with self._lock:
+            return len(self._dirty)
+
+    def flush(self):
+        # Write every dirty key's latest state; returns the rows changed
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return 0
+        try:
+            return self._apply(dirty)
+        except Exception:
+            # Keep them for the next round rather than dropping toggles
+            with self._lock:
+                self._dirty |= dirty
+            raise
+
+    def _apply(self, dirty):
+        keys = {item: _state_key(*item) for item in dirty}
+        times = {item: _time_key(*item) for item in dirty}
+        found = cache.get_many([*keys.values(), *times.values()])
+        wanted = defaultdict(dict)
+        toggled_at = {}
+        for item, key in keys.items():
+            relation, post_id, user_id = item
+            if key in found:  # expired states are dropped
+                wanted[relation][(post_id, user_id)] = _is_active(found[key])
+                toggled_at[item] = found.get(times[item])
+
+        changed = 0
+        applied = Counter()
+        with transaction.atomic():
+            for relation, pairs in wanted.items():
+                through, counter, _ = RELATIONS[relation]
+                post_ids = {post_id for post_id, _ in pairs}
+                live_posts = set(Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True))
+                existing = {
+                    (post_id, user_id): pk for pk, post_id, user_id in
+                    through.objects.filter(post_id__in=post_ids, user_id__in={user_id for _, user_id in pairs})
+                    .values_list('pk', 'post_id', 'user_id')
+                }
+                adds = [pair for pair, active in pairs.items()
+                        if active and pair not in existing and pair[0] in live_posts]
+                removes = [pair for pair, active in pairs.items() if not active and pair in existing]
+
+                through.objects.bulk_create(
+                    [
+                        through(
+                            post_id=post_id,
+                            user_id=user_id,
+                            created_at=toggled_at.get((relation, post_id, user_id)) or timezone.now(),
+                        )
+                        for post_id, user_id in adds
+                    ],
+                    ignore_conflicts=True,
+                )
+                through.objects.filter(pk__in=[existing[pair] for pair in removes]).delete()
+
+                deltas = Counter()
+                for post_id, _ in adds:
+                    deltas[post_id] += 1
+                for post_id, _ in removes:
+                    deltas[post_id] -= 1
+                by_delta = defaultdict(list)
+                for post_id, delta in deltas.items():
+                    if delta:
+                        by_delta[delta].append(post_id)
+                for delta, ids in by_delta.items():
+                    Post.objects.filter(pk__in=ids).adjust_counter(counter, delta)
+                for post_id, delta in deltas.items():
+                    applied[(relation, post_id)] += delta
+                changed += len(adds) + len(removes)
+                caching.invalidate_posts(post_ids)
+
+        # The stored counters now include these, take them off the overlay
+        for (relation, post_id), delta in applied.items():
+            _settle(_delta_key(relation, post_id), delta)
+        return changed
+
+    def _ensure_started(self):
+        if self._thread is not None or not flush_interval():
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='blog-write-behind', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while not self._wakeup.wait(flush_interval()):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed, will retry")
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        # Stop the thread and write out whatever is still pending
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self._wakeup.clear()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Write-behind flush at shutdown failed; %d toggles lost", self.pending())
+
+
+buffer = WriteBehindBuffer()
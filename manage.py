@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_blog.settings')
+    # The test suite has its own settings module on top of the real one
+    settings_module = 'my_blog.test_settings' if sys.argv[1:2] == ['test'] else 'my_blog.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -0,0 +1,100 @@
+"""
+Database profiles for my_blog.settings.
+
+DATABASES is built from DATABASE_URL as before, then tuned for the engine:
+
+- PostgreSQL: Django's native psycopg 3 connection pool (when psycopg with
+  the pool extra is installed) plus CONN_HEALTH_CHECKS, so a connection the
+  server dropped is replaced instead of failing the next request. Without
+  psycopg 3 it falls back to persistent connections with health checks.
+- SQLite: a busy timeout, mmap and a bigger page cache, applied by Django on
+  every new connection (init_command), and BEGIN IMMEDIATE transactions so
+  concurrent writers queue on the busy timeout instead of failing with
+  "database is locked". SQLITE_WAL=True adds the WAL journal with
+  synchronous=NORMAL. It is opt-in because journal_mode=WAL is stored in the
+  database file itself: every connection would convert the committed dev
+  db.sqlite3 and leave -wal/-shm files next to it.
+
+BLOG_DB_PROFILE=plain turns all of this off.
+
+Read replicas come from REPLICA_DATABASE_URLS (comma separated) and become
+the replica1, replica2... aliases used by blogs.routers.
+"""
+
+import os
+
+import dj_database_url
+
+
+def sqlite_options(busy_timeout=None, mmap_size=None, cache_size=None, wal=None):
+    wal = wal if wal is not None else os.getenv("SQLITE_WAL", "False") == "True"
+    busy_timeout = busy_timeout if busy_timeout is not None else int(os.getenv("SQLITE_BUSY_TIMEOUT", "20"))
+    mmap_size = mmap_size if mmap_size is not None else int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+    # Negative cache_size is in KiB, so this is 64 MB of page cache
+    cache_size = cache_size if cache_size is not None else int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+    # NORMAL is only safe to pair with WAL; the rollback journal keeps FULL
+    pragmas = ["PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL"] if wal else []
+    pragmas += [
+        f"PRAGMA mmap_size={mmap_size}",
+        f"PRAGMA cache_size={cache_size}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    return {
+        "timeout": busy_timeout,  # seconds; sets sqlite3's busy timeout
+        "transaction_mode": "IMMEDIATE",
+        "init_command": ";".join(pragmas),
+    }
+
+
+def psycopg_pool_available():
+    try:
+        import psycopg  # noqa: F401
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def postgres_options():
+    return {
+        "pool": {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            "timeout": int(os.getenv("DB_POOL_TIMEOUT", "10")),
+        },
+    }
+
+
+def apply_profile(config, profile="tuned"):
+    # Tune a DATABASES entry in place for its engine and return it
+    if profile == "plain":
+        return config
+    engine = config.get("ENGINE", "")
+    options = config.setdefault("OPTIONS", {})
+    if engine.endswith("sqlite3"):
+        options.update(sqlite_options())
+    elif engine.endswith("postgresql"):
+        config["CONN_HEALTH_CHECKS"] = True
+        if psycopg_pool_available():
+            # The pool keeps the connections; Django must not hold its own
+            config["CONN_MAX_AGE"] = 0
+            options.update(postgres_options())
+    return config
+
+
+def database_config(default_url):
+    config = dj_database_url.config(
+        default=default_url,
+        conn_max_age=600,
+        ssl_require=False,
+    )
+    return apply_profile(config, os.getenv("BLOG_DB_PROFILE", "tuned"))
+
+
+def replica_configs():
+    urls = [url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()]
+    profile = os.getenv("BLOG_DB_PROFILE", "tuned")
+    return {
+        f"replica{i}": apply_profile(dj_database_url.parse(url, conn_max_age=600), profile)
+        for i, url in enumerate(urls, start=1)
+    }
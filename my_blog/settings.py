@@ -7,7 +7,9 @@ This setup works for both local development (SQLite) and production (PostgreSQL)
 
 from pathlib import Path
 import os
-import dj_database_url
+
+from my_blog.database import database_config, replica_configs
+from my_blog.templating import template_config
 
 # Build paths inside the project
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -37,44 +39,112 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "blogs.middleware.RequestMetricsMiddleware",  # First, so it times everything below
+    "blogs.middleware.TemplateProfilerMiddleware",  # Only active with DEBUG and BLOG_TEMPLATE_PROFILER
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",  # Added for serving static files
+    "blogs.middleware.StaticFilesMiddleware",  # WhiteNoise static files, async-capable
+    "blogs.middleware.AnonymousPageCacheMiddleware",  # Must stay above the session middleware
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "blogs.routers.StickyPrimaryMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
 ROOT_URLCONF = "my_blog.urls"
 
+# Template loading and debug info per BLOG_TEMPLATE_PROFILE (see
+# my_blog/templating.py): "production" keeps compiled templates in Django's
+# cached loader, "development" uses Django's defaults
+BLOG_TEMPLATE_PROFILE = os.getenv("BLOG_TEMPLATE_PROFILE", "development" if DEBUG else "production")
+
 TEMPLATES = [
-    {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
-        "DIRS": [BASE_DIR / "templates"],
-        "APP_DIRS": True,
-        "OPTIONS": {
-            "context_processors": [
-                "django.template.context_processors.request",
-                "django.contrib.auth.context_processors.auth",
-                "django.contrib.messages.context_processors.messages",
-            ],
-        },
-    },
+    template_config(
+        [BASE_DIR / "templates"],
+        [
+            "django.template.context_processors.request",
+            "django.contrib.auth.context_processors.auth",
+            "django.contrib.messages.context_processors.messages",
+            "blogs.context_processors.categories",
+            "blogs.context_processors.trending",
+        ],
+        BLOG_TEMPLATE_PROFILE,
+    ),
 ]
 
+# Log per-template and per-tag render times of every request on the
+# blogs.templates logger (blogs/profiling.py); ignored unless DEBUG is on.
+# NODES is how many of the slowest tags each report lists
+BLOG_TEMPLATE_PROFILER = os.getenv("BLOG_TEMPLATE_PROFILER", "False") == "True"
+BLOG_TEMPLATE_PROFILER_NODES = int(os.getenv("BLOG_TEMPLATE_PROFILER_NODES", "15"))
+
 WSGI_APPLICATION = "my_blog.wsgi.application"
 
 # Database
 # Use SQLite locally, PostgreSQL in production
+# Tuned per engine by my_blog/database.py: pooled, health-checked
+# connections on PostgreSQL, WAL and friends on SQLite (BLOG_DB_PROFILE=plain
+# to opt out)
 DATABASES = {
-    "default": dj_database_url.config(
-        default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
-        conn_max_age=600,
-        ssl_require=False,
-    )
+    "default": database_config(f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
+    **replica_configs(),
 }
+DATABASE_ROUTERS = ["blogs.routers.PrimaryReplicaRouter"]
+
+# Send listing/search/detail reads to the replicas above (blogs/routers.py).
+# After a write the client reads from the primary for
+# BLOG_REPLICA_STICKY_SECONDS so it sees its own change
+BLOG_READ_REPLICAS = any(alias.startswith("replica") for alias in DATABASES)
+BLOG_REPLICA_STICKY_SECONDS = int(os.getenv("BLOG_REPLICA_STICKY_SECONDS", "10"))
+
+# Cache
+# Redis when REDIS_URL is set, a shared file cache when CACHE_DIR is set,
+# otherwise per-process memory.
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+elif os.getenv("CACHE_DIR"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_DIR"),
+            "OPTIONS": {"MAX_ENTRIES": 20000},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        }
+    }
+
+# How long rendered post fragments stay cached (seconds)
+BLOG_CACHE_TIMEOUT = int(os.getenv("BLOG_CACHE_TIMEOUT", "600"))
+
+# max-age sent with anonymous post/category pages. 0 means browsers and CDNs
+# keep the page but revalidate it (cheap 304s) on every request
+BLOG_HTTP_MAX_AGE = int(os.getenv("BLOG_HTTP_MAX_AGE", "0"))
+
+# Full-page cache for logged-out readers (blogs.middleware). Pages are fresh
+# for BLOG_PAGE_CACHE_TIMEOUT seconds (0 disables the cache) and may be served
+# stale for BLOG_PAGE_CACHE_STALE more while one request rebuilds them
+BLOG_PAGE_CACHE_TIMEOUT = int(os.getenv("BLOG_PAGE_CACHE_TIMEOUT", "60"))
+BLOG_PAGE_CACHE_STALE = int(os.getenv("BLOG_PAGE_CACHE_STALE", "300"))
+
+# Serve the feed, post, category and search pages with the async views in
+# blogs/async_views.py. Only worth it under an ASGI server (uvicorn workers)
+BLOG_ASYNC_VIEWS = os.getenv("BLOG_ASYNC_VIEWS", "False") == "True"
+
+# Most categories each worker keeps in its in-memory category registry
+BLOG_CATEGORY_REGISTRY_MAX = int(os.getenv("BLOG_CATEGORY_REGISTRY_MAX", "500"))
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -100,10 +170,90 @@ MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "/media/"
 
+# Responsive renditions generated for featured images (see blogs/images.py)
+BLOG_IMAGE_WIDTHS = (320, 640, 1280)
+BLOG_IMAGE_WORKERS = int(os.getenv("BLOG_IMAGE_WORKERS", "2"))
+BLOG_IMAGE_ASYNC = True
+
 # Authentication redirects
 LOGIN_URL = "/login/"
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/"
 
+# Number of posts per page on the feed, category, search and activity pages
+BLOG_PAGE_SIZE = int(os.getenv("BLOG_PAGE_SIZE", "10"))
+
+# Latest entries per list on the "My activity" dashboard (blogs/activity.py)
+BLOG_ACTIVITY_RECENT = int(os.getenv("BLOG_ACTIVITY_RECENT", "5"))
+
+# Comments shown per batch on the post page and per "load more" request
+BLOG_COMMENT_PAGE_SIZE = int(os.getenv("BLOG_COMMENT_PAGE_SIZE", "20"))
+
+# Trending feed (blogs/trending.py). Each like, bookmark or comment adds its
+# weight to the post's score; recompute_trending halves scores every
+# BLOG_TRENDING_HALF_LIFE_HOURS and should run about every
+# BLOG_TRENDING_DECAY_INTERVAL seconds. The top BLOG_TRENDING_SIZE posts are
+# cached for BLOG_TRENDING_CACHE_TIMEOUT seconds
+BLOG_TRENDING_WEIGHTS = {"like_count": 1.0, "bookmark_count": 2.0, "comment_count": 3.0}
+BLOG_TRENDING_HALF_LIFE_HOURS = float(os.getenv("BLOG_TRENDING_HALF_LIFE_HOURS", "24"))
+BLOG_TRENDING_DECAY_INTERVAL = int(os.getenv("BLOG_TRENDING_DECAY_INTERVAL", "3600"))
+BLOG_TRENDING_SIZE = int(os.getenv("BLOG_TRENDING_SIZE", "50"))
+BLOG_TRENDING_CACHE_TIMEOUT = int(os.getenv("BLOG_TRENDING_CACHE_TIMEOUT", "300"))
+
+# Related posts (blogs/related.py): how many are stored per post, the weight
+# of a shared category relative to a shared tag, and how many posts per tag or
+# category an incremental update after an edit rescores
+BLOG_RELATED_POSTS = int(os.getenv("BLOG_RELATED_POSTS", "5"))
+BLOG_RELATED_CATEGORY_WEIGHT = float(os.getenv("BLOG_RELATED_CATEGORY_WEIGHT", "0.5"))
+BLOG_RELATED_CANDIDATES = int(os.getenv("BLOG_RELATED_CANDIDATES", "500"))
+
+# Rows fetched per database round trip by export_blog and the staff export
+# download (blogs/transfer.py)
+BLOG_EXPORT_CHUNK_SIZE = int(os.getenv("BLOG_EXPORT_CHUNK_SIZE", "2000"))
+
+# JSON API (blogs/api.py): max-age of its responses (they always carry an
+# ETag) and the smallest body worth compressing
+BLOG_API_MAX_AGE = int(os.getenv("BLOG_API_MAX_AGE", "0"))
+BLOG_API_MIN_COMPRESS_SIZE = int(os.getenv("BLOG_API_MIN_COMPRESS_SIZE", "512"))
+
+# Write-behind buffering for likes/bookmarks (blogs/writebehind.py): toggles
+# go to the cache and are flushed to the database in batches every INTERVAL
+# seconds. Pending states are kept for TTL seconds; use a shared cache
+# (REDIS_URL) when running more than one worker
+BLOG_WRITE_BEHIND = os.getenv("BLOG_WRITE_BEHIND", "False") == "True"
+BLOG_WRITE_BEHIND_INTERVAL = float(os.getenv("BLOG_WRITE_BEHIND_INTERVAL", "1.0"))
+BLOG_WRITE_BEHIND_TTL = int(os.getenv("BLOG_WRITE_BEHIND_TTL", "600"))
+
+# Dotted path to a search backend class from blogs/search.py. Leave unset to
+# pick one from the database (PostgreSQL full-text, SQLite FTS5 or icontains)
+BLOG_SEARCH_BACKEND = os.getenv("BLOG_SEARCH_BACKEND") or None
+
+# Per-request query/timing instrumentation (blogs.middleware.RequestMetricsMiddleware).
+# A query shape repeated BLOG_NPLUSONE_THRESHOLD times in one request is
+# logged as a likely N+1
+BLOG_REQUEST_METRICS = os.getenv("BLOG_REQUEST_METRICS", "True") == "True"
+BLOG_NPLUSONE_THRESHOLD = int(os.getenv("BLOG_NPLUSONE_THRESHOLD", "5"))
+
+# One JSON line per request from the "blogs.requests" logger
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "blogs.requests": {
+            "handlers": ["console"],
+            "level": os.getenv("BLOG_REQUEST_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+        "blogs.templates": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -0,0 +1,36 @@
+"""
+Template profiles for my_blog.settings.
+
+- production: Django's cached loader is spelled out around the filesystem and
+  app directories loaders, so each worker compiles every template once and
+  renders the compiled Template from memory afterwards, and template debug
+  info (token positions for the technical 500 page) is switched off.
+- development: Django's defaults. Recent Django versions cache compiled
+  templates here too and the runserver autoreloader clears that cache when a
+  template file changes; debug info follows DEBUG.
+
+BLOG_TEMPLATE_PROFILE picks one; it defaults to development when DEBUG is on
+and production otherwise.
+"""
+
+LOADERS = [
+    "django.template.loaders.filesystem.Loader",
+    "django.template.loaders.app_directories.Loader",
+]
+
+
+def template_config(dirs, context_processors, profile="production"):
+    # The DjangoTemplates entry for TEMPLATES
+    config = {
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "DIRS": dirs,
+        "OPTIONS": {"context_processors": context_processors},
+    }
+    if profile == "development":
+        config["APP_DIRS"] = True
+    else:
+        config["OPTIONS"].update({
+            "loaders": [("django.template.loaders.cached.Loader", LOADERS)],
+            "debug": False,
+        })
+    return config
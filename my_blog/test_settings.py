@@ -0,0 +1,29 @@
+"""
+Settings for the test suite: my_blog.settings plus what only the tests need.
+
+manage.py test picks this module; other runners need
+DJANGO_SETTINGS_MODULE=my_blog.test_settings (pytest-django reads it from
+the environment or its own config).
+"""
+
+import os
+
+from my_blog.settings import *  # noqa: F401,F403
+from my_blog.settings import DATABASES, LOGGING
+
+# A fresh in-memory cache for every run, whatever REDIS_URL or CACHE_DIR say
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    }
+}
+
+# Without real replicas, replica1 mirrors the test database so the routing
+# tests have an alias to route to. Routing itself stays off
+# (BLOG_READ_REPLICAS) unless a test turns it on.
+if "replica1" not in DATABASES:
+    DATABASES["replica1"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+
+# Keep the per-request log lines out of the test output
+LOGGING["loggers"]["blogs.requests"]["level"] = os.getenv("BLOG_REQUEST_LOG_LEVEL", "WARNING")
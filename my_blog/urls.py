@@ -9,7 +9,7 @@ from django.conf.urls.static import static
 # Main URL patterns for the website
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('', include('blogs.urls')),
+    path('', include('blogs.async_urls' if settings.BLOG_ASYNC_VIEWS else 'blogs.urls')),
 ]
 
 # In development, Django needs help serving uploaded files